@@ -0,0 +1,82 @@
+"""
+Нагрузочное сравнение WSGI и ASGI: пропускная способность и задержки при большом числе соединений.
+
+Пример (оба профиля подняты через docker compose, токен — из /api/users/token/):
+
+    python benchmarks/http_throughput.py --token $ACCESS \\
+        --target wsgi=http://localhost:8000/api/courses/ \\
+        --target asgi=http://localhost:8001/api/async/courses/ \\
+        --concurrency 50 200 500 --duration 20
+
+Для каждой цели и уровня параллелизма печатается число запросов в секунду,
+p50/p95/p99 задержки и число ошибок (не 2xx, таймауты, разрывы соединения).
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+async def worker(client, url, headers, deadline, latencies, errors):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            response = await client.get(url, headers=headers)
+            if response.status_code >= 300:
+                errors.append(response.status_code)
+                continue
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append(time.perf_counter() - started)
+
+
+def percentile(values, q):
+    if len(values) < 2:
+        return values[0] if values else float('nan')
+    return statistics.quantiles(values, n=100, method='inclusive')[q - 1]
+
+
+async def run(url, token, concurrency, duration, timeout):
+    headers = {'Authorization': f'Bearer {token}'} if token else {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    latencies, errors = [], []
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        await client.get(url, headers=headers)  # прогрев
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*(
+            worker(client, url, headers, deadline, latencies, errors) for _ in range(concurrency)
+        ))
+        elapsed = time.perf_counter() - started
+    return {
+        'rps': len(latencies) / elapsed,
+        'p50': percentile(latencies, 50) * 1000,
+        'p95': percentile(latencies, 95) * 1000,
+        'p99': percentile(latencies, 99) * 1000,
+        'errors': len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', action='append', required=True, help='имя=URL, можно указать несколько раз')
+    parser.add_argument('--token', help='JWT access-токен')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[50, 200, 500])
+    parser.add_argument('--duration', type=float, default=20, help='секунд на каждый замер')
+    parser.add_argument('--timeout', type=float, default=30)
+    args = parser.parse_args()
+
+    print(f'{"target":<10} {"conns":>6} {"req/s":>9} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"errors":>7}')
+    for target in args.target:
+        name, url = target.split('=', 1)
+        for concurrency in args.concurrency:
+            result = asyncio.run(run(url, args.token, concurrency, args.duration, args.timeout))
+            print(f'{name:<10} {concurrency:>6} {result["rps"]:>9.1f} {result["p50"]:>9.1f} '
+                  f'{result["p95"]:>9.1f} {result["p99"]:>9.1f} {result["errors"]:>7}')
+
+
+if __name__ == '__main__':
+    main()
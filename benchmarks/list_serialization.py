@@ -0,0 +1,80 @@
+"""
+Сравнение быстрых списков (values() + ValuesSerializer) с обычными сериализаторами DRF.
+
+Пример (данные — из настроенной БД, пользователь должен существовать):
+
+    python benchmarks/list_serialization.py --email moderator@example.com --page-size 50 --repeat 50
+
+Для каждого эндпоинта (курсы, уроки, платежи) представление вызывается напрямую,
+без HTTP и middleware, в двух вариантах: с быстрым list() и со стандартным
+ListModelMixin.list. Печатается число запросов в секунду и ускорение.
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import django
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from rest_framework.mixins import ListModelMixin  # noqa: E402
+from rest_framework.test import APIRequestFactory, force_authenticate  # noqa: E402
+
+from materials.views import CourseViewSet, LessonListCreateView  # noqa: E402
+from users.models import User  # noqa: E402
+from users.views import PaymentListAPIView  # noqa: E402
+
+
+def serializer_variant(view_class):
+    """То же представление со стандартным list() через сериализатор."""
+    return type(f'Serializer{view_class.__name__}', (view_class,), {'list': ListModelMixin.list})
+
+
+TARGETS = [
+    ('courses', CourseViewSet, {'get': 'list'}, '/api/courses/'),
+    ('lessons', LessonListCreateView, None, '/api/lessons/'),
+    ('payments', PaymentListAPIView, None, '/api/users/payments/'),
+]
+
+
+def measure(view, request_factory, user, path, page_size, repeat):
+    def call():
+        request = request_factory.get(path, {'page_size': page_size}, HTTP_HOST=settings.ALLOWED_HOSTS[0])
+        force_authenticate(request, user=user)
+        response = view(request)
+        assert response.status_code == 200, response.status_code
+        return len(response.data['results'])
+
+    rows = call()  # прогрев
+    started = time.perf_counter()
+    for _ in range(repeat):
+        call()
+    return rows, repeat / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--email', required=True, help='Пользователь, от имени которого читаются списки')
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    user = User.objects.get(email=args.email)
+    request_factory = APIRequestFactory()
+    print(f"{'endpoint':<10} {'rows':>6} {'serializer rps':>15} {'values rps':>12} {'speedup':>8}")
+    for name, view_class, actions, path in TARGETS:
+        kwargs = {'actions': actions} if actions else {}
+        slow_view = serializer_variant(view_class).as_view(**kwargs)
+        fast_view = view_class.as_view(**kwargs)
+        rows, slow = measure(slow_view, request_factory, user, path, args.page_size, args.repeat)
+        _, fast = measure(fast_view, request_factory, user, path, args.page_size, args.repeat)
+        print(f'{name:<10} {rows:>6} {slow:>15.1f} {fast:>12.1f} {fast / slow:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
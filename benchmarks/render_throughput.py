@@ -0,0 +1,90 @@
+"""
+Сравнение рендереров ответа: размер и время рендеринга одной страницы курсов с уроками.
+
+Пример:
+
+    python benchmarks/render_throughput.py --courses 50 --lessons 30 --repeat 200
+
+Страница собирается в формате CourseSerializer (вложенные уроки, Decimal-цена, даты),
+к базе данных скрипт не обращается. Для каждого рендерера печатается размер страницы
+в байтах и среднее время рендеринга в миллисекундах.
+"""
+import argparse
+import os
+import sys
+import time
+from decimal import Decimal
+from pathlib import Path
+
+import django
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django.utils import timezone  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from core.renderers import MessagePackRenderer, ORJSONRenderer, msgpack  # noqa: E402
+
+
+def build_page(courses, lessons):
+    now = timezone.now()
+    results = []
+    for course_id in range(1, courses + 1):
+        course_lessons = [
+            {
+                'id': course_id * 1000 + number,
+                'owner': 1,
+                'video_url': f'https://www.youtube.com/watch?v=lesson{number}',
+                'title': f'Урок {number}',
+                'description': 'Описание урока ' * 10,
+                'course': course_id,
+                'preview': None,
+            }
+            for number in range(lessons)
+        ]
+        results.append({
+            'id': course_id,
+            'title': f'Курс {course_id}',
+            'description': 'Описание курса ' * 20,
+            'preview': None,
+            'owner': 1,
+            'price': Decimal('1990.00'),
+            'last_updated_at': now,
+            'lesson_count': lessons,
+            'lessons': course_lessons,
+            'is_subscribed': course_id % 2 == 0,
+            'is_purchased': False,
+        })
+    return {'count': courses, 'next': None, 'previous': None, 'results': results, 'count_is_estimate': False}
+
+
+def measure(renderer, page, repeat):
+    content = renderer.render(page, renderer.media_type, {})
+    started = time.perf_counter()
+    for _ in range(repeat):
+        renderer.render(page, renderer.media_type, {})
+    return len(content), (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--courses', type=int, default=50, help='Курсов на странице')
+    parser.add_argument('--lessons', type=int, default=30, help='Уроков в курсе')
+    parser.add_argument('--repeat', type=int, default=200, help='Число повторов рендеринга')
+    args = parser.parse_args()
+
+    page = build_page(args.courses, args.lessons)
+    renderers = [('drf-json', JSONRenderer()), ('orjson', ORJSONRenderer())]
+    if msgpack is not None:
+        renderers.append(('msgpack', MessagePackRenderer()))
+
+    print(f"{'renderer':<10} {'bytes':>10} {'ms/page':>10}")
+    for name, renderer in renderers:
+        size, ms = measure(renderer, page, args.repeat)
+        print(f'{name:<10} {size:>10} {ms:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,8 @@
+import os
 from pathlib import Path
 from decouple import config, Csv
 from datetime import timedelta
+from importlib.util import find_spec
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -29,6 +31,7 @@ INSTALLED_APPS = [
     'django_celery_beat',
 
     # Локальные приложения
+    'core',
     'users',
     'materials',
 ]
@@ -38,6 +41,7 @@ MIDDLEWARE = [
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
+    'core.db_router.ReplicaRoutingMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
@@ -74,9 +78,47 @@ DATABASES = {
         'PASSWORD': config('DB_PASSWORD', default=''),
         'HOST': config('DB_HOST', default='localhost'),
         'PORT': config('DB_PORT', default='5432'),
+        # Постоянные подключения: переиспользуются между запросами и задачами DB_CONN_MAX_AGE секунд,
+        # перед повторным использованием проверяются. Под ASGI — 0 (запросы идут в разных потоках)
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=600, cast=int),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Имя приложения в pg_stat_activity (web, celery, ...) — для метрик подключений
+DB_APPLICATION_NAME = config('DB_APPLICATION_NAME', default='lms')
+if DATABASES['default']['ENGINE'].endswith('postgresql'):
+    DATABASES['default']['OPTIONS'] = {'application_name': DB_APPLICATION_NAME}
+
+# Процессы и потоки, которые держат подключения к БД (WEB_CONCURRENCY читает и gunicorn),
+# и сколько подключений к каждой БД приложению можно открыть (max_connections минус запас)
+WEB_CONCURRENCY = config('WEB_CONCURRENCY', default=3, cast=int)
+GUNICORN_THREADS = config('GUNICORN_THREADS', default=4, cast=int)
+CELERY_WORKER_CONCURRENCY = config('CELERY_WORKER_CONCURRENCY', default=os.cpu_count() or 1, cast=int)
+DB_MAX_CONNECTIONS = config('DB_MAX_CONNECTIONS', default=90, cast=int)
+# Как часто процесс сбрасывает в Redis число открытых им подключений к БД (секунды)
+DB_CONNECTION_STATS_INTERVAL = config('DB_CONNECTION_STATS_INTERVAL', default=60, cast=int)
+
+# Реплики для чтения: DB_REPLICAS=host1:5432,host2 (для SQLite — пути к файлам БД),
+# остальные параметры подключения — как у основной БД
+DATABASE_REPLICAS = []
+for index, replica in enumerate(config('DB_REPLICAS', default='', cast=Csv()), start=1):
+    if DATABASES['default']['ENGINE'].endswith('sqlite3'):
+        overrides = {'NAME': replica}
+    else:
+        host, _, port = replica.partition(':')
+        overrides = {'HOST': host, 'PORT': port or DATABASES['default']['PORT']}
+    DATABASES[f'replica{index}'] = {**DATABASES['default'], **overrides, 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica{index}')
+
+DATABASE_ROUTERS = ['core.db_router.PrimaryReplicaRouter']
+# Сколько секунд после записи клиент читает с основной БД
+DB_REPLICA_STICKY_SECONDS = config('DB_REPLICA_STICKY_SECONDS', default=10, cast=int)
+# Реплика, отстающая больше чем на столько секунд, не используется
+DB_REPLICA_MAX_LAG = config('DB_REPLICA_MAX_LAG', default=5, cast=int)
+# Как часто (в секундах) каждый процесс проверяет отставание реплик
+DB_REPLICA_CHECK_INTERVAL = config('DB_REPLICA_CHECK_INTERVAL', default=5, cast=int)
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -124,26 +166,35 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'users.User'
 
 # Django REST Framework settings
+# JSON через orjson; MessagePack (Accept: application/msgpack) — если установлен msgpack;
+# браузерный API — только в режиме отладки
+RENDERER_CLASSES = ['core.renderers.ORJSONRenderer']
+PARSER_CLASSES = [
+    'core.renderers.ORJSONParser',
+    'rest_framework.parsers.FormParser',
+    'rest_framework.parsers.MultiPartParser',
+]
+if find_spec('msgpack'):
+    RENDERER_CLASSES.append('core.renderers.MessagePackRenderer')
+    PARSER_CLASSES.append('core.renderers.MessagePackParser')
+if DEBUG:
+    RENDERER_CLASSES.append('rest_framework.renderers.BrowsableAPIRenderer')
+
 REST_FRAMEWORK = {
-    'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
-        'rest_framework.renderers.BrowsableAPIRenderer',
-    ],
-    'DEFAULT_PARSER_CLASSES': [
-        'rest_framework.parsers.JSONParser',
-        'rest_framework.parsers.FormParser',
-        'rest_framework.parsers.MultiPartParser',
-    ],
+    'DEFAULT_RENDERER_CLASSES': RENDERER_CLASSES,
+    'DEFAULT_PARSER_CLASSES': PARSER_CLASSES,
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
         'rest_framework.filters.OrderingFilter',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.StatelessJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # Схема OpenAPI (/api/schema/) строится drf-spectacular
+    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
 
@@ -152,14 +203,126 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'ROTATE_REFRESH_TOKENS': False,
     'BLACKLIST_AFTER_ROTATION': True,
+    'TOKEN_OBTAIN_SERIALIZER': 'users.serializers.UserTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'users.serializers.UserTokenRefreshSerializer',
 }
+
+# Сколько секунд кешировать флаги is_active/is_staff/is_superuser при JWT-аутентификации
+AUTH_STATE_CACHE_TTL = config('AUTH_STATE_CACHE_TTL', default=60, cast=int)
+# Кеш множества купленных пользователем курсов (сбрасывается при выдаче доступа)
+ENTITLEMENTS_CACHE_TTL = config('ENTITLEMENTS_CACHE_TTL', default=3600, cast=int)
+# Кеш групп пользователя и карточек курсов (цена, владелец) в двухуровневом кеше
+USER_GROUPS_CACHE_TTL = config('USER_GROUPS_CACHE_TTL', default=3600, cast=int)
+COURSE_CARD_CACHE_TTL = config('COURSE_CARD_CACHE_TTL', default=3600, cast=int)
+
+# Двухуровневый кеш (core.cache.TieredCache): память процесса поверх Redis.
+# Значение живет в памяти не дольше TIERED_CACHE_LOCAL_TTL секунд, даже если сброс не дошел
+TIERED_CACHE_LOCAL_TTL = config('TIERED_CACHE_LOCAL_TTL', default=30, cast=int)
+TIERED_CACHE_MAX_ENTRIES = config('TIERED_CACHE_MAX_ENTRIES', default=1000, cast=int)
+# Сколько ждать загрузки значения другим процессом и как часто проверять
+TIERED_CACHE_LOCK_TIMEOUT = config('TIERED_CACHE_LOCK_TIMEOUT', default=5, cast=int)
+TIERED_CACHE_POLL_INTERVAL = 0.05
+TIERED_CACHE_RECONNECT_INTERVAL = 1
+# Как часто процесс сбрасывает счетчики попаданий в Redis (секунды)
+TIERED_CACHE_STATS_INTERVAL = config('TIERED_CACHE_STATS_INTERVAL', default=60, cast=int)
+
+# Рейтинг популярных курсов (по покупкам и подпискам): сколько курсов и на сколько секунд кешировать
+POPULAR_COURSES_LIMIT = config('POPULAR_COURSES_LIMIT', default=100, cast=int)
+POPULAR_COURSES_CACHE_TTL = config('POPULAR_COURSES_CACHE_TTL', default=3600, cast=int)
+
+# Прогрев кешей (manage.py warm_caches и gunicorn.conf.py): потоки, общий лимит времени в секундах
+# (должен быть меньше таймаута воркера gunicorn, 30 с) и число недавно активных пользователей.
+# WARM_CACHES_ON_START прогревает память каждого воркера gunicorn до приема запросов
+WARM_CACHES_WORKERS = config('WARM_CACHES_WORKERS', default=4, cast=int)
+WARM_CACHES_TIMEOUT = config('WARM_CACHES_TIMEOUT', default=20, cast=float)
+WARM_CACHES_ACTIVE_USERS = config('WARM_CACHES_ACTIVE_USERS', default=500, cast=int)
+WARM_CACHES_ON_START = config('WARM_CACHES_ON_START', default=False, cast=bool)
+
+# Размер пачки при удалении истекших токенов из OutstandingToken/BlacklistedToken
+TOKEN_PRUNE_BATCH_SIZE = config('TOKEN_PRUNE_BATCH_SIZE', default=5000, cast=int)
+
+# Учет активности пользователей (users.activity): запись в Redis не чаще интервала,
+# сброс в User.last_activity периодической задачей пачками
+ACTIVITY_TOUCH_INTERVAL = config('ACTIVITY_TOUCH_INTERVAL', default=60, cast=int)
+ACTIVITY_LOCAL_MAX_USERS = 100000
+ACTIVITY_FLUSH_BATCH_SIZE = config('ACTIVITY_FLUSH_BATCH_SIZE', default=1000, cast=int)
+
+# Блокировка неактивных пользователей: размер пачки и пауза между пачками (сек)
+BLOCK_INACTIVE_USERS_BATCH_SIZE = config('BLOCK_INACTIVE_USERS_BATCH_SIZE', default=1000, cast=int)
+BLOCK_INACTIVE_USERS_PAUSE = config('BLOCK_INACTIVE_USERS_PAUSE', default=0.5, cast=float)
 # --- STRIPE SETTINGS ---
 STRIPE_SECRET_KEY = config('STRIPE_SECRET_KEY', default='your_default_stripe_key')
+STRIPE_API_BASE = config('STRIPE_API_BASE', default='https://api.stripe.com')
+STRIPE_SUCCESS_URL = config('STRIPE_SUCCESS_URL', default='http://localhost:8000/api/users/payments/success/')
+STRIPE_CANCEL_URL = config('STRIPE_CANCEL_URL', default='http://localhost:8000/api/users/payments/cancel/')
+# Таймауты (сек), повторы и размер пула соединений HTTP-клиента Stripe
+STRIPE_CONNECT_TIMEOUT = config('STRIPE_CONNECT_TIMEOUT', default=3.0, cast=float)
+STRIPE_READ_TIMEOUT = config('STRIPE_READ_TIMEOUT', default=10.0, cast=float)
+STRIPE_MAX_NETWORK_RETRIES = config('STRIPE_MAX_NETWORK_RETRIES', default=2, cast=int)
+STRIPE_HTTP_POOL_SIZE = config('STRIPE_HTTP_POOL_SIZE', default=10, cast=int)
+# Предохранитель: сколько сбоев подряд размыкают цепь и через сколько секунд пробовать снова
+STRIPE_BREAKER_FAILURES = config('STRIPE_BREAKER_FAILURES', default=5, cast=int)
+STRIPE_BREAKER_RESET_TIMEOUT = config('STRIPE_BREAKER_RESET_TIMEOUT', default=30, cast=int)
+# Секрет подписи вебхука (whsec_...)
+STRIPE_WEBHOOK_SECRET = config('STRIPE_WEBHOOK_SECRET', default='')
+# Проверка статуса платежа: Stripe опрашивается только для неоплаченных платежей старше
+# STRIPE_STATUS_STALE_AFTER и не чаще раза в STRIPE_STATUS_CHECK_INTERVAL секунд
+STRIPE_STATUS_STALE_AFTER = timedelta(seconds=config('STRIPE_STATUS_STALE_AFTER', default=60, cast=int))
+STRIPE_STATUS_CHECK_INTERVAL = config('STRIPE_STATUS_CHECK_INTERVAL', default=30, cast=int)
+# За какой период сверять неоплаченные платежи со Stripe (сессии Checkout живут до 24 часов)
+PAYMENT_RECONCILE_LOOKBACK = timedelta(hours=config('PAYMENT_RECONCILE_LOOKBACK_HOURS', default=48, cast=int))
+# Месячные итоги платежей обновляются приращениями; раз в день сверяются с Payment за столько дней назад
+PAYMENT_ROLLUP_RECONCILE_DAYS = config('PAYMENT_ROLLUP_RECONCILE_DAYS', default=35, cast=int)
+
+# События курсов (SSE): сколько событий хранить для Last-Event-ID, размер очереди соединения,
+# интервал heartbeat (сек) и пауза перед переподключением клиента (мс)
+COURSE_EVENTS_HISTORY = config('COURSE_EVENTS_HISTORY', default=10000, cast=int)
+COURSE_EVENTS_QUEUE_SIZE = config('COURSE_EVENTS_QUEUE_SIZE', default=100, cast=int)
+SSE_HEARTBEAT_INTERVAL = config('SSE_HEARTBEAT_INTERVAL', default=15, cast=int)
+SSE_RETRY_MS = config('SSE_RETRY_MS', default=5000, cast=int)
+
+# Синхронизация (/api/sync/): записей каждого типа за запрос, перекрытие окна
+# (ловит записи из незакоммиченных транзакций) и срок хранения отметок об удалении
+SYNC_PAGE_SIZE = config('SYNC_PAGE_SIZE', default=500, cast=int)
+SYNC_OVERLAP = timedelta(seconds=config('SYNC_OVERLAP_SECONDS', default=5, cast=int))
+SYNC_TOMBSTONE_RETENTION = timedelta(days=config('SYNC_TOMBSTONE_RETENTION_DAYS', default=90, cast=int))
+
+# Пакетные запросы (/api/batch/): максимум подзапросов и потоков для parallel
+BATCH_MAX_REQUESTS = config('BATCH_MAX_REQUESTS', default=20, cast=int)
+BATCH_MAX_WORKERS = config('BATCH_MAX_WORKERS', default=4, cast=int)
+
+# Выше этого числа строк админка и списки API показывают оценку из статистики PostgreSQL вместо COUNT(*)
+ESTIMATED_COUNT_THRESHOLD = config('ESTIMATED_COUNT_THRESHOLD', default=10000, cast=int)
+# Сколько секунд кешировать точный COUNT(*) для одной и той же выборки (0 — не кешировать)
+EXACT_COUNT_CACHE_TTL = config('EXACT_COUNT_CACHE_TTL', default=30, cast=int)
+
+# Секционирование платежей (PostgreSQL): секции на месяцы вперед и выгрузка старых секций в архив
+PAYMENT_PARTITIONS_AHEAD = config('PAYMENT_PARTITIONS_AHEAD', default=3, cast=int)
+PAYMENT_ARCHIVE_AFTER_MONTHS = config('PAYMENT_ARCHIVE_AFTER_MONTHS', default=24, cast=int)
+PAYMENT_ARCHIVE_DIR = config('PAYMENT_ARCHIVE_DIR', default=str(BASE_DIR / 'archive' / 'payments'))
+
+# Idempotency-Key: сколько хранить ответы и сколько ждать завершения параллельного дубликата (сек)
+IDEMPOTENCY_KEY_TTL = timedelta(days=1)
+IDEMPOTENCY_WAIT_TIMEOUT = config('IDEMPOTENCY_WAIT_TIMEOUT', default=10, cast=float)
+IDEMPOTENCY_POLL_INTERVAL = 0.1
+# Через сколько секунд резерв без ответа считается брошенным (процесс упал) и его можно забрать.
+# Должно быть заметно больше худшего времени create(): до 4 вызовов Stripe по
+# (STRIPE_CONNECT_TIMEOUT + STRIPE_READ_TIMEOUT) с STRIPE_MAX_NETWORK_RETRIES повторами — около 160 с
+IDEMPOTENCY_ABANDON_AFTER = config('IDEMPOTENCY_ABANDON_AFTER', default=300, cast=int)
 
 REDIS_HOST = config('REDIS_HOST', default='localhost')
 REDIS_PORT = config('REDIS_PORT', default='6379')
 REDIS_DB = config('REDIS_DB', default='0')
 
+REDIS_URL = f'redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}'
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.redis.RedisCache'),
+        'LOCATION': config('CACHE_LOCATION', default=f'redis://{REDIS_HOST}:{REDIS_PORT}/1'),
+    }
+}
+
 CELERY_BROKER_URL = f'redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}'
 CELERY_RESULT_BACKEND = f'redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}'
 CELERY_ACCEPT_CONTENT = ['application/json']
@@ -168,6 +331,14 @@ CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE # <--- TASK 3: Используем TIME_ZONE из Django
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60
+# Фиксап Django в Celery по умолчанию закрывает подключения после каждой задачи;
+# с этим параметром — раз в столько задач, в остальное время действует CONN_MAX_AGE
+CELERY_DB_REUSE_MAX = config('CELERY_DB_REUSE_MAX', default=1000, cast=int)
+
+# Метрики задач Celery (ожидание в очереди, время выполнения, повторы)
+CELERY_TASK_METRICS_RETENTION = timedelta(days=7)
+CELERY_TASK_METRICS_MAX_RUNS = config('CELERY_TASK_METRICS_MAX_RUNS', default=100000, cast=int)
+CELERY_MONITORED_QUEUES = config('CELERY_MONITORED_QUEUES', default='celery', cast=Csv())
 
 
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
@@ -178,6 +349,46 @@ CELERY_BEAT_SCHEDULE = {
         # (Можно использовать crontab: from celery.schedules import crontab)
         # 'schedule': crontab(hour=0, minute=0), # Каждый день в полночь
     },
+    'flush_user_activity_every_5_minutes': {
+        'task': 'users.tasks.flush_user_activity',
+        'schedule': timedelta(minutes=5),
+    },
+    'reconcile_unpaid_payments_every_15_minutes': {
+        'task': 'users.tasks.reconcile_unpaid_payments',
+        'schedule': timedelta(minutes=15),
+    },
+    'reconcile_payment_rollups_every_day': {
+        'task': 'users.tasks.reconcile_rollups',
+        'schedule': timedelta(days=1),
+    },
+    'prune_tombstones_every_day': {
+        'task': 'materials.tasks.prune_tombstones',
+        'schedule': timedelta(days=1),
+    },
+    'create_payment_partitions_every_day': {
+        'task': 'users.tasks.create_payment_partitions',
+        'schedule': timedelta(days=1),
+    },
+    'prune_idempotency_keys_every_day': {
+        'task': 'users.tasks.prune_idempotency_keys',
+        'schedule': timedelta(days=1),
+    },
+    'prune_expired_tokens_every_hour': {
+        'task': 'users.tasks.prune_expired_tokens',
+        'schedule': timedelta(hours=1),
+    },
+    'report_broker_queue_depth_every_minute': {
+        'task': 'core.tasks.report_broker_queue_depth',
+        'schedule': timedelta(minutes=1),
+    },
+    'report_db_connections_every_minute': {
+        'task': 'core.tasks.report_db_connections',
+        'schedule': timedelta(minutes=1),
+    },
+    'report_tiered_cache_stats_every_5_minutes': {
+        'task': 'core.tasks.report_tiered_cache_stats',
+        'schedule': timedelta(minutes=5),
+    },
 }
 
 # --- EMAIL SETTINGS (TASK 2) ---
@@ -2,7 +2,10 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
+from drf_spectacular.views import SpectacularSwaggerView
+
+from core.batch import BatchAPIView
+from core.schema import CachedSpectacularAPIView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -10,7 +13,8 @@ urlpatterns = [
     # API endpoints
     path('api/users/', include('users.urls', namespace='users')),
     path('api/', include('materials.urls', namespace='materials')),
-    path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
+    path('api/batch/', BatchAPIView.as_view(), name='batch'),
+    path('api/schema/', CachedSpectacularAPIView.as_view(), name='schema'),
     path('api/docs/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
 ]
 
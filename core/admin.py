@@ -0,0 +1,17 @@
+from core.pagination import EstimatedCountPaginator
+
+
+class PerformanceAdminMixin:
+    """
+    Настройки списка в админке для больших таблиц.
+
+    - число строк берется из оценки, а не из COUNT(*) (EstimatedCountPaginator);
+    - без второго COUNT(*) по всей таблице при поиске и фильтрах (show_full_result_count);
+    - связанные объекты из list_display подгружаются JOIN-ом (задать list_select_related);
+    - внешние ключи выбираются через autocomplete (задать autocomplete_fields),
+      а не выпадающим списком из всех строк;
+    - поиск по префиксу ('^field'), который использует индексы UPPER(field) text_pattern_ops.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
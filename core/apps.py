@@ -0,0 +1,14 @@
+from django.apps import AppConfig
+
+
+class CoreConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'core'
+
+    def ready(self):
+        # Подключаем обработчики сигналов Celery (метрики задач)
+        from core import celery_signals  # noqa: F401
+        # Счетчик подключений к БД и проверка бюджета подключений
+        from core import checks, db_connections  # noqa: F401
+        # Прогрев кешей (warm_caches)
+        from core import warmup  # noqa: F401
@@ -0,0 +1,58 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotAuthenticated
+from rest_framework.settings import api_settings
+
+
+class AsyncAPIView(View):
+    """
+    Базовое асинхронное представление JSON API (ASGI) без DRF-диспетчеризации.
+
+    - аутентификация — теми же классами, что и в DRF (DEFAULT_AUTHENTICATION_CLASSES),
+      они синхронные (кеш, Redis), поэтому вызываются через sync_to_async;
+    - анонимный запрос получает 401, ошибки DRF (APIException) превращаются в JSON-ответ;
+    - CSRF не проверяется, как и у APIView: доступ только по токену.
+
+    Обработчики (get, post, ...) должны быть async def.
+    """
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        view.csrf_exempt = True
+        return view
+
+    def authenticate(self, request):
+        for authentication_class in self.authentication_classes:
+            result = authentication_class().authenticate(request)
+            if result is not None:
+                return result[0]
+        return None
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            user = await sync_to_async(self.authenticate)(request)
+            if user is None:
+                raise NotAuthenticated()
+            request.user = user
+            return await super().dispatch(request, *args, **kwargs)
+        except APIException as e:
+            return JsonResponse({'detail': e.detail}, status=e.status_code)
+
+    def parse_body(self, request):
+        """Тело запроса: JSON или данные формы."""
+        if request.content_type == 'application/json':
+            try:
+                return json.loads(request.body or b'{}')
+            except ValueError:
+                return None
+        return request.POST
+
+
+def error_response(message, status_code=status.HTTP_400_BAD_REQUEST):
+    return JsonResponse({'error': message}, status=status_code)
@@ -0,0 +1,164 @@
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework import serializers, status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Заголовки пакетного запроса, которые не наследуются подзапросами: ключ идемпотентности
+# относится ко всему пакету, а не к каждому POST внутри него
+NOT_INHERITED_META = ('CONTENT_TYPE', 'CONTENT_LENGTH', 'QUERY_STRING', 'HTTP_IDEMPOTENCY_KEY')
+
+
+class SubRequestSerializer(serializers.Serializer):
+    id = serializers.CharField(required=False, help_text="Идентификатор подзапроса (возвращается в ответе)")
+    method = serializers.ChoiceField(choices=['GET', 'HEAD', 'OPTIONS', 'POST', 'PUT', 'PATCH', 'DELETE'],
+                                     default='GET')
+    path = serializers.CharField(help_text="Путь API с query string, например /api/courses/?page=2")
+    body = serializers.JSONField(required=False, help_text="Тело запроса (JSON)")
+    headers = serializers.DictField(child=serializers.CharField(), required=False,
+                                    help_text="Заголовки подзапроса, например {\"Idempotency-Key\": \"...\"}")
+
+    def validate_headers(self, value):
+        forbidden = {name for name in value if name.lower() in ('content-type', 'content-length', 'authorization')}
+        if forbidden:
+            raise serializers.ValidationError(f"Заголовки нельзя переопределить: {', '.join(sorted(forbidden))}.")
+        return value
+
+
+class BatchRequestSerializer(serializers.Serializer):
+    requests = SubRequestSerializer(many=True)
+    parallel = serializers.BooleanField(default=False, help_text="Выполнять параллельно (только чтение)")
+
+    def validate_requests(self, value):
+        if not value:
+            raise serializers.ValidationError('Список запросов пуст.')
+        if len(value) > settings.BATCH_MAX_REQUESTS:
+            raise serializers.ValidationError(f'Не больше {settings.BATCH_MAX_REQUESTS} запросов в пакете.')
+        return value
+
+
+def build_sub_request(parent, user, method, path, body, headers=None):
+    """
+    HttpRequest для подзапроса: заголовки берутся из пакетного запроса (кроме
+    NOT_INHERITED_META) и дополняются собственными заголовками подзапроса headers,
+    пользователь передается уже аутентифицированным (DRF не разбирает JWT повторно).
+    """
+    url = urlsplit(path)
+    request = HttpRequest()
+    request.method = method
+    request.path = request.path_info = url.path
+    request.META = {
+        key: value for key, value in parent.META.items()
+        if key not in NOT_INHERITED_META
+    }
+    request.META.update({f"HTTP_{name.upper().replace('-', '_')}": value for name, value in (headers or {}).items()})
+    request.META.update({'REQUEST_METHOD': method, 'PATH_INFO': url.path, 'QUERY_STRING': url.query})
+    request.GET = QueryDict(url.query)
+
+    payload = json.dumps(body).encode() if body is not None else b''
+    request.META['CONTENT_TYPE'] = 'application/json'
+    request.META['CONTENT_LENGTH'] = str(len(payload))
+    request._body = payload
+    request._stream = BytesIO(payload)
+    request._read_started = False
+
+    request.user = user
+    request._force_auth_user = user
+    request._force_auth_token = getattr(parent, 'auth', None)
+    return request
+
+
+def response_body(response):
+    if hasattr(response, 'data'):
+        return response.data
+    content = getattr(response, 'content', b'')
+    if response.get('Content-Type', '').startswith('application/json'):
+        return json.loads(content or b'null')
+    return content.decode(response.charset or 'utf-8', errors='replace')
+
+
+class BatchAPIView(APIView):
+    """
+    Пакетный запрос: несколько вызовов API за один HTTP-запрос.
+
+    POST /api/batch/ {"requests": [{"id": "me", "method": "GET", "path": "/api/users/profiles/1/",
+                                    "headers": {"Accept-Language": "ru"}}, ...],
+                      "parallel": true}
+
+    - аутентификация выполняется один раз, подзапросы получают того же пользователя;
+    - заголовки пакета наследуются подзапросами, кроме Idempotency-Key: ключ для
+      отдельного POST передается в его headers;
+    - подзапросы вызывают представления напрямую (без middleware) по текущим маршрутам,
+      доступны только представления DRF (APIView), остальные маршруты — 404;
+    - parallel выполняет подзапросы в пуле потоков, если все они только читают (GET);
+    - не больше BATCH_MAX_REQUESTS подзапросов; вложенные пакеты не поддерживаются.
+
+    Ответ: {"responses": [{"id", "status", "body"}, ...]} в порядке подзапросов.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = BatchRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        sub_requests = serializer.validated_data['requests']
+        parallel = serializer.validated_data['parallel'] and all(
+            item['method'] in SAFE_METHODS for item in sub_requests
+        )
+
+        if parallel:
+            workers = min(settings.BATCH_MAX_WORKERS, len(sub_requests))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(lambda item: self.run_in_thread(request, item), sub_requests))
+        else:
+            results = [self.run(request, item) for item in sub_requests]
+
+        return Response({'responses': [
+            {'id': item.get('id', str(index)), **result}
+            for index, (item, result) in enumerate(zip(sub_requests, results))
+        ]})
+
+    def run_in_thread(self, request, item):
+        try:
+            return self.run(request, item)
+        finally:
+            # У каждого потока свое подключение к БД: закрываем его
+            connections.close_all()
+
+    def run(self, request, item):
+        path = urlsplit(item['path']).path
+        try:
+            match = resolve(path)
+        except Resolver404:
+            return {'status': status.HTTP_404_NOT_FOUND, 'body': {'detail': 'Маршрут не найден.'}}
+
+        # Только представления DRF: их ответ не требует рендеринга (body берется из data),
+        # а админка, асинхронные и прочие Django-представления в пакете недоступны
+        view_class = getattr(match.func, 'cls', None)
+        if not (isinstance(view_class, type) and issubclass(view_class, APIView)):
+            return {'status': status.HTTP_404_NOT_FOUND, 'body': {'detail': 'Маршрут не найден.'}}
+        if view_class is type(self):
+            return {'status': status.HTTP_400_BAD_REQUEST, 'body': {'detail': 'Вложенные пакеты запрещены.'}}
+
+        sub_request = build_sub_request(request._request, request.user, item['method'], item['path'],
+                                        item.get('body'), item.get('headers'))
+        try:
+            response = match.func(sub_request, *match.args, **match.kwargs)
+            return {'status': response.status_code, 'body': response_body(response)}
+        except Http404:
+            return {'status': status.HTTP_404_NOT_FOUND, 'body': {'detail': 'Не найдено.'}}
+        except Exception:
+            logger.exception(f"Ошибка подзапроса {item['method']} {item['path']}")
+            return {'status': status.HTTP_500_INTERNAL_SERVER_ERROR, 'body': {'detail': 'Внутренняя ошибка.'}}
@@ -0,0 +1,332 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+
+import redis
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from core.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Канал, по которому процессы сообщают друг другу об устаревших ключах
+INVALIDATION_CHANNEL = 'cache:invalidate'
+# Статистика попаданий всех процессов: поле '<cache>:<счетчик>' -> число
+STATS_KEY = 'metrics:tiered_cache'
+
+_MISSING = object()
+_registry = {}
+_listener_lock = threading.Lock()
+_listener_pid = None
+# Отправитель сообщений о сбросе: случайный идентификатор процесса (PID в разных
+# контейнерах совпадают), после fork — новый. Хранится вместе с PID, для которого создан
+_origin = (None, None)
+
+
+class _Flight:
+    """Загрузка значения, которую ждут остальные потоки процесса."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = _MISSING
+
+
+class TieredCache:
+    """
+    Двухуровневый кеш для маленьких горячих значений: LRU в памяти процесса
+    (до TIERED_CACHE_MAX_ENTRIES записей, не дольше TIERED_CACHE_LOCAL_TTL секунд)
+    поверх кеша Django (Redis, timeout секунд).
+
+    - изменение или удаление ключа рассылается остальным процессам через Redis pub/sub,
+      и они убирают его из памяти; если сообщение потерялось, значение живет
+      в памяти не дольше TIERED_CACHE_LOCAL_TTL;
+    - get_or_set загружает отсутствующее значение один раз: в процессе — один поток,
+      между процессами — держатель блокировки в Redis, остальные ждут результат;
+    - счетчики попаданий и промахов периодически сбрасываются в Redis (STATS_KEY).
+
+    Значения отдаются из памяти без копирования, поэтому должны быть неизменяемыми
+    (frozenset, кортежи, числа, строки).
+    """
+
+    def __init__(self, name, timeout):
+        self.name = name
+        self.timeout = timeout
+        self.stats = Counter()
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._stats_flushed = Counter()
+        self._stats_flushed_at = time.monotonic()
+        _registry[name] = self
+
+    def make_key(self, key):
+        return f'tiered:{self.name}:{key}'
+
+    def get(self, key, default=None):
+        _ensure_listener()
+        value = self._local_get(key)
+        if value is not _MISSING:
+            self._count('local_hits')
+            return value
+        value = cache.get(self.make_key(key), _MISSING)
+        if value is _MISSING:
+            self._count('misses')
+            return default
+        self._count('remote_hits')
+        self._local_set(key, value, self.timeout)
+        return value
+
+    def set(self, key, value, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        cache.set(self.make_key(key), value, timeout)
+        self._local_set(key, value, timeout)
+        self._publish([key])
+
+    def delete(self, key):
+        self.delete_many([key])
+
+    def delete_many(self, keys):
+        """
+        Удаляет ключи из обоих уровней во всех процессах.
+        Внутри транзакции удаление повторяется после коммита: иначе параллельный
+        запрос мог успеть положить в кеш еще не измененное значение.
+        """
+        keys = list(keys)
+        if not keys:
+            return
+        self._invalidate(keys)
+        if connection.in_atomic_block:
+            transaction.on_commit(lambda: self._invalidate(keys))
+
+    def get_or_set(self, key, loader, timeout=None):
+        """Значение из кеша или результат loader(), загруженный один раз на все процессы."""
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        with self._lock:
+            flight = self._flights.get(str(key))
+            leader = flight is None
+            if leader:
+                flight = self._flights[str(key)] = _Flight()
+        if not leader:
+            flight.done.wait(settings.TIERED_CACHE_LOCK_TIMEOUT)
+            if flight.value is not _MISSING:
+                self._count('shared_loads')
+                return flight.value
+            return loader()  # загрузка в другом потоке не удалась или зависла
+
+        try:
+            flight.value = self._load(key, loader, self.timeout if timeout is None else timeout)
+            return flight.value
+        finally:
+            with self._lock:
+                self._flights.pop(str(key), None)
+            flight.done.set()
+
+    def get_or_set_many(self, keys, loader, timeout=None):
+        """
+        Значения для нескольких ключей: {ключ: значение}. Отсутствующие в обоих уровнях
+        загружаются одним вызовом loader(ключи) -> {ключ: значение}; ключей, которых
+        нет в результате loader, нет и в ответе. В отличие от get_or_set, параллельные
+        загрузки не объединяются — метод для прогрева и пакетных чтений.
+        """
+        _ensure_listener()
+        timeout = self.timeout if timeout is None else timeout
+        found = {}
+        remote = []
+        for key in keys:
+            value = self._local_get(key)
+            if value is _MISSING:
+                remote.append(key)
+            else:
+                found[key] = value
+        self._count('local_hits', len(found))
+        if not remote:
+            return found
+
+        remote_values = cache.get_many([self.make_key(key) for key in remote])
+        missing = []
+        for key in remote:
+            remote_key = self.make_key(key)
+            if remote_key in remote_values:
+                found[key] = remote_values[remote_key]
+                self._local_set(key, found[key], timeout)
+            else:
+                missing.append(key)
+        self._count('remote_hits', len(remote) - len(missing))
+        if not missing:
+            return found
+
+        self._count('misses', len(missing))
+        loaded = loader(missing)
+        self._count('loads', len(loaded))
+        cache.set_many({self.make_key(key): value for key, value in loaded.items()}, timeout)
+        for key, value in loaded.items():
+            self._local_set(key, value, timeout)
+        found.update(loaded)
+        return found
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+    def _load(self, key, loader, timeout):
+        remote_key = self.make_key(key)
+        lock_key = f'{remote_key}:lock'
+        deadline = time.monotonic() + settings.TIERED_CACHE_LOCK_TIMEOUT
+        # Загружает держатель блокировки, остальные процессы ждут значение в Redis;
+        # если держатель не успел за TIERED_CACHE_LOCK_TIMEOUT, загружаем сами
+        locked = cache.add(lock_key, os.getpid(), settings.TIERED_CACHE_LOCK_TIMEOUT)
+        while not locked and time.monotonic() < deadline:
+            time.sleep(settings.TIERED_CACHE_POLL_INTERVAL)
+            value = cache.get(remote_key, _MISSING)
+            if value is not _MISSING:
+                self._count('shared_loads')
+                self._local_set(key, value, timeout)
+                return value
+            locked = cache.add(lock_key, os.getpid(), settings.TIERED_CACHE_LOCK_TIMEOUT)
+        try:
+            self._count('loads')
+            value = loader()
+            cache.set(remote_key, value, timeout)
+            self._local_set(key, value, timeout)
+            return value
+        finally:
+            if locked:
+                cache.delete(lock_key)
+
+    def _invalidate(self, keys):
+        cache.delete_many([self.make_key(key) for key in keys])
+        self._drop_local(keys)
+        self._publish(keys)
+
+    def _publish(self, keys):
+        message = json.dumps({'cache': self.name, 'keys': [str(key) for key in keys], 'origin': process_origin()})
+        try:
+            get_redis().publish(INVALIDATION_CHANNEL, message)
+        except redis.RedisError as e:
+            logger.warning(f"Не удалось разослать сброс кеша {self.name}: {e}")
+
+    def _drop_local(self, keys):
+        # В памяти ключи хранятся строками: так же они приходят из pub/sub
+        with self._lock:
+            for key in keys:
+                self._local.pop(str(key), None)
+
+    def _local_get(self, key):
+        key = str(key)
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._local[key]
+                return _MISSING
+            self._local.move_to_end(key)
+            return value
+
+    def _local_set(self, key, value, timeout):
+        key = str(key)
+        ttl = settings.TIERED_CACHE_LOCAL_TTL if timeout is None else min(timeout, settings.TIERED_CACHE_LOCAL_TTL)
+        with self._lock:
+            self._local[key] = (time.monotonic() + ttl, value)
+            self._local.move_to_end(key)
+            while len(self._local) > settings.TIERED_CACHE_MAX_ENTRIES:
+                self._local.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def _count(self, name, value=1):
+        self.stats[name] += value
+        if time.monotonic() - self._stats_flushed_at >= settings.TIERED_CACHE_STATS_INTERVAL:
+            self.flush_stats()
+
+    def flush_stats(self):
+        """Сбрасывает приращения счетчиков процесса в общий хеш Redis."""
+        self._stats_flushed_at = time.monotonic()
+        delta = self.stats - self._stats_flushed
+        if not delta:
+            return
+        try:
+            pipe = get_redis().pipeline()
+            for name, value in delta.items():
+                pipe.hincrby(STATS_KEY, f'{self.name}:{name}', value)
+            pipe.execute()
+            self._stats_flushed.update(delta)
+        except redis.RedisError as e:
+            logger.warning(f"Не удалось сохранить статистику кеша {self.name}: {e}")
+
+
+def get_tiered_cache_stats():
+    """Статистика всех процессов: {кеш: {счетчик: число, ..., 'hit_ratio': доля попаданий}}."""
+    stats = {}
+    for field, value in get_redis().hgetall(STATS_KEY).items():
+        name, _, counter = field.decode().rpartition(':')
+        stats.setdefault(name, {})[counter] = int(value)
+    for counters in stats.values():
+        hits = counters.get('local_hits', 0) + counters.get('remote_hits', 0)
+        lookups = hits + counters.get('misses', 0)
+        counters['hit_ratio'] = round(hits / lookups, 4) if lookups else None
+    return stats
+
+
+def process_origin():
+    """Идентификатор текущего процесса в сообщениях о сбросе кеша."""
+    global _origin
+    pid = os.getpid()
+    if _origin[0] != pid:
+        _origin = (pid, uuid.uuid4().hex)
+    return _origin[1]
+
+
+def _handle_invalidation(data):
+    message = json.loads(data)
+    tiered = _registry.get(message['cache'])
+    # Свой процесс уже обновил память при отправке
+    if tiered is not None and message.get('origin') != process_origin():
+        tiered._drop_local(message['keys'])
+
+
+def _listen():
+    # Отдельный клиент без таймаута чтения: подписка может молчать сколько угодно
+    client = redis.Redis.from_url(settings.REDIS_URL, socket_connect_timeout=2, health_check_interval=30)
+    while True:
+        try:
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Пока подписки не было, сообщения о сбросе могли потеряться
+            for tiered in _registry.values():
+                tiered.clear_local()
+            for message in pubsub.listen():
+                try:
+                    _handle_invalidation(message['data'])
+                except (ValueError, KeyError, TypeError, AttributeError):
+                    # Одно испорченное сообщение не должно останавливать подписку
+                    logger.exception(f"Некорректное сообщение о сбросе кеша: {message.get('data')!r}")
+        except redis.RedisError as e:
+            logger.warning(f"Подписка на сброс кеша прервана: {e}")
+            time.sleep(settings.TIERED_CACHE_RECONNECT_INTERVAL)
+
+
+def _ensure_listener():
+    """Запускает поток подписки на сброс кеша; после fork — заново в дочернем процессе."""
+    global _listener_pid
+    pid = os.getpid()
+    if _listener_pid == pid:
+        return
+    with _listener_lock:
+        if _listener_pid == pid:
+            return
+        # Значения, унаследованные от родителя, могли устареть, пока поток не работал
+        for tiered in _registry.values():
+            tiered.clear_local()
+        process_origin()  # после fork — новый идентификатор, а не родительский
+        threading.Thread(target=_listen, name='tiered-cache-invalidation', daemon=True).start()
+        _listener_pid = pid
@@ -0,0 +1,72 @@
+import json
+import logging
+import time
+
+from celery.signals import before_task_publish, task_prerun, task_postrun, task_retry
+from django.db import close_old_connections
+
+from core.metrics import record_task_run
+
+logger = logging.getLogger(__name__)
+
+
+@before_task_publish.connect
+def stamp_enqueue_time(headers=None, **kwargs):
+    """
+    Добавляет в заголовки сообщения время постановки в очередь.
+    В воркере заголовок доступен как task.request.enqueued_at.
+    """
+    if headers is not None:
+        headers['enqueued_at'] = time.time()
+
+
+@task_prerun.connect
+def mark_task_started(task=None, **kwargs):
+    task.request.metrics_started_at = time.time()
+    task.request.metrics_started = time.perf_counter()
+
+
+@task_retry.connect
+def log_task_retry(sender=None, request=None, reason=None, **kwargs):
+    # Сама попытка попадет в метрики из task_postrun с состоянием RETRY, здесь логируем причину
+    logger.info(json.dumps({
+        'event': 'celery_task_retry',
+        'task': getattr(sender, 'name', None),
+        'task_id': getattr(request, 'id', None),
+        'retries': getattr(request, 'retries', None),
+        'reason': str(reason),
+    }))
+
+
+@task_postrun.connect
+def record_task_metrics(task_id=None, task=None, state=None, **kwargs):
+    """
+    Записывает время ожидания в очереди, время выполнения,
+    число повторов и итоговое состояние задачи.
+    """
+    request = task.request
+    started = getattr(request, 'metrics_started', None)
+    started_at = getattr(request, 'metrics_started_at', None)
+    enqueued_at = getattr(request, 'enqueued_at', None)
+
+    record_task_run({
+        'task': task.name,
+        'task_id': task_id,
+        'state': state,
+        'queue': (request.delivery_info or {}).get('routing_key'),
+        'retries': request.retries or 0,
+        'wait': round(started_at - enqueued_at, 4) if enqueued_at and started_at else None,
+        'runtime': round(time.perf_counter() - started, 4) if started is not None else None,
+        'finished_at': time.time(),
+    })
+
+
+@task_prerun.connect
+@task_postrun.connect
+def close_stale_db_connections(**kwargs):
+    """
+    Как request_started/request_finished для запросов: закрывает подключения,
+    у которых истек CONN_MAX_AGE или которые сломались, остальные переиспользуются.
+    Унаследованные при fork подключения закрывает фиксап Django в Celery (worker_process_init).
+    """
+    close_old_connections()
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+from core.db_connections import expected_connections
+
+
+@register(Tags.database)
+def check_db_connection_budget(app_configs, **kwargs):
+    """
+    Постоянные подключения держатся открытыми все время жизни процесса:
+    их число должно укладываться в DB_MAX_CONNECTIONS (max_connections сервера минус запас).
+    """
+    expected = expected_connections()
+    if expected <= settings.DB_MAX_CONNECTIONS:
+        return []
+    return [Warning(
+        f'Процессы приложения могут открыть до {expected} подключений к каждой БД, '
+        f'а DB_MAX_CONNECTIONS = {settings.DB_MAX_CONNECTIONS}.',
+        hint='Уменьшите WEB_CONCURRENCY, GUNICORN_THREADS или CELERY_WORKER_CONCURRENCY, '
+             'увеличьте max_connections сервера или поставьте перед БД PgBouncer.',
+        id='core.W001',
+    )]
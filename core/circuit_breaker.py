@@ -0,0 +1,117 @@
+import logging
+import threading
+import time
+
+from core.metrics import emit
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Вызов отклонен без обращения к сервису: предохранитель разомкнут."""
+
+
+class CircuitBreaker:
+    """
+    Простой предохранитель (circuit breaker) для вызовов внешнего сервиса.
+
+    - closed: вызовы проходят, подряд идущие сбои считаются;
+    - open: после failure_threshold сбоев подряд вызовы сразу падают с CircuitOpenError;
+    - half-open: через reset_timeout секунд пропускается один пробный вызов,
+      успех замыкает цепь, сбой снова размыкает.
+
+    Сбоем считаются только исключения из failure_exceptions (сеть, 5xx),
+    ошибки запроса (4xx) проходят насквозь и не влияют на состояние.
+    Состояние хранится в процессе.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, name, failure_threshold, reset_timeout, failure_exceptions=(Exception,)):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failure_exceptions = failure_exceptions
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        return self._state
+
+    def _set_state(self, state):
+        if state != self._state:
+            self._state = state
+            logger.warning(f"Предохранитель {self.name}: {state}")
+            emit('circuit_breaker.state', state, breaker=self.name)
+
+    def _before_call(self):
+        with self._lock:
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    raise CircuitOpenError(f'{self.name}: сервис недоступен, повторите позже')
+                self._set_state(self.HALF_OPEN)
+            elif self._state == self.HALF_OPEN:
+                # Пробный вызов уже выполняется, остальные отклоняем
+                raise CircuitOpenError(f'{self.name}: идет пробный вызов')
+
+    def _on_success(self):
+        with self._lock:
+            self._failures = 0
+            self._set_state(self.CLOSED)
+
+    def _on_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._set_state(self.OPEN)
+
+    def _on_other_error(self):
+        # Ошибка запроса означает, что сервис ответил: пробный вызов считается успешным
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._failures = 0
+                self._set_state(self.CLOSED)
+
+    def _release_probe(self):
+        # Вызов прерван (отмена задачи, KeyboardInterrupt): о сервисе ничего не известно.
+        # Освобождаем пробный вызов — следующий вызов снова станет пробным
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._set_state(self.OPEN)
+
+    def call(self, func, *args, **kwargs):
+        self._before_call()
+        try:
+            result = func(*args, **kwargs)
+        except self.failure_exceptions:
+            self._on_failure()
+            raise
+        except Exception:
+            self._on_other_error()
+            raise
+        except BaseException:
+            self._release_probe()
+            raise
+        self._on_success()
+        return result
+
+    async def acall(self, func, *args, **kwargs):
+        self._before_call()
+        try:
+            result = await func(*args, **kwargs)
+        except self.failure_exceptions:
+            self._on_failure()
+            raise
+        except Exception:
+            self._on_other_error()
+            raise
+        except BaseException:
+            self._release_probe()
+            raise
+        self._on_success()
+        return result
@@ -0,0 +1,95 @@
+import logging
+import threading
+import time
+from collections import Counter
+
+import redis
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from core.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Счетчики открытых подключений: поле '<application_name>:<alias>' -> число
+CONNECTIONS_OPENED_KEY = 'metrics:db:connections_opened'
+
+# Подключения, открытые процессом и еще не сброшенные в Redis: alias -> число
+_opened = Counter()
+_opened_lock = threading.Lock()
+_flushed_at = 0.0
+
+
+def expected_connections():
+    """
+    Сколько подключений к каждой БД держит приложение при постоянных подключениях:
+    по одному на поток gunicorn и процесс Celery, плюс beat.
+    """
+    web = settings.WEB_CONCURRENCY * settings.GUNICORN_THREADS
+    return web + settings.CELERY_WORKER_CONCURRENCY + 1
+
+
+@receiver(connection_created)
+def count_connection_opened(sender, connection, **kwargs):
+    """
+    Считает новые подключения к БД. При постоянных подключениях счетчик растет
+    только при старте процессов и после разрывов; рост на каждый запрос означает,
+    что подключения не переиспользуются.
+    Счет ведется в памяти процесса: открытие подключения не ждет Redis.
+    """
+    with _opened_lock:
+        _opened[connection.alias] += 1
+    flush_connections_opened_periodically()
+
+
+@receiver(request_finished)
+def flush_connections_opened_periodically(**kwargs):
+    if _opened and time.monotonic() - _flushed_at >= settings.DB_CONNECTION_STATS_INTERVAL:
+        flush_connections_opened()
+
+
+def flush_connections_opened():
+    """
+    Сбрасывает счетчики процесса в общий хеш Redis. Если Redis недоступен, счетчики
+    остаются в памяти, а следующая попытка — не раньше чем через DB_CONNECTION_STATS_INTERVAL.
+    """
+    global _flushed_at
+    with _opened_lock:
+        _flushed_at = time.monotonic()
+        pending = dict(_opened)
+        _opened.clear()
+    if not pending:
+        return
+    try:
+        pipe = get_redis().pipeline()
+        for alias, count in pending.items():
+            pipe.hincrby(CONNECTIONS_OPENED_KEY, f'{settings.DB_APPLICATION_NAME}:{alias}', count)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Не удалось сохранить число подключений к БД: {e}")
+        with _opened_lock:
+            _opened.update(pending)
+
+
+def get_connections_opened():
+    raw = get_redis().hgetall(CONNECTIONS_OPENED_KEY)
+    return {key.decode(): int(value) for key, value in raw.items()}
+
+
+def server_connections(alias='default'):
+    """
+    Подключения к БД на стороне сервера (Postgres, pg_stat_activity):
+    список (application_name, state, count). Для других СУБД — пустой список.
+    """
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT application_name, COALESCE(state, 'unknown'), count(*) FROM pg_stat_activity "
+            "WHERE datname = current_database() AND backend_type = 'client backend' GROUP BY 1, 2"
+        )
+        return cursor.fetchall()
@@ -0,0 +1,174 @@
+import hashlib
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+# Куда идут чтения в текущем контексте (запрос, задача): на реплику или на основную БД.
+# По умолчанию — основная: код вне запросов (задачи, команды) читает с реплики только явно
+_read_from_replica = ContextVar('read_from_replica', default=False)
+
+# Состояние реплик в процессе: alias -> (время проверки, пригодна ли)
+_replica_health = {}
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def replica_lag(alias):
+    """Отставание реплики в секундах (Postgres); для других СУБД — 0."""
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT CASE WHEN pg_is_in_recovery() '
+            'THEN COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) ELSE 0 END'
+        )
+        return float(cursor.fetchone()[0])
+
+
+def replica_is_healthy(alias):
+    """
+    Реплика пригодна, если доступна и отстает не больше DB_REPLICA_MAX_LAG.
+    Результат проверки кешируется в процессе на DB_REPLICA_CHECK_INTERVAL секунд.
+    """
+    now = time.monotonic()
+    checked = _replica_health.get(alias)
+    if checked is not None and now - checked[0] < settings.DB_REPLICA_CHECK_INTERVAL:
+        return checked[1]
+    try:
+        lag = replica_lag(alias)
+        healthy = lag <= settings.DB_REPLICA_MAX_LAG
+        if not healthy:
+            logger.warning(f"Реплика {alias} отстает на {lag:.1f} с, чтения идут на основную БД")
+    except DatabaseError as e:
+        logger.warning(f"Реплика {alias} недоступна, чтения идут на основную БД: {e}")
+        healthy = False
+    _replica_health[alias] = (now, healthy)
+    return healthy
+
+
+class PrimaryReplicaRouter:
+    """
+    Чтение с реплик (DATABASE_REPLICAS), запись — в основную БД.
+
+    С реплики читается только там, где это разрешено явно: безопасные запросы
+    (ReplicaRoutingMiddleware) и задачи с replica_reads. После первой записи
+    и внутри транзакции контекст читает с основной БД до конца.
+    Отстающая или недоступная реплика пропускается; если пригодных нет — основная БД.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _read_from_replica.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        replicas = [alias for alias in settings.DATABASE_REPLICAS if replica_is_healthy(alias)]
+        return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Дальше в этом контексте читаем свою запись с основной БД
+        _read_from_replica.set(False)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная БД
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def replica_reads():
+    """Чтения внутри блока идут на реплику (для задач, которым не нужны самые свежие данные)."""
+    token = _read_from_replica.set(True)
+    try:
+        yield
+    finally:
+        _read_from_replica.reset(token)
+
+
+@contextmanager
+def primary_reads():
+    """
+    Чтения внутри блока идут на основную БД, даже в запросе, читающем с реплики.
+    Для загрузчиков общих кешей: значение, прочитанное с отстающей реплики,
+    осталось бы в кеше и после сброса (сброс происходит при записи, до догона реплики).
+    """
+    token = _read_from_replica.set(False)
+    try:
+        yield
+    finally:
+        _read_from_replica.reset(token)
+
+
+def read_from_replica(func):
+    """Декоратор для задач только на чтение: см. replica_reads."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with replica_reads():
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def pin_cache_key(request):
+    """
+    Ключ клиента для «прилипания» к основной БД: по заголовку Authorization
+    (JWT) или cookie сессии (админка). Аутентификация к этому моменту еще не выполнена.
+    """
+    credentials = request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not credentials:
+        return None
+    return f'db:pinned:{hashlib.sha256(credentials.encode()).hexdigest()}'
+
+
+def view_reads_from_primary(view_func):
+    """Представление помечено read_from_primary (атрибут функции или класса представления)."""
+    view_class = getattr(view_func, 'view_class', None) or getattr(view_func, 'cls', None)
+    return getattr(view_func, 'read_from_primary', False) or getattr(view_class, 'read_from_primary', False)
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Безопасные запросы (GET, HEAD, OPTIONS) читают с реплик.
+    После успешного изменяющего запроса клиент на DB_REPLICA_STICKY_SECONDS
+    читает с основной БД, чтобы сразу видеть свою запись, даже если реплика отстает.
+    Представления с read_from_primary = True (например, синхронизация, которой
+    отставание реплики стоит пропущенных изменений) всегда читают с основной БД.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        key = pin_cache_key(request)
+        if request.method in SAFE_METHODS:
+            use_replica = key is None or not cache.get(key)
+        else:
+            use_replica = False
+
+        token = _read_from_replica.set(use_replica)
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_from_replica.reset(token)
+
+        if request.method not in SAFE_METHODS and key is not None and response.status_code < 400:
+            cache.set(key, 1, settings.DB_REPLICA_STICKY_SECONDS)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Значение сбрасывается в __call__ вместе с остальным контекстом запроса
+        if view_reads_from_primary(view_func):
+            _read_from_replica.set(False)
+        return None
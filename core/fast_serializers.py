@@ -0,0 +1,178 @@
+import copy
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+# Поля, у которых to_representation для значения из БД ничего не меняет
+IDENTITY_FIELDS = (
+    serializers.CharField, serializers.URLField, serializers.EmailField, serializers.SlugField,
+    serializers.BooleanField, serializers.IntegerField,
+)
+
+
+class ValuesSerializer:
+    """
+    Быстрое представление строк values() в формате сериализатора DRF (только чтение).
+
+    Поля сериализатора разбираются один раз: для каждого заранее известны ключ
+    в строке values() и функция преобразования (Decimal, даты, URL файлов — теми же
+    методами, что и в сериализаторе), поэтому на строку не создаются объекты полей
+    и экземпляры моделей. Результат совпадает с serializer.data байт в байт.
+
+    Поля без прямого соответствия столбцу (SerializerMethodField, вложенные
+    сериализаторы) перечисляются в computed, а их значения передаются в serialize()
+    как функции от строки.
+
+    Разбор полей дороже сериализации страницы из 50 строк, поэтому в представлениях
+    ValuesSerializer берется через for_class(): он строится один раз на класс
+    сериализатора и привязывается к запросу (для URL файлов) через bind().
+    """
+    _cache = {}
+
+    def __init__(self, serializer, computed=()):
+        self.model = serializer.Meta.model
+        self.mapping = []
+        self.values_fields = []
+        # Поля-файлы: имя -> (storage, use_url); их преобразование зависит от запроса
+        self.file_fields = {}
+        for field in serializer.fields.values():
+            if field.write_only:
+                continue
+            name = field.field_name
+            if name in computed:
+                self.mapping.append((name, None, None))
+                continue
+            key = self.values_key(field)
+            self.values_fields.append(key)
+            self.mapping.append((name, key, self.converter(field, serializer.context.get('request'))))
+
+    @classmethod
+    def for_class(cls, serializer_class, computed=(), request=None):
+        """
+        ValuesSerializer для класса сериализатора, разобранный один раз на процесс
+        (и часовой пояс: от него зависит вывод дат), привязанный к request.
+        """
+        key = (serializer_class, tuple(computed), timezone.get_current_timezone())
+        values_serializer = cls._cache.get(key)
+        if values_serializer is None:
+            values_serializer = cls._cache[key] = cls(serializer_class(), computed)
+        return values_serializer.bind(request)
+
+    def bind(self, request):
+        """Копия с URL файлов относительно request (без полей-файлов — сам объект)."""
+        if not self.file_fields:
+            return self
+        bound = copy.copy(self)
+        bound.mapping = [
+            (name, key, self.file_converter(*self.file_fields[name], request) if name in self.file_fields else convert)
+            for name, key, convert in self.mapping
+        ]
+        return bound
+
+    def values_key(self, field):
+        model_field = None
+        if not isinstance(field, (serializers.SerializerMethodField, serializers.BaseSerializer)) \
+                and len(field.source_attrs) == 1:
+            try:
+                model_field = self.model._meta.get_field(field.source_attrs[0])
+            except FieldDoesNotExist:
+                pass
+        if model_field is None or not model_field.concrete:
+            raise ImproperlyConfigured(f'Поле {field.field_name} нужно указать в computed.')
+        # Для внешних ключей в values() берется столбец <name>_id
+        return model_field.attname
+
+    def converter(self, field, request):
+        if isinstance(field, serializers.RelatedField):
+            if not isinstance(field, serializers.PrimaryKeyRelatedField) or field.pk_field is not None:
+                raise ImproperlyConfigured(f'Поле {field.field_name} нужно указать в computed.')
+            return None
+        if isinstance(field, serializers.FileField):
+            storage = self.model._meta.get_field(field.source_attrs[0]).storage
+            use_url = getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL)
+            self.file_fields[field.field_name] = (storage, use_url)
+            return self.file_converter(storage, use_url, request)
+        if isinstance(field, serializers.DateTimeField):
+            return self.datetime_converter(field)
+        if type(field) in IDENTITY_FIELDS:
+            return None
+        return field.to_representation
+
+    @staticmethod
+    def file_converter(storage, use_url, request):
+        def file_url(name):
+            # Как FileField.to_representation: пустое имя -> None, иначе абсолютный URL
+            if not name:
+                return None
+            if not use_url:
+                return name
+            url = storage.url(name)
+            return request.build_absolute_uri(url) if request is not None else url
+
+        return file_url
+
+    def datetime_converter(self, field):
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+        if output_format is None or output_format.lower() != ISO_8601 or field_timezone is None:
+            return field.to_representation
+
+        def to_iso(value):
+            # Как DateTimeField.to_representation, но часовой пояс определяется один раз, а не на строку
+            if value.tzinfo is None:
+                return field.to_representation(value)
+            value = value.astimezone(field_timezone).isoformat()
+            return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+        return to_iso
+
+    def to_representation(self, row, computed=None):
+        data = {}
+        for name, key, convert in self.mapping:
+            if key is None:
+                data[name] = computed[name](row)
+                continue
+            value = row[key]
+            data[name] = value if convert is None or value is None else convert(value)
+        return data
+
+    def serialize(self, rows, computed=None):
+        return [self.to_representation(row, computed) for row in rows]
+
+
+class ValuesListMixin:
+    """
+    list() без создания сериализатора на каждую строку: страница читается через
+    values() и собирается ValuesSerializer. Ответ — тот же, что у ListModelMixin.list.
+
+    Вычисляемые поля сериализатора перечисляются в values_computed_fields,
+    а get_values_computed(rows) возвращает для них функции от строки
+    (данные для них обычно загружаются одним запросом на всю страницу).
+    """
+    values_computed_fields = ()
+
+    def get_values_computed(self, rows):
+        return {}
+
+    def list(self, request, *args, **kwargs):
+        values_serializer = ValuesSerializer.for_class(self.get_serializer_class(), self.values_computed_fields,
+                                                       request)
+        queryset = self.filter_queryset(self.get_queryset()).values(*values_serializer.values_fields)
+        page = self.paginate_queryset(queryset)
+        rows = list(page if page is not None else queryset)
+        data = values_serializer.serialize(rows, self.get_values_computed(rows))
+
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+
+@receiver(setting_changed)
+def reset_values_serializers(**kwargs):
+    # Форматы дат, часовой пояс и use_url читаются при разборе полей
+    ValuesSerializer._cache.clear()
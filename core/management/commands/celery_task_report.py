@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.metrics import fetch_task_runs, summarize_task_runs
+
+
+def _fmt(value):
+    return '-' if value is None else f'{value:.3f}'
+
+
+class Command(BaseCommand):
+    help = 'Сводка по самым медленным задачам Celery за указанный период.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=24, help='Окно отчета в часах (по умолчанию 24).')
+        parser.add_argument('--limit', type=int, default=10, help='Сколько задач показать (по умолчанию 10).')
+
+    def handle(self, *args, **options):
+        since = time.time() - options['hours'] * 3600
+        summary = summarize_task_runs(fetch_task_runs(since))[:options['limit']]
+
+        if not summary:
+            self.stdout.write('Нет данных о выполнении задач за указанный период.')
+            return
+
+        header = f"{'task':<50} {'runs':>6} {'fail':>5} {'retry':>5} {'avg_wait':>9} {'p95_wait':>9} " \
+                 f"{'p50_run':>9} {'p95_run':>9} {'max_run':>9}"
+        self.stdout.write(header)
+        for row in summary:
+            self.stdout.write(
+                f"{row['task']:<50} {row['runs']:>6} {row['failures']:>5} {row['retries']:>5} "
+                f"{_fmt(row['avg_wait']):>9} {_fmt(row['p95_wait']):>9} {_fmt(row['p50_runtime']):>9} "
+                f"{_fmt(row['p95_runtime']):>9} {_fmt(row['max_runtime']):>9}"
+            )
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.warmup import WARMERS, warm_caches
+
+
+class Command(BaseCommand):
+    help = ('Прогревает кеши после деплоя: рейтинг и карточки популярных курсов, группы и флаги '
+            'активных пользователей, схему OpenAPI. Кеши в памяти процесса (схема, первый уровень '
+            'TieredCache) прогреваются только в самой команде — для воркеров gunicorn включите '
+            'WARM_CACHES_ON_START.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', action='append', choices=sorted(WARMERS),
+                            help='Прогреть только указанные кеши (можно повторять).')
+        parser.add_argument('--workers', type=int, help='Число потоков (по умолчанию WARM_CACHES_WORKERS).')
+        parser.add_argument('--timeout', type=float, help='Лимит времени в секундах (по умолчанию WARM_CACHES_TIMEOUT).')
+
+    def handle(self, *args, **options):
+        results = warm_caches(options['only'], workers=options['workers'], timeout=options['timeout'])
+
+        self.stdout.write(f"{'cache':<20} {'items':>7} {'seconds':>8}  status")
+        for result in results:
+            self.stdout.write(
+                f"{result.name:<20} {result.items:>7} {result.seconds:>8.3f}  {result.error or 'ok'}"
+            )
+        failed = [result.name for result in results if result.error]
+        if failed:
+            raise CommandError(f"Не удалось прогреть: {', '.join(failed)}.")
@@ -0,0 +1,97 @@
+import json
+import logging
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+from core.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+GAUGES_KEY = 'metrics:gauges'
+TASK_RUNS_KEY = 'metrics:celery:task_runs'
+
+
+def _metric_key(name, labels):
+    if not labels:
+        return name
+    label_str = ','.join(f'{key}={value}' for key, value in sorted(labels.items()))
+    return f'{name}{{{label_str}}}'
+
+
+def emit(name, value, **labels):
+    """
+    Публикует метрику: структурированная запись в лог + последнее значение в Redis.
+    Ошибки Redis не должны ломать вызывающий код, поэтому только логируются.
+    """
+    payload = {'metric': name, 'value': value, 'ts': time.time(), **labels}
+    logger.info(json.dumps(payload, default=str))
+    try:
+        get_redis().hset(GAUGES_KEY, _metric_key(name, labels), json.dumps(payload, default=str))
+    except Exception as e:
+        logger.warning(f'Не удалось сохранить метрику {name}: {e}')
+
+
+def get_gauges():
+    """Возвращает последние значения всех метрик из Redis."""
+    raw = get_redis().hgetall(GAUGES_KEY)
+    return {key.decode(): json.loads(value) for key, value in raw.items()}
+
+
+def record_task_run(run):
+    """
+    Сохраняет результат выполнения задачи Celery в sorted set (score = время завершения).
+    Старые записи обрезаются по CELERY_TASK_METRICS_RETENTION.
+    """
+    logger.info(json.dumps({'event': 'celery_task', **run}, default=str))
+    now = run['finished_at']
+    try:
+        pipe = get_redis().pipeline()
+        pipe.zadd(TASK_RUNS_KEY, {json.dumps(run, default=str): now})
+        pipe.zremrangebyscore(TASK_RUNS_KEY, '-inf', now - settings.CELERY_TASK_METRICS_RETENTION.total_seconds())
+        pipe.zremrangebyrank(TASK_RUNS_KEY, 0, -settings.CELERY_TASK_METRICS_MAX_RUNS - 1)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f'Не удалось сохранить метрики задачи {run.get("task")}: {e}')
+
+
+def fetch_task_runs(since):
+    """Возвращает записи о выполнении задач, завершившихся после since (unix time)."""
+    return [json.loads(item) for item in get_redis().zrangebyscore(TASK_RUNS_KEY, since, '+inf')]
+
+
+def _percentile(values, percent):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def summarize_task_runs(runs):
+    """
+    Агрегирует записи о выполнении задач по имени задачи.
+    Результат отсортирован по p95 времени выполнения (самые медленные первыми).
+    """
+    grouped = defaultdict(list)
+    for run in runs:
+        grouped[run['task']].append(run)
+
+    summary = []
+    for task_name, task_runs in grouped.items():
+        runtimes = [run['runtime'] for run in task_runs if run.get('runtime') is not None]
+        waits = [run['wait'] for run in task_runs if run.get('wait') is not None]
+        summary.append({
+            'task': task_name,
+            'runs': len(task_runs),
+            'failures': sum(1 for run in task_runs if run.get('state') == 'FAILURE'),
+            'retries': sum(1 for run in task_runs if run.get('state') == 'RETRY'),
+            'avg_wait': sum(waits) / len(waits) if waits else None,
+            'p95_wait': _percentile(waits, 95),
+            'p50_runtime': _percentile(runtimes, 50),
+            'p95_runtime': _percentile(runtimes, 95),
+            'max_runtime': max(runtimes) if runtimes else None,
+        })
+    summary.sort(key=lambda row: row['p95_runtime'] or 0, reverse=True)
+    return summary
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import logging
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import PageNumberPagination
+
+logger = logging.getLogger(__name__)
+
+
+def _table_estimate(cursor, table):
+    """Оценка числа строк таблицы из статистики (для секционированной — сумма по секциям)."""
+    cursor.execute(
+        """
+        SELECT COALESCE(SUM(GREATEST(child.reltuples, 0)), 0) FROM pg_class child
+        WHERE child.oid = %s::regclass
+           OR child.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass)
+        """,
+        [table, table],
+    )
+    return int(cursor.fetchone()[0])
+
+
+def _plan_estimate(cursor, queryset):
+    """Оценка числа строк запроса по плану (EXPLAIN), без выполнения запроса."""
+    sql, params = queryset.query.sql_with_params()
+    cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def estimated_count(queryset):
+    """
+    Приблизительное число строк queryset без COUNT(*).
+    Без фильтров — из статистики таблицы (pg_class.reltuples), с фильтрами — из плана запроса.
+    None — если оценка недоступна (не PostgreSQL, нет статистики, ошибка).
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    queryset = queryset.order_by()
+    try:
+        with connection.cursor() as cursor:
+            if not queryset.query.where:
+                estimate = _table_estimate(cursor, queryset.model._meta.db_table)
+            else:
+                estimate = _plan_estimate(cursor, queryset)
+    except DatabaseError as e:
+        logger.warning(f"Не удалось оценить число строк {queryset.model.__name__}: {e}")
+        return None
+    return estimate or None
+
+
+def count_cache_key(queryset):
+    """Ключ кеша точного числа строк: SQL запроса с параметрами (подпись фильтров)."""
+    sql, params = queryset.order_by().query.sql_with_params()
+    digest = hashlib.sha256(f'{queryset.db}:{sql}:{params!r}'.encode()).hexdigest()
+    return f'core:count:{digest}'
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator для больших таблиц: если оценка числа строк выше threshold
+    (по умолчанию ESTIMATED_COUNT_THRESHOLD), используется она, иначе — точный COUNT(*)
+    (на маленьких выборках он дешевый), закешированный на cache_timeout секунд
+    (по умолчанию EXACT_COUNT_CACHE_TTL) по подписи фильтров.
+    """
+
+    def __init__(self, *args, threshold=None, cache_timeout=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.threshold = settings.ESTIMATED_COUNT_THRESHOLD if threshold is None else threshold
+        self.cache_timeout = settings.EXACT_COUNT_CACHE_TTL if cache_timeout is None else cache_timeout
+        self.count_is_estimate = False
+
+    @cached_property
+    def count(self):
+        object_list = self.object_list
+        if not hasattr(object_list, 'query'):
+            return super().count
+
+        estimate = estimated_count(object_list)
+        if estimate is not None and estimate > self.threshold:
+            self.count_is_estimate = True
+            return estimate
+
+        if not self.cache_timeout:
+            return object_list.count()
+        key = count_cache_key(object_list)
+        count = cache.get(key)
+        if count is None:
+            count = object_list.count()
+            cache.set(key, count, self.cache_timeout)
+        return count
+
+
+class EstimatedCountPagination(PageNumberPagination):
+    """
+    Постраничная пагинация DRF с оценкой общего числа строк (см. EstimatedCountPaginator).
+    Порог задается атрибутом представления estimated_count_threshold.
+    В ответе count_is_estimate показывает, что count приблизительный;
+    при оценке последние страницы могут оказаться пустыми (404).
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.django_paginator_class = partial(
+            EstimatedCountPaginator, threshold=getattr(view, 'estimated_count_threshold', None)
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data['count_is_estimate'] = self.page.paginator.count_is_estimate
+        return response
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema['properties']['count_is_estimate'] = {'type': 'boolean', 'example': False}
+        return schema
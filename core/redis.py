@@ -0,0 +1,17 @@
+import redis
+from django.conf import settings
+
+_clients = {}
+
+
+def get_redis(url=None):
+    """
+    Возвращает общий (на процесс) клиент Redis.
+    По умолчанию подключается к REDIS_URL из настроек.
+    """
+    url = url or settings.REDIS_URL
+    client = _clients.get(url)
+    if client is None:
+        client = redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2)
+        _clients[url] = client
+    return client
@@ -0,0 +1,32 @@
+from django.utils import translation
+from drf_spectacular.settings import spectacular_settings
+from drf_spectacular.views import SpectacularAPIView
+from rest_framework.response import Response
+
+# Схемы, сгенерированные в процессе: (версия API, язык) -> схема
+_schemas = {}
+
+
+def get_schema(version=None, request=None):
+    """
+    Схема OpenAPI для версии API и текущего языка, сгенерированная один раз на процесс.
+    Схема зависит только от кода, поэтому устаревает лишь при деплое вместе с процессом.
+    Первая генерация занимает секунды — ее выполняет прогрев (warm_caches).
+    """
+    key = (version, translation.get_language())
+    schema = _schemas.get(key)
+    if schema is None:
+        generator = spectacular_settings.DEFAULT_GENERATOR_CLASS(api_version=version)
+        schema = _schemas[key] = generator.get_schema(request=request, public=spectacular_settings.SERVE_PUBLIC)
+    return schema
+
+
+class CachedSpectacularAPIView(SpectacularAPIView):
+    """SpectacularAPIView со схемой из get_schema вместо генерации на каждый запрос."""
+
+    def _get_schema_response(self, request):
+        version = self.api_version or request.version or self._get_version_parameter(request)
+        return Response(
+            data=get_schema(version, request),
+            headers={'Content-Disposition': f'inline; filename="{self._get_filename(request, version)}"'},
+        )
@@ -0,0 +1,49 @@
+from celery import shared_task
+from django.conf import settings
+
+from core.cache import get_tiered_cache_stats
+from core.db_connections import flush_connections_opened, get_connections_opened, server_connections
+from core.metrics import emit
+from core.redis import get_redis
+
+
+@shared_task
+def report_broker_queue_depth():
+    """
+    Периодически публикует длину очередей Celery в брокере Redis.
+    (Очередь в Redis-брокере — это обычный список с именем очереди.)
+    """
+    client = get_redis(settings.CELERY_BROKER_URL)
+    depths = {}
+    for queue in settings.CELERY_MONITORED_QUEUES:
+        depths[queue] = client.llen(queue)
+        emit('celery.queue_depth', depths[queue], queue=queue)
+    return depths
+
+
+@shared_task
+def report_db_connections():
+    """
+    Периодически публикует число подключений к БД: на сервере по приложениям
+    и состояниям (active, idle, ...) и сколько подключений открыли процессы всего
+    (процессы сбрасывают свои счетчики раз в DB_CONNECTION_STATS_INTERVAL, воркер — сразу).
+    """
+    for alias in settings.DATABASES:
+        for application, state, count in server_connections(alias):
+            emit('db.connections', count, alias=alias, application=application, state=state)
+    flush_connections_opened()
+    opened = get_connections_opened()
+    for key, count in opened.items():
+        application, _, alias = key.rpartition(':')
+        emit('db.connections_opened', count, alias=alias, application=application)
+    return opened
+
+
+@shared_task
+def report_tiered_cache_stats():
+    """Публикует долю попаданий двухуровневых кешей (счетчики всех процессов из Redis)."""
+    stats = get_tiered_cache_stats()
+    for name, counters in stats.items():
+        if counters['hit_ratio'] is not None:
+            emit('cache.hit_ratio', counters['hit_ratio'], cache=name)
+    return stats
@@ -0,0 +1,617 @@
+import asyncio
+import io
+import json
+import os
+import threading
+import time
+
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import skipUnless
+from unittest.mock import patch
+
+import redis
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils.translation import gettext_lazy
+from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from core import db_router
+from core.batch import build_sub_request
+from core.cache import TieredCache, _handle_invalidation, _listen, process_origin
+from core import schema
+from core.checks import check_db_connection_budget
+from core import db_connections
+from core.db_connections import count_connection_opened, flush_connections_opened
+from core.circuit_breaker import CircuitBreaker, CircuitOpenError
+from core.metrics import summarize_task_runs
+from core.pagination import EstimatedCountPaginator
+from core.renderers import (MessagePackParser, MessagePackRenderer, ORJSONParser, ORJSONRenderer, msgpack,
+                            msgpack_default)
+from core.warmup import WARMERS, warm_caches
+
+
+class TaskMetricsSummaryTests(SimpleTestCase):
+    """Тесты агрегации метрик задач Celery."""
+
+    def test_summary_groups_and_sorts_by_runtime(self):
+        runs = [
+            {'task': 'fast', 'state': 'SUCCESS', 'wait': 0.1, 'runtime': 0.2},
+            {'task': 'slow', 'state': 'SUCCESS', 'wait': 2.0, 'runtime': 5.0},
+            {'task': 'slow', 'state': 'FAILURE', 'wait': 4.0, 'runtime': 1.0},
+            {'task': 'slow', 'state': 'RETRY', 'wait': None, 'runtime': 3.0},
+        ]
+        summary = summarize_task_runs(runs)
+
+        self.assertEqual([row['task'] for row in summary], ['slow', 'fast'])
+        slow = summary[0]
+        self.assertEqual(slow['runs'], 3)
+        self.assertEqual(slow['failures'], 1)
+        self.assertEqual(slow['retries'], 1)
+        self.assertEqual(slow['avg_wait'], 3.0)
+        self.assertEqual(slow['max_runtime'], 5.0)
+
+    def test_summary_empty(self):
+        self.assertEqual(summarize_task_runs([]), [])
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    """Тесты предохранителя для внешних сервисов."""
+
+    def _fail(self):
+        raise ConnectionError('down')
+
+    def test_opens_after_threshold_and_recovers(self):
+        breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=0.05,
+                                 failure_exceptions=(ConnectionError,))
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                breaker.call(self._fail)
+
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.call(lambda: 'ok')
+
+        time.sleep(0.06)
+        self.assertEqual(breaker.call(lambda: 'ok'), 'ok')
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_request_errors_do_not_open_circuit(self):
+        breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=60,
+                                 failure_exceptions=(ConnectionError,))
+        with self.assertRaises(ValueError):
+            breaker.call(int, 'not a number')
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_cancelled_probe_is_released(self):
+        breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=0.05,
+                                 failure_exceptions=(ConnectionError,))
+        with self.assertRaises(ConnectionError):
+            breaker.call(self._fail)
+        time.sleep(0.06)
+
+        async def cancelled():
+            raise asyncio.CancelledError
+
+        with self.assertRaises(asyncio.CancelledError):
+            asyncio.run(breaker.acall(cancelled))
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(breaker.call(lambda: 'ok'), 'ok')  # следующий вызов снова пробный
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+
+@override_settings(ESTIMATED_COUNT_THRESHOLD=100)
+class EstimatedCountPaginatorTests(TestCase):
+    """Тесты пагинатора с оценкой числа строк."""
+
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        for i in range(3):
+            User.objects.create_user(email=f'u{i}@test.com', password='x')
+        self.queryset = User.objects.order_by('pk')
+
+    def test_exact_count_without_estimate(self):
+        # SQLite не дает оценку: считается точно
+        self.assertEqual(EstimatedCountPaginator(self.queryset, 2).count, 3)
+
+    @patch('core.pagination.estimated_count', return_value=5000)
+    def test_large_estimate_replaces_count(self, estimate):
+        paginator = EstimatedCountPaginator(self.queryset, 2)
+        self.assertEqual(paginator.count, 5000)
+        self.assertEqual(paginator.num_pages, 2500)
+
+    @patch('core.pagination.estimated_count', return_value=50)
+    def test_small_estimate_uses_exact_count(self, estimate):
+        paginator = EstimatedCountPaginator(self.queryset, 2)
+        self.assertEqual(paginator.count, 3)
+        self.assertFalse(paginator.count_is_estimate)
+
+    @patch('core.pagination.estimated_count', return_value=5000)
+    def test_per_view_threshold(self, estimate):
+        self.assertEqual(EstimatedCountPaginator(self.queryset, 2, threshold=10000).count, 3)
+
+    def test_exact_count_cached_per_filter(self):
+        self.assertEqual(EstimatedCountPaginator(self.queryset, 2).count, 3)
+        get_user_model().objects.create_user(email='late@test.com', password='x')
+
+        self.assertEqual(EstimatedCountPaginator(self.queryset, 2).count, 3)
+        self.assertEqual(EstimatedCountPaginator(self.queryset.filter(email__startswith='l'), 2).count, 1)
+        self.assertEqual(EstimatedCountPaginator(self.queryset, 2, cache_timeout=0).count, 4)
+
+
+class BatchAPITests(APITestCase):
+    """Тесты пакетного эндпоинта."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='batch@test.com', password='x')
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('batch')
+
+    def test_batch_dispatches_sub_requests(self):
+        from materials.models import Course
+        course = Course.objects.create(title='Batch Course', owner=self.user)
+
+        response = self.client.post(self.url, {'requests': [
+            {'id': 'me', 'path': f'/api/users/profiles/{self.user.pk}/'},
+            {'id': 'courses', 'path': '/api/courses/?page_size=5'},
+            {'id': 'subscribe', 'method': 'POST', 'path': '/api/subscriptions/', 'body': {'course_id': course.pk}},
+            {'id': 'missing', 'path': '/api/nope/'},
+            {'id': 'nested', 'method': 'POST', 'path': '/api/batch/', 'body': {'requests': []}},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = {item['id']: item for item in response.data['responses']}
+        self.assertEqual(results['me']['body']['email'], 'batch@test.com')
+        self.assertEqual(results['courses']['body']['count'], 1)
+        self.assertEqual(results['subscribe']['body'], {'message': 'подписка добавлена'})
+        self.assertEqual(results['missing']['status'], status.HTTP_404_NOT_FOUND)
+        self.assertEqual(results['nested']['status'], status.HTTP_400_BAD_REQUEST)
+
+    def test_batch_rejects_non_drf_views(self):
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.post(self.url, {'requests': [
+            {'id': 'admin', 'path': '/admin/'},
+            {'id': 'async', 'path': '/api/async/courses/'},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = {item['id']: item for item in response.data['responses']}
+        self.assertEqual(results['admin']['status'], status.HTTP_404_NOT_FOUND)
+        self.assertEqual(results['async']['status'], status.HTTP_404_NOT_FOUND)
+
+    def test_unreadable_sub_response_is_500(self):
+        with patch('core.batch.response_body', side_effect=ValueError('broken')):
+            response = self.client.post(self.url, {'requests': [{'path': '/api/courses/'}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['responses'][0]['status'], status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    @override_settings(BATCH_MAX_REQUESTS=2)
+    def test_batch_size_cap(self):
+        requests = [{'path': '/api/courses/'}] * 3
+        response = self.client.post(self.url, {'requests': requests}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_idempotency_key_is_not_inherited(self):
+        parent = RequestFactory().post(self.url, HTTP_IDEMPOTENCY_KEY='batch-key', HTTP_ACCEPT_LANGUAGE='ru')
+
+        inherited = build_sub_request(parent, self.user, 'POST', '/api/users/payments/create/', {})
+        own = build_sub_request(parent, self.user, 'POST', '/api/users/payments/create/', {},
+                                headers={'Idempotency-Key': 'item-key'})
+
+        self.assertNotIn('Idempotency-Key', inherited.headers)
+        self.assertEqual(inherited.headers['Accept-Language'], 'ru')
+        self.assertEqual(own.headers['Idempotency-Key'], 'item-key')
+
+    def test_content_type_header_cannot_be_overridden(self):
+        response = self.client.post(self.url, {'requests': [
+            {'path': '/api/courses/', 'headers': {'Content-Type': 'text/plain'}},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BatchParallelTests(APITransactionTestCase):
+    """Параллельные подзапросы: данные должны быть закоммичены, чтобы их видели потоки пула."""
+
+    def test_parallel_sub_requests_close_thread_connections(self):
+        from materials.models import Course
+        user = get_user_model().objects.create_user(email='parallel@test.com', password='x')
+        Course.objects.create(title='Parallel Course', owner=user)
+        self.client.force_authenticate(user=user)
+        closed_in = []
+        close_all = connections.close_all
+
+        def record_close_all():
+            closed_in.append(threading.current_thread().name)
+            close_all()
+
+        with patch('core.batch.connections.close_all', side_effect=record_close_all):
+            response = self.client.post(reverse('batch'), {'parallel': True, 'requests': [
+                {'id': 'courses', 'path': '/api/courses/'},
+                {'id': 'me', 'path': f'/api/users/profiles/{user.pk}/'},
+            ]}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = {item['id']: item for item in response.data['responses']}
+        self.assertEqual(results['courses']['body']['count'], 1)
+        self.assertEqual(results['me']['body']['email'], 'parallel@test.com')
+        self.assertEqual(len(closed_in), 2)
+        self.assertNotIn(threading.current_thread().name, closed_in)
+
+
+class ORJSONRendererTests(SimpleTestCase):
+    """Тесты рендерера и парсера на orjson."""
+
+    def test_output_matches_drf_json_renderer(self):
+        data = {
+            'title': 'Курс',
+            'created': datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=dt_timezone.utc),
+            'label': gettext_lazy('Email'),
+            'lessons': [{'id': 1}, {'id': 2}],
+            1: 'non-str key',
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_decimal_rendered_as_string(self):
+        self.assertEqual(json.loads(ORJSONRenderer().render({'price': Decimal('1990.10')})), {'price': '1990.10'})
+
+    def test_none_renders_empty_body(self):
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+
+    def test_parser(self):
+        self.assertEqual(ORJSONParser().parse(io.BytesIO('{"title": "Курс"}'.encode())), {'title': 'Курс'})
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(io.BytesIO(b'{"title":'))
+
+
+class MessagePackDefaultTests(SimpleTestCase):
+    """Преобразование типов для MessagePack не требует установленного msgpack."""
+
+    def test_types_converted_like_json(self):
+        moment = datetime(2024, 5, 1, 12, 30, tzinfo=dt_timezone.utc)
+        self.assertEqual(msgpack_default(moment), '2024-05-01T12:30:00+00:00')
+        self.assertEqual(msgpack_default(moment.date()), '2024-05-01')
+        self.assertEqual(msgpack_default(Decimal('10.50')), '10.50')
+        self.assertEqual(msgpack_default(gettext_lazy('Курс')), 'Курс')
+        with self.assertRaises(TypeError):
+            msgpack_default(object())
+
+
+@skipUnless(msgpack is not None, 'msgpack не установлен')
+class MessagePackTests(APITestCase):
+    """Тесты рендерера, парсера и согласования формата MessagePack."""
+
+    def test_render_parse_round_trip(self):
+        data = {'title': 'Курс', 'price': Decimal('10.50'), 'created': datetime(2024, 5, 1, tzinfo=dt_timezone.utc),
+                'tags': ['a', 'b'], 'count': 3, 'empty': None}
+
+        rendered = MessagePackRenderer().render(data)
+        parsed = MessagePackParser().parse(io.BytesIO(rendered))
+
+        self.assertEqual(parsed, {'title': 'Курс', 'price': '10.50', 'created': '2024-05-01T00:00:00+00:00',
+                                  'tags': ['a', 'b'], 'count': 3, 'empty': None})
+        self.assertEqual(MessagePackRenderer().render(None), b'')
+
+    def test_invalid_body(self):
+        with self.assertRaises(ParseError):
+            MessagePackParser().parse(io.BytesIO(b'\xc1'))
+
+    def test_accept_header_selects_msgpack(self):
+        from materials.models import Course
+        user = get_user_model().objects.create_user(email='msgpack@test.com', password='x')
+        Course.objects.create(title='Msgpack Course', owner=user)
+        self.client.force_authenticate(user=user)
+
+        response = self.client.get('/api/courses/', HTTP_ACCEPT='application/msgpack')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        body = msgpack.unpackb(response.content, raw=False)
+        self.assertEqual(body['count'], 1)
+        self.assertEqual(body['results'][0]['title'], 'Msgpack Course')
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], DB_REPLICA_STICKY_SECONDS=10)
+class ReplicaRoutingTests(SimpleTestCase):
+    """Тесты маршрутизации чтений на реплики."""
+
+    def setUp(self):
+        cache.clear()
+        db_router._replica_health.clear()
+        self.router = db_router.PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+
+    def route(self, method, write=False, **headers):
+        """Запрос через middleware; возвращает БД, выбранную для чтения внутри представления."""
+        chosen = []
+
+        def view(request):
+            if write:
+                self.router.db_for_write(None)
+            chosen.append(self.router.db_for_read(None))
+            return HttpResponse(status=201 if method == 'post' else 200)
+
+        middleware = db_router.ReplicaRoutingMiddleware(view)
+        middleware(getattr(self.factory, method)('/api/courses/', **headers))
+        return chosen[0]
+
+    @patch('core.db_router.replica_lag', return_value=0)
+    def test_safe_requests_read_from_replica(self, replica_lag):
+        self.assertEqual(self.router.db_for_read(None), 'default')  # вне запроса — основная БД
+        self.assertEqual(self.route('get'), 'replica1')
+        self.assertEqual(self.route('post'), 'default')
+        self.assertEqual(self.route('get', write=True), 'default')
+        self.assertEqual(self.router.db_for_write(None), 'default')
+
+    @patch('core.db_router.replica_lag', return_value=0)
+    def test_client_sticks_to_primary_after_write(self, replica_lag):
+        self.route('post', HTTP_AUTHORIZATION='Bearer writer')
+        self.assertEqual(self.route('get', HTTP_AUTHORIZATION='Bearer writer'), 'default')
+        self.assertEqual(self.route('get', HTTP_AUTHORIZATION='Bearer reader'), 'replica1')
+
+    @patch('core.db_router.replica_lag', return_value=60)
+    def test_lagging_replica_falls_back_to_primary(self, replica_lag):
+        self.assertEqual(self.route('get'), 'default')
+        self.route('get')
+        replica_lag.assert_called_once()  # результат проверки кешируется
+
+    @patch('core.db_router.replica_lag', return_value=0)
+    def test_view_can_require_primary(self, replica_lag):
+        chosen = []
+
+        def view(request):
+            chosen.append(self.router.db_for_read(None))
+            return HttpResponse()
+
+        class PrimaryView:
+            read_from_primary = True
+
+        primary_view = SimpleNamespace(view_class=PrimaryView)
+        for view_func in (view, primary_view):
+            def handler(request, view_func=view_func):
+                # Как обработчик Django: process_view перед вызовом представления
+                middleware.process_view(request, view_func, (), {})
+                return view(request)
+
+            middleware = db_router.ReplicaRoutingMiddleware(handler)
+            middleware(self.factory.get('/api/sync/'))
+
+        self.assertEqual(chosen, ['replica1', 'default'])
+        self.assertEqual(self.route('get'), 'replica1')  # пометка не переживает запрос
+
+    @patch('core.db_router.replica_lag', return_value=0)
+    def test_replica_reads_for_tasks(self, replica_lag):
+        with db_router.replica_reads():
+            self.assertEqual(self.router.db_for_read(None), 'replica1')
+        self.assertEqual(self.router.db_for_read(None), 'default')
+
+    @patch('core.db_router.replica_lag', return_value=0)
+    def test_primary_reads_inside_replica_context(self, replica_lag):
+        with db_router.replica_reads():
+            with db_router.primary_reads():
+                self.assertEqual(self.router.db_for_read(None), 'default')
+            self.assertEqual(self.router.db_for_read(None), 'replica1')
+
+
+class CacheLoaderPrimaryReadsTests(TestCase):
+    """Загрузчики общих кешей читают с основной БД, даже если запрос читает с реплики."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_loaders_read_from_primary(self):
+        from materials.cache import course_cards, get_course_card
+        from materials.models import Course
+        from users.authentication import get_auth_state
+        from users.entitlements import get_entitled_course_ids
+        from users.models import user_groups_cache
+
+        user = get_user_model().objects.create_user(email='loader@test.com', password='x')
+        course = Course.objects.create(title='Loader Course', owner=user)
+        user = get_user_model().objects.get(pk=user.pk)
+        course_cards.clear_local()
+        user_groups_cache.clear_local()
+        cache.clear()
+        read_from_replica = []
+
+        def record(execute, sql, params, many, context):
+            read_from_replica.append(db_router._read_from_replica.get())
+            return execute(sql, params, many, context)
+
+        with connections['default'].execute_wrapper(record), db_router.replica_reads():
+            get_entitled_course_ids(user)
+            get_course_card(course.pk)
+            user.group_names
+            get_auth_state(user.pk)
+
+        self.assertEqual(len(read_from_replica), 4)
+        self.assertNotIn(True, read_from_replica)
+
+
+class DatabaseConnectionTests(SimpleTestCase):
+    """Тесты учета и бюджета подключений к БД."""
+
+    @override_settings(WEB_CONCURRENCY=3, GUNICORN_THREADS=4, CELERY_WORKER_CONCURRENCY=4, DB_MAX_CONNECTIONS=17)
+    def test_connection_budget_check(self):
+        self.assertEqual(check_db_connection_budget(None), [])  # 3 * 4 + 4 + 1 = 17
+        with self.settings(WEB_CONCURRENCY=4):
+            self.assertEqual([warning.id for warning in check_db_connection_budget(None)], ['core.W001'])
+
+    @override_settings(DB_APPLICATION_NAME='lms-web', DB_CONNECTION_STATS_INTERVAL=60)
+    @patch('core.db_connections.get_redis')
+    def test_opened_connections_counted_in_memory(self, get_redis):
+        db_connections._opened.clear()
+        pipe = get_redis.return_value.pipeline.return_value
+        with patch('core.db_connections._flushed_at', time.monotonic()):
+            count_connection_opened(sender=None, connection=SimpleNamespace(alias='default'))
+            count_connection_opened(sender=None, connection=SimpleNamespace(alias='default'))
+            get_redis.assert_not_called()  # до истечения интервала Redis не трогаем
+
+            flush_connections_opened()
+        pipe.hincrby.assert_called_once_with('metrics:db:connections_opened', 'lms-web:default', 2)
+        self.assertEqual(db_connections._opened, {})
+
+    @override_settings(DB_CONNECTION_STATS_INTERVAL=60)
+    @patch('core.db_connections.get_redis')
+    def test_opened_connections_kept_while_redis_fails(self, get_redis):
+        db_connections._opened.clear()
+        pipe = get_redis.return_value.pipeline.return_value
+        pipe.execute.side_effect = redis.ConnectionError('down')
+        with patch('core.db_connections._flushed_at', 0.0):
+            count_connection_opened(sender=None, connection=SimpleNamespace(alias='default'))
+            count_connection_opened(sender=None, connection=SimpleNamespace(alias='default'))
+        pipe.execute.assert_called_once()  # вторая попытка — только через интервал
+        self.assertEqual(db_connections._opened, {'default': 2})
+        db_connections._opened.clear()
+
+
+@patch('core.cache._ensure_listener')
+@patch('core.cache.get_redis')
+class TieredCacheTests(SimpleTestCase):
+    """Тесты двухуровневого кеша (память процесса + кеш Django)."""
+
+    def setUp(self):
+        cache.clear()
+        self.tiered = TieredCache('test', timeout=60)
+
+    @override_settings(TIERED_CACHE_MAX_ENTRIES=2)
+    def test_local_tier_is_lru(self, get_redis, ensure_listener):
+        for key in ('a', 'b'):
+            self.tiered.set(key, key)
+        self.tiered.get('a')
+        self.tiered.set('c', 'c')
+        self.assertEqual(list(self.tiered._local), ['a', 'c'])
+        self.assertEqual(self.tiered.stats['evictions'], 1)
+        self.assertEqual(self.tiered.get('b'), 'b')  # вытесненное значение остается в кеше Django
+        self.assertEqual(self.tiered.stats['remote_hits'], 1)
+
+    def test_get_or_set_loads_once(self, get_redis, ensure_listener):
+        calls = []
+
+        def loader():
+            calls.append(1)
+            time.sleep(0.05)
+            return 'value'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.tiered.get_or_set(1, loader)))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['value'] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self.tiered.get_or_set(1, loader), 'value')
+        self.assertEqual(len(calls), 1)
+
+    def test_delete_is_published_to_other_processes(self, get_redis, ensure_listener):
+        self.tiered.set(1, 'old')
+        self.tiered.delete(1)
+        message = json.loads(get_redis.return_value.publish.call_args.args[1])
+        self.assertEqual(message, {'cache': 'test', 'keys': ['1'], 'origin': process_origin()})
+        self.assertIsNone(self.tiered.get(1))
+
+    def test_invalidation_from_other_process_drops_local_value(self, get_redis, ensure_listener):
+        self.tiered.set(1, 'old')
+        cache.set(self.tiered.make_key(1), 'new')  # другой процесс изменил значение
+        _handle_invalidation(json.dumps({'cache': 'test', 'keys': ['1'], 'origin': process_origin()}))
+        self.assertEqual(self.tiered.get(1), 'old')  # свое же сообщение не сбрасывает память
+        # Тот же PID в другом контейнере — другой процесс
+        _handle_invalidation(json.dumps({'cache': 'test', 'keys': ['1'], 'origin': os.getpid()}))
+        self.assertEqual(self.tiered.get(1), 'new')
+
+    def test_origin_changes_after_fork(self, get_redis, ensure_listener):
+        origin = process_origin()
+        self.assertEqual(process_origin(), origin)
+        with patch('core.cache.os.getpid', return_value=os.getpid() + 1):
+            self.assertNotEqual(process_origin(), origin)
+
+    @patch('core.cache.time.sleep', side_effect=KeyboardInterrupt)
+    @patch('core.cache.redis.Redis.from_url')
+    def test_listener_survives_bad_message(self, from_url, sleep, get_redis, ensure_listener):
+        pubsub = from_url.return_value.pubsub.return_value
+
+        def listen():
+            # Значение в памяти появляется после подписки (clear_local при подписке его бы сбросил)
+            self.tiered._local_set(1, 'old', 60)
+            yield {'data': b'not json'}
+            yield {'data': json.dumps({'keys': ['1']})}
+            yield {'data': json.dumps({'cache': 'test', 'keys': ['1'], 'origin': 'other'})}
+            raise redis.ConnectionError('stop')
+
+        pubsub.listen.side_effect = listen
+        with self.assertLogs('core.cache', 'ERROR') as logs, self.assertRaises(KeyboardInterrupt):
+            _listen()
+        self.assertEqual(len(logs.records), 2)
+        self.assertNotIn('1', self.tiered._local)  # сообщение после испорченных обработано
+
+    def test_stats_flushed_as_deltas(self, get_redis, ensure_listener):
+        self.tiered.get(1)
+        self.tiered.set(1, 'value')
+        self.tiered.get(1)
+        self.tiered.flush_stats()
+        pipe = get_redis.return_value.pipeline.return_value
+        pipe.hincrby.assert_any_call('metrics:tiered_cache', 'test:misses', 1)
+        pipe.hincrby.assert_any_call('metrics:tiered_cache', 'test:local_hits', 1)
+        pipe.reset_mock()
+        self.tiered.flush_stats()
+        pipe.hincrby.assert_not_called()
+
+    def test_get_or_set_many_loads_only_missing(self, get_redis, ensure_listener):
+        self.tiered.set(1, 'one')
+        cache.set(self.tiered.make_key(2), 'two')
+        loaded = []
+
+        def loader(keys):
+            loaded.extend(keys)
+            return {key: str(key) for key in keys if key != 4}
+
+        self.assertEqual(self.tiered.get_or_set_many([1, 2, 3, 4], loader), {1: 'one', 2: 'two', 3: '3'})
+        self.assertEqual(loaded, [3, 4])
+        self.assertEqual(self.tiered.get(3), '3')
+        self.assertEqual(self.tiered.stats['loads'], 1)
+
+
+def _broken_warmer():
+    raise RuntimeError('boom')
+
+
+@patch('core.warmup.emit')
+class WarmCachesTests(SimpleTestCase):
+    """Тесты параллельного прогрева кешей."""
+
+    @patch.dict(WARMERS, {'first': lambda: 3, 'broken': _broken_warmer, 'slow': lambda: time.sleep(0.5)}, clear=True)
+    def test_results_reported_per_cache(self, emit):
+        results = warm_caches(workers=3, timeout=0.2)
+        self.assertEqual([(result.name, result.items, result.error) for result in results],
+                         [('first', 3, None), ('broken', 0, 'boom'), ('slow', 0, 'timeout')])
+        self.assertEqual(emit.call_count, 3)
+        emit.assert_any_call('cache.warmup_seconds', round(results[0].seconds, 3), cache='first', ok=True)
+
+    @patch.dict(WARMERS, {'first': lambda: 3}, clear=True)
+    def test_unknown_cache_rejected(self, emit):
+        with self.assertRaises(ValueError):
+            warm_caches(['first', 'missing'])
+
+
+class CachedSchemaTests(APITestCase):
+    """Схема OpenAPI генерируется один раз на процесс."""
+
+    @patch.dict(schema._schemas, clear=True)
+    def test_schema_generated_once(self):
+        with patch('drf_spectacular.generators.SchemaGenerator.get_schema', return_value={'openapi': '3.0.3'}) as get:
+            for _ in range(2):
+                response = self.client.get(reverse('schema'), HTTP_ACCEPT='application/vnd.oai.openapi+json')
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(json.loads(response.content), {'openapi': '3.0.3'})
+        get.assert_called_once()
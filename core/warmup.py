@@ -0,0 +1,78 @@
+import logging
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import connections
+
+from core.metrics import emit
+from core.schema import get_schema
+
+logger = logging.getLogger(__name__)
+
+# Результат прогрева одного кеша: сколько значений прогрето, за сколько секунд, ошибка (или None)
+WarmupResult = namedtuple('WarmupResult', ['name', 'items', 'seconds', 'error'])
+
+# Зарегистрированные прогревы: имя -> функция без аргументов, возвращающая число значений
+WARMERS = {}
+
+
+def warmer(name):
+    """Регистрирует функцию прогрева кеша. Модули с прогревами импортируются в AppConfig.ready."""
+    def decorator(func):
+        WARMERS[name] = func
+        return func
+    return decorator
+
+
+def _run(name, func):
+    started = time.perf_counter()
+    try:
+        items, error = func(), None
+    except Exception as e:
+        logger.exception(f"Не удалось прогреть кеш {name}")
+        items, error = 0, str(e)
+    finally:
+        # Подключения к БД открываются в потоках пула и закрываются вместе с задачей
+        connections.close_all()
+    return WarmupResult(name, items, time.perf_counter() - started, error)
+
+
+def warm_caches(names=None, workers=None, timeout=None):
+    """
+    Параллельно прогревает кеши (все зарегистрированные или только names)
+    не более чем в workers потоках (по умолчанию WARM_CACHES_WORKERS).
+    Не дольше timeout секунд (WARM_CACHES_TIMEOUT): незавершенные прогревы
+    дорабатывают в фоне и попадают в отчет с ошибкой 'timeout'.
+    Возвращает список WarmupResult в порядке names.
+    """
+    names = list(WARMERS) if names is None else names
+    unknown = set(names) - set(WARMERS)
+    if unknown:
+        raise ValueError(f"Неизвестные кеши: {', '.join(sorted(unknown))}")
+    timeout = settings.WARM_CACHES_TIMEOUT if timeout is None else timeout
+
+    started = time.perf_counter()
+    executor = ThreadPoolExecutor(max_workers=workers or settings.WARM_CACHES_WORKERS,
+                                  thread_name_prefix='warm-caches')
+    futures = {name: executor.submit(_run, name, WARMERS[name]) for name in names}
+    wait(futures.values(), timeout=timeout)
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    results = []
+    for name, future in futures.items():
+        if future.done() and not future.cancelled():
+            result = future.result()
+        else:
+            result = WarmupResult(name, 0, time.perf_counter() - started, 'timeout')
+        emit('cache.warmup_seconds', round(result.seconds, 3), cache=name, ok=result.error is None)
+        results.append(result)
+    return results
+
+
+@warmer('openapi_schema')
+def warm_openapi_schema():
+    """Схема OpenAPI хранится в памяти процесса: прогрев полезен только в самом процессе (воркере)."""
+    get_schema()
+    return 1
@@ -0,0 +1,18 @@
+# Настройки gunicorn, общие для WSGI и ASGI: воркеры и потоки задаются в docker-compose.yml
+
+
+def post_worker_init(worker):
+    """
+    Прогревает кеши воркера до приема запросов, если WARM_CACHES_ON_START.
+    Прогрев ограничен WARM_CACHES_TIMEOUT и должен укладываться в таймаут воркера.
+    """
+    from django.conf import settings
+    if not settings.WARM_CACHES_ON_START:
+        return
+
+    from core.warmup import warm_caches
+    results = warm_caches()
+    worker.log.info('Кеши прогреты: ' + ', '.join(
+        f"{result.name}={result.items} за {result.seconds:.2f} с{f' ({result.error})' if result.error else ''}"
+        for result in results
+    ))
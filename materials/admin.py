@@ -1,15 +1,31 @@
 from django.contrib import admin
+from django.utils import timezone
+
+from core.admin import PerformanceAdminMixin
 from materials.models import Course, Lesson, Subscription
 
 
 @admin.register(Course)
-class CourseAdmin(admin.ModelAdmin):
+class CourseAdmin(PerformanceAdminMixin, admin.ModelAdmin):
     list_display = ('title', 'description')
+    search_fields = ('^title',)
+    autocomplete_fields = ('owner',)
+
+    def save_model(self, request, obj, form, change):
+        # Метка изменения нужна клиентам /api/sync/
+        obj.last_updated_at = timezone.now()
+        super().save_model(request, obj, form, change)
 
 @admin.register(Lesson)
-class LessonAdmin(admin.ModelAdmin):
+class LessonAdmin(PerformanceAdminMixin, admin.ModelAdmin):
     list_display = ('title', 'course', 'video_url')
+    list_select_related = ('course',)
+    search_fields = ('^title',)
+    autocomplete_fields = ('course', 'owner')
 
 @admin.register(Subscription)
-class SubscriptionAdmin(admin.ModelAdmin):
-    list_display = ('user', 'course')
\ No newline at end of file
+class SubscriptionAdmin(PerformanceAdminMixin, admin.ModelAdmin):
+    list_display = ('user', 'course')
+    list_select_related = ('user', 'course')
+    search_fields = ('^user__email', '^course__title')
+    autocomplete_fields = ('user', 'course')
\ No newline at end of file
@@ -0,0 +1,258 @@
+import asyncio
+import logging
+
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Q
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from rest_framework import status
+
+from core.async_views import AsyncAPIView, error_response
+from core.fast_serializers import ValuesSerializer
+from core.pagination import EstimatedCountPaginator
+from materials.events import event_id_key, format_sse, get_event_hub, read_course_events_after
+from materials.models import Course, Lesson, Subscription
+from materials.paginators import MaterialsPagination
+from materials.serializers import LessonSerializer
+from users.entitlements import get_entitled_course_ids
+
+logger = logging.getLogger(__name__)
+
+
+def lesson_values_serializer(request):
+    """Уроки из строк values() в формате LessonSerializer."""
+    return ValuesSerializer.for_class(LessonSerializer, request=request)
+
+
+async def ais_moderator(user):
+    # Для пользователя из JWT группы берутся из claims, иначе — запрос к БД
+    return await sync_to_async(lambda: user.is_moderator)()
+
+
+def file_url(request, name):
+    if not name:
+        return None
+    return request.build_absolute_uri(default_storage.url(name))
+
+
+async def courses_to_dicts(request, courses):
+    """
+    Курсы в формате CourseSerializer.
+    Уроки, подписки и покупки загружаются одним запросом на все курсы страницы.
+    """
+    course_ids = [course.pk for course in courses]
+    lesson_serializer = lesson_values_serializer(request)
+    lessons = {course_id: [] for course_id in course_ids}
+    async for lesson in Lesson.objects.filter(course_id__in=course_ids).order_by('pk').values(
+            *lesson_serializer.values_fields):
+        lessons[lesson['course_id']].append(lesson_serializer.to_representation(lesson))
+    subscribed = {
+        course_id async for course_id in Subscription.objects.filter(
+            user=request.user, course_id__in=course_ids
+        ).values_list('course_id', flat=True)
+    }
+    purchased = await sync_to_async(get_entitled_course_ids)(request.user)
+
+    return [
+        {
+            'id': course.pk,
+            'title': course.title,
+            'description': course.description,
+            'preview': file_url(request, course.preview.name),
+            'owner': course.owner_id,
+            'price': f'{course.price:.2f}',
+            'lesson_count': len(lessons[course.pk]),
+            'lessons': lessons[course.pk],
+            'is_subscribed': course.pk in subscribed,
+            'is_purchased': course.pk in purchased,
+        }
+        for course in courses
+    ]
+
+
+async def paginate(request, queryset):
+    """
+    Страница в формате MaterialsPagination (параметры page и page_size);
+    count считается так же, как в синхронном списке (EstimatedCountPaginator).
+    """
+    pagination = MaterialsPagination()
+    try:
+        page_size = min(int(request.GET.get(pagination.page_size_query_param, pagination.page_size)),
+                        pagination.max_page_size)
+        page = int(request.GET.get(pagination.page_query_param, 1))
+    except ValueError:
+        raise Http404
+    if page < 1 or page_size < 1:
+        raise Http404
+
+    paginator = EstimatedCountPaginator(queryset, page_size)
+    count = await sync_to_async(lambda: paginator.count)()
+    offset = (page - 1) * page_size
+    if offset and offset >= count:
+        raise Http404
+    items = [item async for item in queryset[offset:offset + page_size]]
+
+    def page_url(number):
+        query = request.GET.copy()
+        query[pagination.page_query_param] = number
+        return request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+
+    return {
+        'count': count,
+        'next': page_url(page + 1) if offset + page_size < count else None,
+        'previous': page_url(page - 1) if page > 1 else None,
+        'results': items,
+        'count_is_estimate': paginator.count_is_estimate,
+    }
+
+
+class AsyncCourseListView(AsyncAPIView):
+    """
+    Асинхронный список курсов (как CourseViewSet.list):
+    модераторы видят все курсы, остальные — свои.
+    """
+
+    async def get(self, request):
+        courses = Course.objects.order_by('pk')
+        if not await ais_moderator(request.user):
+            courses = courses.filter(owner=request.user)
+        try:
+            data = await paginate(request, courses)
+        except Http404:
+            return error_response('Неверная страница.', status.HTTP_404_NOT_FOUND)
+        data['results'] = await courses_to_dicts(request, data['results'])
+        return JsonResponse(data)
+
+
+class AsyncCourseDetailView(AsyncAPIView):
+    """Асинхронный просмотр курса (как CourseViewSet.retrieve): модератор или владелец."""
+
+    async def get(self, request, pk):
+        try:
+            course = await Course.objects.aget(pk=pk)
+        except Course.DoesNotExist:
+            return error_response('Курс не найден.', status.HTTP_404_NOT_FOUND)
+        if course.owner_id != request.user.pk and not await ais_moderator(request.user):
+            return error_response('Курс не найден.', status.HTTP_404_NOT_FOUND)
+        return JsonResponse((await courses_to_dicts(request, [course]))[0])
+
+
+class AsyncLessonListView(AsyncAPIView):
+    """Асинхронный список уроков (как LessonListCreateView.get)."""
+
+    async def get(self, request):
+        lesson_serializer = lesson_values_serializer(request)
+        lessons = Lesson.objects.order_by('pk').values(*lesson_serializer.values_fields)
+        if not await ais_moderator(request.user):
+            lessons = lessons.filter(owner=request.user)
+        try:
+            data = await paginate(request, lessons)
+        except Http404:
+            return error_response('Неверная страница.', status.HTTP_404_NOT_FOUND)
+        data['results'] = lesson_serializer.serialize(data['results'])
+        return JsonResponse(data)
+
+
+class AsyncLessonDetailView(AsyncAPIView):
+    """
+    Асинхронный просмотр урока (как LessonRetrieveUpdateDestroyView.get):
+    модератор, владелец или покупатель курса.
+    """
+
+    async def get(self, request, pk):
+        lessons = Lesson.objects.filter(pk=pk)
+        if not await ais_moderator(request.user):
+            purchased = await sync_to_async(get_entitled_course_ids)(request.user)
+            lessons = lessons.filter(Q(owner=request.user) | Q(course_id__in=purchased))
+        lesson_serializer = lesson_values_serializer(request)
+        lesson = await lessons.values(*lesson_serializer.values_fields).afirst()
+        if lesson is None:
+            return error_response('Урок не найден.', status.HTTP_404_NOT_FOUND)
+        return JsonResponse(lesson_serializer.to_representation(lesson))
+
+
+class AsyncSubscriptionToggleView(AsyncAPIView):
+    """Асинхронный переключатель подписки (как SubscriptionToggleView)."""
+
+    async def post(self, request):
+        data = self.parse_body(request)
+        course_id = data.get('course_id') if data is not None else None
+        if not course_id:
+            return error_response('Не указан course_id')
+        try:
+            course_id = int(course_id)
+        except (TypeError, ValueError):
+            return error_response('Некорректный course_id')
+        if not await Course.objects.filter(pk=course_id).aexists():
+            return error_response('Курс не найден.', status.HTTP_404_NOT_FOUND)
+
+        subscription, created = await Subscription.objects.aget_or_create(user=request.user, course_id=course_id)
+        if created:
+            message = 'подписка добавлена'
+        else:
+            await subscription.adelete()
+            message = 'подписка удалена'
+        return JsonResponse({'message': message}, status=status.HTTP_200_OK)
+
+
+class CourseEventStreamView(AsyncAPIView):
+    """
+    Поток Server-Sent Events об изменениях курсов, на которые подписан пользователь.
+
+    - события приходят из общей на процесс подписки Redis pub/sub (CourseEventHub);
+    - раз в SSE_HEARTBEAT_INTERVAL секунд без событий отправляется комментарий-heartbeat;
+    - при переподключении с заголовком Last-Event-ID пропущенные события
+      досылаются из журнала (Redis Stream).
+
+    Работает только под ASGI: WSGI-сервер не может отдавать бесконечный асинхронный поток
+    (он держал бы рабочий поток на все соединение), поэтому под WSGI отвечаем 501.
+    """
+
+    async def get(self, request):
+        if not isinstance(request, ASGIRequest):
+            return error_response('Поток событий доступен только под ASGI.', status.HTTP_501_NOT_IMPLEMENTED)
+        course_ids = {
+            course_id async for course_id in Subscription.objects.filter(
+                user=request.user
+            ).values_list('course_id', flat=True)
+        }
+        last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+        response = StreamingHttpResponse(self.stream(course_ids, last_event_id), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # nginx не должен буферизовать поток
+        return response
+
+    async def stream(self, course_ids, last_event_id):
+        hub = get_event_hub()
+        # Подписываемся до чтения журнала, чтобы не потерять события между ними
+        queue = hub.subscribe(course_ids)
+        try:
+            yield f'retry: {settings.SSE_RETRY_MS}\n\n'
+            last_key = None
+            if last_event_id:
+                try:
+                    last_key = event_id_key(last_event_id)
+                    for event in await read_course_events_after(hub.client, last_event_id, course_ids):
+                        last_key = event_id_key(event['id'])
+                        yield format_sse(event)
+                except ValueError:
+                    last_key = None  # некорректный Last-Event-ID: только новые события
+                except redis.RedisError as e:
+                    logger.warning(f"Не удалось дослать пропущенные события: {e}")
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=settings.SSE_HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ': heartbeat\n\n'
+                    continue
+                if event is None:
+                    return  # клиент отстал, переподключится с Last-Event-ID
+                if last_key is not None and event_id_key(event['id']) <= last_key:
+                    continue  # уже отправлено из журнала
+                yield format_sse(event)
+        finally:
+            hub.unsubscribe(queue, course_ids)
@@ -0,0 +1,64 @@
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router
+from django.db.models import Count
+
+from core.cache import TieredCache
+from core.db_router import primary_reads
+from materials.models import Course, Subscription
+from users.models import CourseEntitlement
+
+# Поля курса, которые нужны часто и без остального курса: цена, владелец, название
+COURSE_CARD_FIELDS = ('id', 'title', 'price', 'owner_id')
+
+course_cards = TieredCache('course_cards', timeout=settings.COURSE_CARD_CACHE_TTL)
+
+POPULAR_COURSES_KEY = 'materials:popular_courses'
+
+
+def get_course_card(course_id):
+    """
+    Курс с полями COURSE_CARD_FIELDS из двухуровневого кеша или None, если курса нет.
+    Остальные поля отложены и загружаются из БД при обращении.
+    Кеш сбрасывается при сохранении и удалении курса, поэтому загружается с основной БД.
+    """
+    def load():
+        with primary_reads():
+            return Course.objects.filter(pk=course_id).values_list(*COURSE_CARD_FIELDS).first()
+
+    values = course_cards.get_or_set(course_id, load)
+    if values is None:
+        return None
+    # from_db ожидает значения в порядке полей модели
+    card = dict(zip(COURSE_CARD_FIELDS, values))
+    field_names = [f.attname for f in Course._meta.concrete_fields if f.attname in card]
+    return Course.from_db(router.db_for_read(Course), field_names, [card[name] for name in field_names])
+
+
+def load_course_cards(course_ids):
+    """Значения карточек курсов из БД одним запросом: {id: кортеж COURSE_CARD_FIELDS}."""
+    rows = Course.objects.filter(pk__in=course_ids).values_list(*COURSE_CARD_FIELDS)
+    return {row[0]: row for row in rows}
+
+
+def rank_popular_courses(limit):
+    """ID курсов с наибольшим числом покупок и подписок (по убыванию)."""
+    scores = Counter()
+    for model in (CourseEntitlement, Subscription):
+        for course_id, count in model.objects.values_list('course_id').annotate(count=Count('pk')).order_by():
+            scores[course_id] += count
+    return [course_id for course_id, _ in scores.most_common(limit)]
+
+
+def get_popular_course_ids():
+    """
+    Рейтинг популярных курсов (POPULAR_COURSES_LIMIT штук) из кеша;
+    пересчитывается не чаще раза в POPULAR_COURSES_CACHE_TTL секунд.
+    """
+    course_ids = cache.get(POPULAR_COURSES_KEY)
+    if course_ids is None:
+        course_ids = rank_popular_courses(settings.POPULAR_COURSES_LIMIT)
+        cache.set(POPULAR_COURSES_KEY, course_ids, settings.POPULAR_COURSES_CACHE_TTL)
+    return course_ids
@@ -0,0 +1,128 @@
+import asyncio
+import json
+import logging
+import weakref
+from collections import defaultdict
+
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+from django.db import transaction
+
+from core.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Журнал событий (для возобновления по Last-Event-ID) и канал для живой доставки
+EVENTS_STREAM = 'materials:course_events'
+EVENTS_CHANNEL = 'materials:course_events'
+
+
+def publish_course_event(course, kind, lesson=None):
+    """
+    Публикует событие об изменении курса после коммита транзакции.
+    Событие пишется в Redis Stream (история для Last-Event-ID) и рассылается через pub/sub.
+    Ошибки Redis не мешают сохранению курса — только логируются.
+    """
+    payload = {'course_id': course.pk, 'title': course.title, 'kind': kind}
+    if lesson is not None:
+        payload['lesson_id'] = lesson.pk
+
+    def send():
+        client = get_redis()
+        try:
+            event_id = client.xadd(EVENTS_STREAM, {'data': json.dumps(payload)},
+                                   maxlen=settings.COURSE_EVENTS_HISTORY, approximate=True)
+            client.publish(EVENTS_CHANNEL, json.dumps({'id': event_id.decode(), **payload}))
+        except redis.RedisError as e:
+            logger.warning(f"Не удалось опубликовать событие курса {course.pk}: {e}")
+
+    transaction.on_commit(send)
+
+
+async def read_course_events_after(client, last_event_id, course_ids):
+    """События из журнала после last_event_id для указанных курсов (для возобновления)."""
+    events = []
+    entries = await client.xrange(EVENTS_STREAM, min=f'({last_event_id}', count=settings.COURSE_EVENTS_HISTORY)
+    for event_id, fields in entries:
+        event = {'id': event_id.decode(), **json.loads(fields[b'data'])}
+        if event['course_id'] in course_ids:
+            events.append(event)
+    return events
+
+
+def format_sse(event):
+    """Событие в формате text/event-stream."""
+    data = {key: value for key, value in event.items() if key != 'id'}
+    return f"id: {event['id']}\nevent: {event['kind']}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def event_id_key(event_id):
+    """Ключ сортировки ID записи Redis Stream ('<ms>-<seq>')."""
+    ms, _, seq = event_id.partition('-')
+    return int(ms), int(seq or 0)
+
+
+class CourseEventHub:
+    """
+    Одна подписка Redis pub/sub на процесс (event loop), раздающая события
+    по очередям SSE-соединений. Соединение без событий стоит одну asyncio.Queue,
+    а не отдельное подключение к Redis.
+    """
+
+    def __init__(self):
+        self.client = aioredis.Redis.from_url(settings.REDIS_URL)
+        self._queues = defaultdict(set)  # course_id -> очереди соединений
+        self._task = None
+
+    def subscribe(self, course_ids):
+        queue = asyncio.Queue(maxsize=settings.COURSE_EVENTS_QUEUE_SIZE)
+        for course_id in course_ids:
+            self._queues[course_id].add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._listen())
+        return queue
+
+    def unsubscribe(self, queue, course_ids=None):
+        for course_id in list(self._queues if course_ids is None else course_ids):
+            queues = self._queues.get(course_id)
+            if queues is not None:
+                queues.discard(queue)
+                if not queues:
+                    del self._queues[course_id]
+
+    def dispatch(self, event):
+        for queue in tuple(self._queues.get(event['course_id'], ())):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Клиент не успевает читать: вместо событий кладем None (конец потока),
+                # клиент переподключится и догонит пропущенное по Last-Event-ID
+                self.unsubscribe(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+    async def _listen(self):
+        while True:
+            try:
+                async with self.client.pubsub() as pubsub:
+                    await pubsub.subscribe(EVENTS_CHANNEL)
+                    async for message in pubsub.listen():
+                        if message['type'] == 'message':
+                            self.dispatch(json.loads(message['data']))
+            except redis.RedisError as e:
+                logger.warning(f"Подписка на события курсов прервана: {e}")
+                await asyncio.sleep(1)
+
+
+_hubs = weakref.WeakKeyDictionary()
+
+
+def get_event_hub():
+    """Хаб событий текущего event loop."""
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        hub = _hubs[loop] = CourseEventHub()
+    return hub
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+# Индексы для префиксного поиска в админке ('^title' -> UPPER(title) LIKE 'X%')
+INDEXES = (
+    ('materials_course_title_upper_idx', 'materials_course', 'title'),
+    ('materials_lesson_title_upper_idx', 'materials_lesson', 'title'),
+)
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in INDEXES:
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" (UPPER("{column}") text_pattern_ops)')
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('materials', '0007_course_last_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
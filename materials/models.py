@@ -8,13 +8,20 @@ class Course(models.Model):
     preview = models.ImageField(upload_to='courses/', blank=True, null=True, verbose_name='Превью')
     description = models.TextField(blank=True, null=True, verbose_name='Описание')
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='courses', null=True)
+    price = models.DecimalField(max_digits=10, decimal_places=2, default=10000.0, verbose_name='Цена курса')
 
-    # auto_now=True не подходит, т.к. нам нужно знать время *до* обновления
+    # auto_now=True не подходит, т.к. нам нужно знать время *до* обновления.
+    # Также метка для синхронизации (/api/sync/): все пути записи курса обновляют ее вручную
     last_updated_at = models.DateTimeField(default=timezone.now, verbose_name='Последнее обновление')
 
     class Meta:
         verbose_name = 'Курс'
         verbose_name_plural = 'Курсы'
+        indexes = [
+            # Выборка изменений для синхронизации: всех (модератор) и по владельцу
+            models.Index(fields=['last_updated_at', 'id'], name='course_updated_idx'),
+            models.Index(fields=['owner', 'last_updated_at'], name='course_owner_updated_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -27,10 +34,15 @@ class Lesson(models.Model):
     video_url = models.URLField(blank=True, null=True, verbose_name='Ссылка на видео')
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='lessons', verbose_name='Курс')
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='lessons', null=True)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Изменен')
 
     class Meta:
         verbose_name = 'Урок'
         verbose_name_plural = 'Уроки'
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='lesson_updated_idx'),
+            models.Index(fields=['owner', 'updated_at'], name='lesson_owner_updated_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -47,4 +59,34 @@ class Subscription(models.Model):
         verbose_name_plural = 'Подписки'
 
     def __str__(self):
-        return f'{self.user} subscribed to {self.course}'
\ No newline at end of file
+        return f'{self.user} subscribed to {self.course}'
+
+
+class Tombstone(models.Model):
+    """
+    Отметка об удаленном курсе или уроке для инкрементальной синхронизации (/api/sync/).
+    Хранится SYNC_TOMBSTONE_RETENTION, затем удаляется.
+    """
+    COURSE = 'course'
+    LESSON = 'lesson'
+    MODEL_CHOICES = [
+        (COURSE, 'Курс'),
+        (LESSON, 'Урок'),
+    ]
+
+    model = models.CharField(max_length=20, choices=MODEL_CHOICES, verbose_name='Тип объекта')
+    object_id = models.PositiveBigIntegerField(verbose_name='ID объекта')
+    # Без внешних ключей: владелец и курс могли быть удалены вместе с объектом
+    owner_id = models.PositiveBigIntegerField(null=True, blank=True, verbose_name='ID владельца')
+    deleted_at = models.DateTimeField(default=timezone.now, verbose_name='Удален')
+
+    class Meta:
+        verbose_name = 'Удаленный объект'
+        verbose_name_plural = 'Удаленные объекты'
+        indexes = [
+            models.Index(fields=['deleted_at', 'id'], name='tombstone_deleted_idx'),
+            models.Index(fields=['owner_id', 'deleted_at'], name='tombstone_owner_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.model} {self.object_id} ({self.deleted_at})'
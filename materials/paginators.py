@@ -1,6 +1,6 @@
-from rest_framework.pagination import PageNumberPagination
+from core.pagination import EstimatedCountPagination
 
-class MaterialsPagination(PageNumberPagination):
+class MaterialsPagination(EstimatedCountPagination):
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 50
\ No newline at end of file
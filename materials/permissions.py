@@ -2,6 +2,8 @@
 
 from rest_framework.permissions import BasePermission
 
+from users.entitlements import has_entitlement
+
 class IsModerator(BasePermission):
     """
     Права доступа для модератора.
@@ -12,7 +14,7 @@ class IsModerator(BasePermission):
     def has_permission(self, request, view):
         if not request.user.is_authenticated:
             return False
-        return request.user.groups.filter(name='moderators').exists()
+        return request.user.is_moderator
 
 class IsOwner(BasePermission):
     """
@@ -24,4 +26,18 @@ class IsOwner(BasePermission):
     def has_object_permission(self, request, view, obj):
         if not request.user.is_authenticated:
             return False
-        return obj.owner == request.user
\ No newline at end of file
+        return obj.owner_id == request.user.pk
+
+
+class IsCourseBuyer(BasePermission):
+    """
+    Права доступа для покупателя курса.
+    Пользователь, купивший курс (obj или obj.course), имеет доступ к нему и его урокам.
+    """
+    message = 'Вы не приобрели этот курс.'
+
+    def has_object_permission(self, request, view, obj):
+        if not request.user.is_authenticated:
+            return False
+        course_id = getattr(obj, 'course_id', obj.pk)
+        return has_entitlement(request.user, course_id)
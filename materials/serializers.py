@@ -1,9 +1,29 @@
 # ФАЙЛ: materials/serializers.py
 
 from rest_framework import serializers
-from materials.models import Course, Lesson, Subscription
+from materials.cache import get_course_card
+from materials.models import Course, Lesson, Subscription, Tombstone
 from materials.validators import YouTubeURLValidator
 from drf_spectacular.utils import extend_schema_field
+from users.entitlements import has_entitlement
+
+
+class CourseCardField(serializers.PrimaryKeyRelatedField):
+    """
+    ID курса -> курс из кеша карточек (id, название, цена, владелец) без запроса к БД.
+    Для проверок и создания связанных записей, которым не нужен весь курс.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            course = get_course_card(int(data))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if course is None:
+            self.fail('does_not_exist', pk_value=data)
+        return course
 
 
 class LessonSerializer(serializers.ModelSerializer):
@@ -29,6 +49,7 @@ class CourseSerializer(serializers.ModelSerializer):
     lessons = LessonSerializer(many=True, read_only=True,
                                help_text="Список уроков, принадлежащих этому курсу (для просмотра)")
     is_subscribed = serializers.SerializerMethodField(help_text="Признак подписки текущего пользователя на этот курс")
+    is_purchased = serializers.SerializerMethodField(help_text="Признак покупки этого курса текущим пользователем")
     title = serializers.CharField(help_text="Название курса")
     description = serializers.CharField(help_text="Краткое описание курса")
     preview = serializers.ImageField(required=False, help_text="Превью/изображение курса")
@@ -37,7 +58,7 @@ class CourseSerializer(serializers.ModelSerializer):
     class Meta:
         model = Course
         fields = ('id', 'title', 'description', 'preview', 'owner',
-                  'price', 'lesson_count', 'lessons', 'is_subscribed')
+                  'price', 'lesson_count', 'lessons', 'is_subscribed', 'is_purchased')
 
 
     @extend_schema_field(serializers.BooleanField())
@@ -48,6 +69,27 @@ class CourseSerializer(serializers.ModelSerializer):
         return Subscription.objects.filter(user=user, course=obj).exists()
 
 
+    @extend_schema_field(serializers.BooleanField())
+    def get_is_purchased(self, obj):
+        return has_entitlement(self.context['request'].user, obj.pk)
+
+
     @extend_schema_field(serializers.IntegerField())
     def get_lesson_count(self, obj):
-        return obj.lessons.count()
\ No newline at end of file
+        return obj.lessons.count()
+
+
+class CourseSyncSerializer(serializers.ModelSerializer):
+    """Курс для синхронизации: без вложенных уроков (они синхронизируются отдельно)."""
+
+    class Meta:
+        model = Course
+        fields = ('id', 'title', 'description', 'preview', 'owner', 'price', 'last_updated_at')
+
+
+class TombstoneSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='object_id', help_text="ID удаленного объекта")
+
+    class Meta:
+        model = Tombstone
+        fields = ('model', 'id', 'deleted_at')
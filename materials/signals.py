@@ -0,0 +1,20 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from materials.cache import course_cards
+from materials.models import Course, Lesson, Tombstone
+
+
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=Lesson)
+def create_tombstone(sender, instance, **kwargs):
+    """Запоминает удаление курса или урока для синхронизации клиентов."""
+    model = Tombstone.COURSE if sender is Course else Tombstone.LESSON
+    Tombstone.objects.create(model=model, object_id=instance.pk, owner_id=instance.owner_id)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_course_card(sender, instance, **kwargs):
+    """Сбрасывает карточку курса (цена, владелец, название) во всех процессах."""
+    course_cards.delete(instance.pk)
@@ -0,0 +1,116 @@
+import base64
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from materials.models import Course, Lesson, Tombstone
+
+TOKEN_PREFIX = 'v2:'
+LEGACY_TOKEN_PREFIX = 'v1:'
+EPOCH = datetime.fromtimestamp(0, tz=dt_timezone.utc)
+
+# Позиция синхронизации: момент и для каждого типа (курсы, уроки, удаления) — PK последней
+# отданной записи ровно с этим моментом. Следующая страница начинается строго после (moment, pk),
+# поэтому записи с одинаковым временем, не поместившиеся в страницу, отдаются по PK дальше
+SyncPosition = namedtuple('SyncPosition', ['moment', 'pks'])
+NO_PKS = (0, 0, 0)
+
+
+class InvalidSyncToken(ValueError):
+    pass
+
+
+def encode_token(moment, pks=NO_PKS):
+    """Токен синхронизации: время в микросекундах и PK по типам, упакованные в base64url."""
+    micros = (moment - EPOCH) // timedelta(microseconds=1)
+    raw = f"{TOKEN_PREFIX}{micros}:{':'.join(str(pk) for pk in pks)}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_token(token):
+    """SyncPosition из токена; токены v1 (только время) читаются как позиция без PK."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        if raw.startswith(LEGACY_TOKEN_PREFIX):
+            micros, pks = int(raw[len(LEGACY_TOKEN_PREFIX):]), NO_PKS
+        elif raw.startswith(TOKEN_PREFIX):
+            micros, *pks = (int(part) for part in raw[len(TOKEN_PREFIX):].split(':'))
+            if len(pks) != len(NO_PKS):
+                raise ValueError(raw)
+        else:
+            raise ValueError(raw)
+        return SyncPosition(EPOCH + timedelta(microseconds=micros), tuple(pks))
+    except (ValueError, UnicodeDecodeError, OverflowError) as e:
+        raise InvalidSyncToken('Некорректный токен синхронизации.') from e
+
+
+def collect_changes(user, is_moderator, since, limit):
+    """
+    Изменения после позиции since (SyncPosition) до текущего момента, не больше limit на тип.
+
+    Возвращает (courses, lessons, tombstones, next_position, has_more).
+    Записи каждого типа идут по (время, PK). Если какой-то тип уперся в limit, все типы
+    обрезаются по времени последней отданной записи этого типа, а следующая позиция
+    указывает на нее вместе с PK, так что постраничный обход продвигается, даже если
+    больше limit записей имеют одно и то же время.
+    Записи, сохраненные в еще не закоммиченных на момент запроса транзакциях, подхватываются
+    за счет SYNC_OVERLAP: обрезанная страница не заканчивается позже until - SYNC_OVERLAP,
+    а без обрезки позиция сдвигается назад на SYNC_OVERLAP.
+    """
+    until = timezone.now()
+    sources = [
+        (Course.objects.all(), 'last_updated_at'),
+        (Lesson.objects.all(), 'updated_at'),
+        (Tombstone.objects.all(), 'deleted_at'),
+    ]
+    results = []
+    for index, (queryset, field) in enumerate(sources):
+        if since is None and queryset.model is Tombstone:
+            results.append(([], field))  # первая синхронизация: удалять у клиента нечего
+            continue
+        if not is_moderator:
+            queryset = queryset.filter(owner_id=user.pk)
+        if since is not None:
+            queryset = queryset.filter(
+                Q(**{f'{field}__gt': since.moment}) | Q(**{field: since.moment, 'pk__gt': since.pks[index]})
+            )
+        rows = list(queryset.filter(**{f'{field}__lte': until}).order_by(field, 'pk')[:limit + 1])
+        results.append((rows, field))
+
+    # Записи позже stable могли еще не закоммититься: строки их транзакций появятся позже
+    # со временем раньше текущего, поэтому граница страницы не заходит дальше stable
+    stable = until - settings.SYNC_OVERLAP
+    truncated = [getattr(rows[limit - 1], field) for rows, field in results if len(rows) > limit]
+    cutoff = min(truncated) if truncated else None
+    if cutoff is not None and cutoff > stable:
+        stable_results = [([row for row in rows if getattr(row, field) <= stable], field) for rows, field in results]
+        if any(rows for rows, _ in stable_results):
+            results, cutoff = stable_results, stable
+        else:
+            # До stable отдавать нечего, все записи — в окне SYNC_OVERLAP: отдаем страницу как
+            # необрезанную (позиция — stable, без has_more), чтобы клиент не повторял запрос
+            # в цикле; эти и остальные записи окна придут при следующей синхронизации
+            results = [([row for row in rows[:limit] if getattr(row, field) <= cutoff], field)
+                       for rows, field in results]
+            cutoff = None
+
+    if cutoff is not None:
+        results = [([row for row in rows[:limit] if getattr(row, field) <= cutoff], field) for rows, field in results]
+        # Для каждого типа — PK последней отданной записи со временем cutoff; если таких нет,
+        # позиция типа не меняется (или 0, если cutoff позже since)
+        kept = since.pks if since is not None and since.moment == cutoff else NO_PKS
+        pks = tuple(
+            rows[-1].pk if rows and getattr(rows[-1], field) == cutoff else kept[index]
+            for index, (rows, field) in enumerate(results)
+        )
+        next_position, has_more = SyncPosition(cutoff, pks), True
+    else:
+        next_position, has_more = SyncPosition(stable, NO_PKS), False
+        if since is not None and since.moment >= next_position.moment:
+            next_position = since
+
+    (courses, _), (lessons, _), (tombstones, _) = results
+    return courses, lessons, tombstones, next_position, has_more
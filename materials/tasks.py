@@ -1,17 +1,22 @@
 from celery import shared_task
 from django.core.mail import send_mail
 from django.conf import settings
-from materials.models import Subscription
+from django.utils import timezone
+
+from core.db_router import read_from_replica
+from materials.models import Subscription, Tombstone
 
 
 @shared_task
+@read_from_replica
 def send_course_update_notification(course_id, course_title):
     """
     Отправляет email-уведомления подписчикам курса.
+    Только читает данные, поэтому читает с реплики.
     """
     try:
         # Находим всех подписчиков этого курса
-        subscriptions = Subscription.objects.filter(course_id=course_id)
+        subscriptions = Subscription.objects.select_related('user').filter(course_id=course_id)
 
         # Собираем email-адреса, исключая пустые
         user_emails = [sub.user.email for sub in subscriptions if sub.user.email]
@@ -34,4 +39,15 @@ def send_course_update_notification(course_id, course_title):
     except Exception as e:
         # Логгирование ошибки, если что-то пошло не так
         print(f"Ошибка при отправке уведомлений для курса {course_id}: {e}")
-        return f"Ошибка отправки для курса {course_id}."
\ No newline at end of file
+        return f"Ошибка отправки для курса {course_id}."
+
+
+@shared_task
+def prune_tombstones():
+    """
+    Удаляет отметки об удалении старше SYNC_TOMBSTONE_RETENTION.
+    Клиенты с более старым токеном получают 410 и делают полную синхронизацию.
+    """
+    cutoff = timezone.now() - settings.SYNC_TOMBSTONE_RETENTION
+    count, _ = Tombstone.objects.filter(deleted_at__lt=cutoff).delete()
+    return f"Pruned {count} tombstones."
@@ -1,10 +1,29 @@
+import asyncio
+from unittest.mock import patch
+
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.utils import timezone
+from datetime import timedelta
+
+from django.test import SimpleTestCase, override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
 
+from materials.cache import POPULAR_COURSES_KEY, get_course_card, get_popular_course_ids
+from materials.events import CourseEventHub, event_id_key, format_sse
+from core import db_router
+from core.fast_serializers import ValuesSerializer
+from core.renderers import ORJSONRenderer
 from materials.models import Course, Lesson, Subscription
+from materials.serializers import CourseSerializer, LessonSerializer
+from materials.sync import NO_PKS, SyncPosition, collect_changes, encode_token
+from materials.warmup import warm_course_cards, warm_popular_courses
+from users.authentication import add_user_claims
+from users.entitlements import grant_entitlements
 
 User = get_user_model()
 
@@ -230,4 +249,306 @@ class SubscriptionTests(MaterialsAPITestCase):
         response = self.client.post(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['message'], 'подписка удалена')
-        self.assertFalse(Subscription.objects.filter(user=self.user, course=self.course).exists())
\ No newline at end of file
+        self.assertFalse(Subscription.objects.filter(user=self.user, course=self.course).exists())
+
+
+class ValuesListTests(MaterialsAPITestCase):
+    """
+    Дифференциальные тесты быстрых списков (values()):
+    ответ байт в байт совпадает с обычными сериализаторами.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.course.preview = 'courses/preview.png'
+        self.course.price = '1990.5'
+        self.course.save()
+        self.lesson.preview = 'lessons/preview.png'
+        self.lesson.save()
+        Lesson.objects.create(title='Bare Lesson', course=self.course, owner=self.user, description=None)
+        Lesson.objects.create(title='Other Lesson', course=self.other_course, owner=self.other_user)
+        Subscription.objects.create(user=self.moderator, course=self.other_course)
+        grant_entitlements([(self.moderator.pk, self.course.pk)])
+        self.client.force_authenticate(user=self.moderator)
+
+    def assertSameBytes(self, data, expected):
+        self.assertEqual(ORJSONRenderer().render(data), ORJSONRenderer().render(expected))
+
+    def test_course_list_matches_serializer(self):
+        response = self.client.get(reverse('materials:course-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        courses = [Course.objects.get(pk=course['id']) for course in response.data['results']]
+        expected = CourseSerializer(courses, many=True, context={'request': response.wsgi_request}).data
+        self.assertEqual(len(expected), 2)
+        self.assertSameBytes(response.data['results'], expected)
+
+    def test_lesson_list_matches_serializer(self):
+        response = self.client.get(reverse('materials:lesson-list-create'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        lessons = [Lesson.objects.get(pk=lesson['id']) for lesson in response.data['results']]
+        expected = LessonSerializer(lessons, many=True, context={'request': response.wsgi_request}).data
+        self.assertEqual(len(expected), 3)
+        self.assertSameBytes(response.data['results'], expected)
+
+    @override_settings(ALLOWED_HOSTS=['testserver', 'cdn.example.com'])
+    def test_cached_values_serializer_follows_request_and_settings(self):
+        self.client.get(reverse('materials:lesson-list-create'))
+        response = self.client.get(reverse('materials:lesson-list-create'), HTTP_HOST='cdn.example.com')
+
+        lessons = [Lesson.objects.get(pk=lesson['id']) for lesson in response.data['results']]
+        expected = LessonSerializer(lessons, many=True, context={'request': response.wsgi_request}).data
+        self.assertTrue(any((lesson['preview'] or '').startswith('http://cdn.example.com/') for lesson in expected))
+        self.assertSameBytes(response.data['results'], expected)
+
+        self.assertIs(ValuesSerializer.for_class(LessonSerializer).values_fields,
+                      ValuesSerializer.for_class(LessonSerializer).values_fields)
+        with self.settings(TIME_ZONE='Asia/Vladivostok'):
+            response = self.client.get(reverse('materials:lesson-list-create'))
+            expected = LessonSerializer(lessons, many=True, context={'request': response.wsgi_request}).data
+            self.assertSameBytes(response.data['results'], expected)
+
+
+class CourseWarmupTests(MaterialsAPITestCase):
+    """Тесты рейтинга популярных курсов и прогрева карточек курсов."""
+
+    def setUp(self):
+        super().setUp()
+        cache.delete(POPULAR_COURSES_KEY)
+        Subscription.objects.create(user=self.user, course=self.other_course)
+        Subscription.objects.create(user=self.moderator, course=self.other_course)
+        grant_entitlements([(self.moderator.pk, self.course.pk)])
+
+    def test_popular_courses_ranked_by_purchases_and_subscriptions(self):
+        self.assertEqual(warm_popular_courses(), 2)
+        self.assertEqual(get_popular_course_ids(), [self.other_course.pk, self.course.pk])
+        Subscription.objects.create(user=self.other_user, course=self.course)
+        Subscription.objects.create(user=self.user, course=self.course)
+        with self.assertNumQueries(0):  # рейтинг берется из кеша до истечения TTL
+            self.assertEqual(get_popular_course_ids(), [self.other_course.pk, self.course.pk])
+
+    def test_course_cards_warmed(self):
+        self.assertEqual(warm_course_cards(), 2)
+        with self.assertNumQueries(0):
+            card = get_course_card(self.other_course.pk)
+            self.assertEqual((card.title, card.price, card.owner_id),
+                             (self.other_course.title, self.other_course.price, self.other_user.pk))
+
+
+class AsyncMaterialsAPITests(MaterialsAPITestCase):
+    """Тесты асинхронных эндпоинтов (те же правила доступа, что и у синхронных)."""
+
+    def setUp(self):
+        super().setUp()
+        # Токены выпускаются заранее: в async-тесте синхронные запросы к БД запрещены
+        self.tokens = {user.pk: add_user_claims(AccessToken.for_user(user), user)
+                       for user in (self.user, self.moderator)}
+
+    def auth_headers(self, user):
+        return {'headers': {'Authorization': f'Bearer {self.tokens[user.pk]}'}}
+
+    async def test_async_course_list_and_detail(self):
+        response = await self.async_client.get(reverse('materials:async-course-list'), **self.auth_headers(self.user))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(data['results'][0]['lesson_count'], 1)
+        self.assertEqual(data['results'][0]['lessons'][0]['id'], self.lesson.pk)
+
+        response = await self.async_client.get(reverse('materials:async-course-list'),
+                                               **self.auth_headers(self.moderator))
+        self.assertEqual(response.json()['count'], 2)
+
+        url = reverse('materials:async-course-detail', kwargs={'pk': self.other_course.pk})
+        response = await self.async_client.get(url, **self.auth_headers(self.user))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @patch('core.pagination.estimated_count', return_value=50000)
+    async def test_async_list_uses_estimated_count(self, estimate):
+        response = await self.async_client.get(reverse('materials:async-lesson-list'),
+                                               **self.auth_headers(self.moderator))
+        data = response.json()
+        self.assertEqual(data['count'], 50000)
+        self.assertTrue(data['count_is_estimate'])
+        self.assertIsNotNone(data['next'])
+
+    def test_event_stream_rejected_under_wsgi(self):
+        with patch('materials.async_views.get_event_hub') as hub:
+            response = self.client.get(reverse('materials:course-events'), **self.auth_headers(self.user))
+        self.assertEqual(response.status_code, status.HTTP_501_NOT_IMPLEMENTED)
+        hub.assert_not_called()
+
+    async def test_async_requires_token(self):
+        response = await self.async_client.get(reverse('materials:async-lesson-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_async_subscription_toggle(self):
+        url = reverse('materials:async-subscription-toggle')
+        headers = self.auth_headers(self.user)
+
+        response = await self.async_client.post(url, {'course_id': self.course.pk},
+                                                content_type='application/json', **headers)
+        self.assertEqual(response.json(), {'message': 'подписка добавлена'})
+        self.assertTrue(await Subscription.objects.filter(user=self.user, course=self.course).aexists())
+
+        response = await self.async_client.post(url, {'course_id': self.course.pk},
+                                                content_type='application/json', **headers)
+        self.assertEqual(response.json(), {'message': 'подписка удалена'})
+        self.assertFalse(await Subscription.objects.filter(user=self.user, course=self.course).aexists())
+
+
+class CourseEventHubTests(SimpleTestCase):
+    """Тесты раздачи событий курсов по SSE-соединениям (без Redis)."""
+
+    def test_format_sse(self):
+        event = {'id': '1700000000000-0', 'course_id': 1, 'title': 'Курс', 'kind': 'course_updated'}
+        self.assertEqual(
+            format_sse(event),
+            'id: 1700000000000-0\nevent: course_updated\n'
+            'data: {"course_id": 1, "title": "Курс", "kind": "course_updated"}\n\n',
+        )
+        self.assertLess(event_id_key('1700000000000-9'), event_id_key('1700000000001-0'))
+
+    def test_dispatch_by_course_and_overflow(self):
+        hub = CourseEventHub()
+        first = asyncio.Queue(maxsize=2)
+        second = asyncio.Queue(maxsize=10)
+        hub._queues[1].update({first, second})
+        hub._queues[2].add(second)
+
+        hub.dispatch({'id': '1-0', 'course_id': 2, 'kind': 'lesson_created'})
+        self.assertTrue(first.empty())
+        self.assertEqual(second.get_nowait()['id'], '1-0')
+
+        for i in range(3):
+            hub.dispatch({'id': f'2-{i}', 'course_id': 1, 'kind': 'course_updated'})
+        # Переполненная очередь получает None и отписывается от всех курсов
+        self.assertIsNone(first.get_nowait())
+        self.assertNotIn(first, hub._queues.get(1, set()))
+        self.assertEqual([second.get_nowait()['id'] for _ in range(3)], ['2-0', '2-1', '2-2'])
+
+
+@override_settings(SYNC_OVERLAP=timedelta(0))
+class SyncAPITests(MaterialsAPITestCase):
+    """Тесты инкрементальной синхронизации."""
+
+    def test_changes_since_token(self):
+        self.client.force_authenticate(user=self.user)
+        url = reverse('materials:sync')
+        extra_lesson = Lesson.objects.create(title='Extra', course=self.course, owner=self.user,
+                                             video_url='https://www.youtube.com/watch?v=extra')
+
+        snapshot = self.client.get(url).data
+        self.assertEqual([course['id'] for course in snapshot['courses']], [self.course.pk])
+        self.assertEqual({lesson['id'] for lesson in snapshot['lessons']}, {self.lesson.pk, extra_lesson.pk})
+        self.assertEqual(snapshot['deleted'], [])
+        self.assertFalse(snapshot['has_more'])
+
+        self.lesson.title = 'Renamed'
+        self.lesson.save()
+        extra_lesson_id = extra_lesson.pk
+        extra_lesson.delete()
+
+        changes = self.client.get(url, {'since': snapshot['next']}).data
+        self.assertEqual(changes['courses'], [])
+        self.assertEqual([lesson['title'] for lesson in changes['lessons']], ['Renamed'])
+        self.assertEqual([(item['model'], item['id']) for item in changes['deleted']], [('lesson', extra_lesson_id)])
+
+    @override_settings(DATABASE_REPLICAS=['replica1'])
+    def test_sync_reads_from_primary(self):
+        # Внутри транзакции теста роутер и так выбирает основную БД, поэтому проверяется
+        # сам флаг чтения с реплики в момент сбора изменений
+        from materials import views
+        read_from_replica = []
+
+        def collect(*args):
+            read_from_replica.append(db_router._read_from_replica.get())
+            return collect_changes(*args)
+
+        self.client.force_authenticate(user=self.user)
+        with patch.object(views, 'collect_changes', side_effect=collect):
+            response = self.client.get(reverse('materials:sync'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([course['id'] for course in response.data['courses']], [self.course.pk])
+        self.assertEqual(read_from_replica, [False])
+
+    def test_paging_and_bad_tokens(self):
+        self.client.force_authenticate(user=self.user)
+        url = reverse('materials:sync')
+        for i in range(3):
+            Lesson.objects.create(title=f'L{i}', course=self.course, owner=self.user,
+                                  video_url='https://www.youtube.com/watch?v=x')
+
+        seen, token = set(), None
+        with override_settings(SYNC_PAGE_SIZE=2):
+            while True:
+                data = self.client.get(url, {'since': token} if token else {}).data
+                seen.update(lesson['id'] for lesson in data['lessons'])
+                token = data['next']
+                if not data['has_more']:
+                    break
+        self.assertEqual(seen, set(Lesson.objects.filter(owner=self.user).values_list('pk', flat=True)))
+
+        self.assertEqual(self.client.get(url, {'since': 'garbage'}).status_code, status.HTTP_400_BAD_REQUEST)
+        expired = encode_token(timezone.now() - timedelta(days=365))
+        self.assertEqual(self.client.get(url, {'since': expired}).status_code, status.HTTP_410_GONE)
+
+    def test_paging_through_rows_with_same_timestamp(self):
+        """Больше SYNC_PAGE_SIZE записей с одним временем (массовое обновление) отдаются по PK, без зацикливания."""
+        self.client.force_authenticate(user=self.user)
+        url = reverse('materials:sync')
+        for i in range(4):
+            Lesson.objects.create(title=f'L{i}', course=self.course, owner=self.user,
+                                  video_url='https://www.youtube.com/watch?v=x')
+        moment = timezone.now() - timedelta(minutes=1)
+        Lesson.objects.filter(owner=self.user).update(updated_at=moment)
+        start = encode_token(moment - timedelta(seconds=1))
+
+        pages, seen, token = 0, [], start
+        with override_settings(SYNC_PAGE_SIZE=2):
+            while pages < 10:
+                data = self.client.get(url, {'since': token}).data
+                pages += 1
+                seen.extend(lesson['id'] for lesson in data['lessons'])
+                token = data['next']
+                if not data['has_more']:
+                    break
+        self.assertEqual(pages, 3)
+        self.assertEqual(seen, sorted(Lesson.objects.filter(owner=self.user).values_list('pk', flat=True)))
+
+    @override_settings(SYNC_OVERLAP=timedelta(seconds=5))
+    def test_truncated_page_does_not_skip_late_commit(self):
+        """Обрезанная страница не сдвигает позицию дальше until - SYNC_OVERLAP: поздний коммит не теряется."""
+        now = timezone.now()
+        Course.objects.filter(pk=self.course.pk).update(last_updated_at=now - timedelta(minutes=1))
+        Lesson.objects.filter(pk=self.lesson.pk).update(updated_at=now - timedelta(minutes=1))
+        for i in range(3):
+            lesson = Lesson.objects.create(title=f'L{i}', course=self.course, owner=self.user,
+                                           video_url='https://www.youtube.com/watch?v=x')
+            Lesson.objects.filter(pk=lesson.pk).update(updated_at=now - timedelta(seconds=2 - i))
+        since = SyncPosition(now - timedelta(minutes=2), NO_PKS)
+
+        seen = []
+        for _ in range(5):
+            _, lessons, _, since, has_more = collect_changes(self.user, False, since, 2)
+            seen.extend(lesson.pk for lesson in lessons)
+            if not has_more:
+                break
+        self.assertFalse(has_more)
+        self.assertLessEqual(since.moment, timezone.now() - timedelta(seconds=5))
+
+        # Транзакция, начатая до запросов, коммитит урок со временем раньше уже отданных
+        late = Lesson.objects.create(title='Late', course=self.course, owner=self.user,
+                                     video_url='https://www.youtube.com/watch?v=x')
+        Lesson.objects.filter(pk=late.pk).update(updated_at=now - timedelta(seconds=3))
+        # Следующая синхронизация — когда все записи вышли из окна SYNC_OVERLAP
+        with patch('materials.sync.timezone.now', return_value=now + timedelta(seconds=10)):
+            for _ in range(5):
+                _, lessons, _, since, has_more = collect_changes(self.user, False, since, 2)
+                seen.extend(lesson.pk for lesson in lessons)
+                if not has_more:
+                    break
+        self.assertIn(late.pk, seen)
+        self.assertEqual(set(seen), set(Lesson.objects.filter(owner=self.user).values_list('pk', flat=True)))
@@ -4,7 +4,16 @@ from materials.views import (
     CourseViewSet,
     LessonListCreateView,             # <--- Исправлено
     LessonRetrieveUpdateDestroyView,  # <--- Исправлено
-    SubscriptionToggleView            # <--- Исправлено
+    SubscriptionToggleView,           # <--- Исправлено
+    SyncAPIView,
+)
+from materials.async_views import (
+    AsyncCourseListView,
+    AsyncCourseDetailView,
+    AsyncLessonListView,
+    AsyncLessonDetailView,
+    AsyncSubscriptionToggleView,
+    CourseEventStreamView,
 )
 
 app_name = 'materials'
@@ -17,6 +26,15 @@ urlpatterns = [
     path('lessons/', LessonListCreateView.as_view(), name='lesson-list-create'),
     path('lessons/<int:pk>/', LessonRetrieveUpdateDestroyView.as_view(), name='lesson-detail'),
     path('subscriptions/', SubscriptionToggleView.as_view(), name='subscription-toggle'),
+    path('sync/', SyncAPIView.as_view(), name='sync'),
+
+    # Асинхронные версии (для запуска под ASGI)
+    path('async/courses/', AsyncCourseListView.as_view(), name='async-course-list'),
+    path('async/courses/<int:pk>/', AsyncCourseDetailView.as_view(), name='async-course-detail'),
+    path('async/lessons/', AsyncLessonListView.as_view(), name='async-lesson-list'),
+    path('async/lessons/<int:pk>/', AsyncLessonDetailView.as_view(), name='async-lesson-detail'),
+    path('async/subscriptions/', AsyncSubscriptionToggleView.as_view(), name='async-subscription-toggle'),
+    path('async/events/', CourseEventStreamView.as_view(), name='course-events'),
 ]
 
 urlpatterns += router.urls
\ No newline at end of file
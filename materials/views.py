@@ -2,14 +2,24 @@ from rest_framework import viewsets, generics, status
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, BasePermission
 from rest_framework.views import APIView
+from django.db.models import Q
 from django.shortcuts import get_object_or_404
+from django.conf import settings
 from django.utils import timezone
 from datetime import timedelta
+from collections import defaultdict
 
+from core.fast_serializers import ValuesListMixin, ValuesSerializer
+from materials.events import publish_course_event
 from materials.models import Course, Lesson, Subscription
-from materials.serializers import CourseSerializer, LessonSerializer
+from materials.serializers import (
+    CourseSerializer, CourseSyncSerializer, LessonSerializer, TombstoneSerializer
+)
+from materials.sync import InvalidSyncToken, collect_changes, decode_token, encode_token
 from materials.paginators import MaterialsPagination
+from materials.permissions import IsCourseBuyer
 from materials.tasks import send_course_update_notification  # <--- TASK 2
+from users.entitlements import get_entitled_course_ids
 
 
 class IsModerator(BasePermission):
@@ -18,7 +28,7 @@ class IsModerator(BasePermission):
     """
 
     def has_permission(self, request, view):
-        return request.user.groups.filter(name='moderators').exists()
+        return request.user.is_moderator
 
 
 class IsOwner(BasePermission):
@@ -29,16 +39,17 @@ class IsOwner(BasePermission):
     def has_object_permission(self, request, view, obj):
         # Проверяем, есть ли у объекта атрибут 'owner'
         if hasattr(obj, 'owner'):
-            return obj.owner == request.user
+            return obj.owner_id == request.user.pk
         return False
 
 
 # --- End Permissions ---
 
 
-class CourseViewSet(viewsets.ModelViewSet):
+class CourseViewSet(ValuesListMixin, viewsets.ModelViewSet):
     serializer_class = CourseSerializer
     pagination_class = MaterialsPagination
+    values_computed_fields = ('lesson_count', 'lessons', 'is_subscribed', 'is_purchased')
 
     def get_permissions(self):
         """
@@ -64,10 +75,33 @@ class CourseViewSet(viewsets.ModelViewSet):
         - Обычные пользователи видят только свои курсы.
         """
         user = self.request.user
-        if user.groups.filter(name='moderators').exists():
+        if user.is_moderator:
             return Course.objects.all()
         return Course.objects.filter(owner=user)
 
+    def get_values_computed(self, rows):
+        """
+        Уроки, подписки и покупки для list() — по одному запросу на всю страницу
+        вместо трех запросов на каждый курс в CourseSerializer.
+        """
+        course_ids = [row['id'] for row in rows]
+        lesson_serializer = ValuesSerializer.for_class(LessonSerializer, request=self.request)
+        lessons = defaultdict(list)
+        for lesson in Lesson.objects.filter(course_id__in=course_ids).order_by('pk').values(
+                *lesson_serializer.values_fields):
+            lessons[lesson['course_id']].append(lesson_serializer.to_representation(lesson))
+        subscribed = set(Subscription.objects.filter(
+            user=self.request.user, course_id__in=course_ids
+        ).values_list('course_id', flat=True))
+        purchased = get_entitled_course_ids(self.request.user)
+
+        return {
+            'lesson_count': lambda row: len(lessons[row['id']]),
+            'lessons': lambda row: lessons[row['id']],
+            'is_subscribed': lambda row: row['id'] in subscribed,
+            'is_purchased': lambda row: row['id'] in purchased,
+        }
+
     def perform_create(self, serializer):
         """Присваиваем владельца при создании."""
         serializer.save(owner=self.request.user)
@@ -84,12 +118,13 @@ class CourseViewSet(viewsets.ModelViewSet):
 
         # Сохраняем изменения курса и обновляем время вручную
         updated_course = serializer.save(last_updated_at=timezone.now())
+        publish_course_event(updated_course, 'course_updated')
 
         if can_notify:
             send_course_update_notification.delay(updated_course.id, updated_course.title)
 
 
-class LessonListCreateView(generics.ListCreateAPIView):
+class LessonListCreateView(ValuesListMixin, generics.ListCreateAPIView):
     serializer_class = LessonSerializer
     pagination_class = MaterialsPagination
     permission_classes = [IsAuthenticated]  # Создавать может любой
@@ -100,7 +135,7 @@ class LessonListCreateView(generics.ListCreateAPIView):
         - Обычные пользователи видят только свои уроки.
         """
         user = self.request.user
-        if user.groups.filter(name='moderators').exists():
+        if user.is_moderator:
             return Lesson.objects.all()
         return Lesson.objects.filter(owner=user)
 
@@ -110,6 +145,7 @@ class LessonListCreateView(generics.ListCreateAPIView):
 
         # При создании урока также обновляем курс (Доп. задание)
         course = lesson.course
+        publish_course_event(course, 'lesson_created', lesson)
         if (timezone.now() - course.last_updated_at) > timedelta(hours=4):
             send_course_update_notification.delay(course.id, course.title)
 
@@ -124,9 +160,12 @@ class LessonRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
         """
         - Модераторы: retrieve, update.
         - Владельцы: retrieve, update, destroy.
+        - Покупатели курса: retrieve.
         """
         if self.request.method == 'DELETE':
             self.permission_classes = [IsAuthenticated, IsOwner]
+        elif self.request.method == 'GET':
+            self.permission_classes = [IsAuthenticated, IsModerator | IsOwner | IsCourseBuyer]
         else:
             self.permission_classes = [IsAuthenticated, IsModerator | IsOwner]
         return super().get_permissions()
@@ -134,11 +173,14 @@ class LessonRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     def get_queryset(self):
         """
         - Модераторы видят все уроки.
-        - Обычные пользователи видят только свои уроки.
+        - Обычные пользователи видят только свои уроки
+          (и уроки купленных курсов — при просмотре).
         """
         user = self.request.user
-        if user.groups.filter(name='moderators').exists():
+        if user.is_moderator:
             return Lesson.objects.all()
+        if self.request.method == 'GET':
+            return Lesson.objects.filter(Q(owner=user) | Q(course_id__in=get_entitled_course_ids(user)))
         return Lesson.objects.filter(owner=user)
 
     def perform_update(self, serializer):  # <--- TASK 2 (Доп. задание)
@@ -148,6 +190,7 @@ class LessonRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
         # Сохраняем урок
         lesson = serializer.save()
         course = lesson.course
+        publish_course_event(course, 'lesson_updated', lesson)
 
         # Проверка 4-часового интервала
         if (timezone.now() - course.last_updated_at) > timedelta(hours=4):
@@ -158,6 +201,11 @@ class LessonRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
         course.last_updated_at = timezone.now()
         course.save()
 
+    def perform_destroy(self, instance):
+        # Событие формируется до удаления, пока у урока есть id
+        publish_course_event(instance.course, 'lesson_deleted', instance)
+        instance.delete()
+
 
 class SubscriptionToggleView(APIView):
     permission_classes = [IsAuthenticated]
@@ -185,4 +233,44 @@ class SubscriptionToggleView(APIView):
             subscription.delete()
             message = 'подписка удалена'
 
-        return Response({'message': message}, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response({'message': message}, status=status.HTTP_200_OK)
+
+
+class SyncAPIView(APIView):
+    """
+    Инкрементальная синхронизация курсов и уроков для офлайн-клиентов.
+
+    GET /api/sync/?since=<token> возвращает курсы и уроки, созданные или измененные
+    после токена, и удаленные объекты (deleted). Без since — полный снимок.
+    Ответ содержит next (токен для следующего запроса) и has_more (повторить сразу).
+    Видимость — как у списков: модератор видит все, остальные — свои объекты.
+    """
+    permission_classes = [IsAuthenticated]
+    # Только основная БД: запись, которую реплика еще не получила, оказалась бы раньше
+    # следующего токена и была бы пропущена клиентом навсегда (SYNC_OVERLAP это не покрывает)
+    read_from_primary = True
+
+    def get(self, request, *args, **kwargs):
+        since = None
+        token = request.query_params.get('since')
+        if token:
+            try:
+                since = decode_token(token)
+            except InvalidSyncToken as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            if since.moment < timezone.now() - settings.SYNC_TOMBSTONE_RETENTION:
+                # Отметки об удалении за этот период уже удалены: нужна полная синхронизация
+                return Response({'error': 'Токен устарел, выполните полную синхронизацию.', 'reset': True},
+                                status=status.HTTP_410_GONE)
+
+        courses, lessons, tombstones, next_position, has_more = collect_changes(
+            request.user, request.user.is_moderator, since, settings.SYNC_PAGE_SIZE
+        )
+        context = {'request': request}
+        return Response({
+            'courses': CourseSyncSerializer(courses, many=True, context=context).data,
+            'lessons': LessonSerializer(lessons, many=True, context=context).data,
+            'deleted': TombstoneSerializer(tombstones, many=True).data,
+            'next': encode_token(*next_position),
+            'has_more': has_more,
+        })
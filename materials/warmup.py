@@ -0,0 +1,13 @@
+from core.warmup import warmer
+from materials.cache import course_cards, get_popular_course_ids, load_course_cards
+
+
+@warmer('popular_courses')
+def warm_popular_courses():
+    return len(get_popular_course_ids())
+
+
+@warmer('course_cards')
+def warm_course_cards():
+    """Карточки популярных курсов: по ним проверяется и создается покупка."""
+    return len(course_cards.get_or_set_many(get_popular_course_ids(), load_course_cards))
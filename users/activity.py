@@ -0,0 +1,70 @@
+import logging
+import time
+from datetime import datetime, timezone as dt_timezone
+
+import redis
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from core.redis import get_redis
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
+
+LAST_SEEN_KEY = 'users:last_seen'
+FLUSHING_KEY = 'users:last_seen:flushing'
+
+# Когда процесс последний раз писал в Redis активность пользователя (user_id -> monotonic)
+_last_touch = {}
+
+
+def touch(user_id):
+    """
+    Отмечает активность пользователя.
+    Пишет в Redis не чаще раза в ACTIVITY_TOUCH_INTERVAL секунд на пользователя в процессе,
+    в БД значения попадают только через flush_activity().
+    """
+    now = time.monotonic()
+    last = _last_touch.get(user_id)
+    if last is not None and now - last < settings.ACTIVITY_TOUCH_INTERVAL:
+        return
+    if len(_last_touch) >= settings.ACTIVITY_LOCAL_MAX_USERS:
+        _last_touch.clear()
+    _last_touch[user_id] = now
+
+    try:
+        get_redis().hset(LAST_SEEN_KEY, user_id, int(time.time()))
+    except redis.RedisError as e:
+        logger.warning(f"Не удалось записать активность пользователя {user_id}: {e}")
+
+
+def save_last_activity(last_seen, batch_size):
+    """
+    Записывает {user_id: unix time} в User.last_activity.
+    bulk_update выполняет один UPDATE на пачку из batch_size пользователей.
+    """
+    users = [
+        User(pk=int(user_id), last_activity=datetime.fromtimestamp(int(ts), tz=dt_timezone.utc))
+        for user_id, ts in last_seen.items()
+    ]
+    User.objects.bulk_update(users, ['last_activity'], batch_size=batch_size)
+    return len(users)
+
+
+def flush_activity(batch_size):
+    """
+    Переносит накопленную в Redis активность в БД.
+    Хеш атомарно переименовывается, поэтому новые отметки во время сброса не теряются.
+    Если прошлый сброс упал, сначала дописывается оставшийся снимок.
+    """
+    client = get_redis()
+    if not client.exists(FLUSHING_KEY):
+        try:
+            client.rename(LAST_SEEN_KEY, FLUSHING_KEY)
+        except redis.ResponseError:
+            return 0  # за период никто не был активен
+
+    last_seen = {user_id.decode(): ts.decode() for user_id, ts in client.hgetall(FLUSHING_KEY).items()}
+    count = save_last_activity(last_seen, batch_size)
+    client.delete(FLUSHING_KEY)
+    return count
@@ -1,19 +1,24 @@
 # users/admin.py
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+
+from core.admin import PerformanceAdminMixin
 from .models import User, Payment
 
 # Если вы используете кастомную модель User
 @admin.register(User)
-class UserAdmin(BaseUserAdmin):
+class UserAdmin(PerformanceAdminMixin, BaseUserAdmin):
     list_display = ('email', 'first_name', 'last_name', 'is_staff')
-    search_fields = ('email', 'first_name', 'last_name')
+    # Только префиксный поиск: он использует индексы UPPER(email), UPPER(first_name), UPPER(last_name)
+    search_fields = ('^email', '^first_name', '^last_name')
     ordering = ('email',)
 
 
 @admin.register(Payment)
-class PaymentAdmin(admin.ModelAdmin):
+class PaymentAdmin(PerformanceAdminMixin, admin.ModelAdmin):
     list_display = ('user', 'payment_date', 'amount', 'course', 'lesson', 'payment_method', 'is_paid')
+    list_select_related = ('user', 'course', 'lesson')
     list_filter = ('payment_method', 'is_paid')
-    search_fields = ('user__email', 'course__title', 'lesson__title')
+    search_fields = ('^user__email', '^course__title', '^lesson__title')
+    autocomplete_fields = ('user', 'course', 'lesson')
     readonly_fields = ('stripe_session_id', 'payment_link')
\ No newline at end of file
@@ -0,0 +1,99 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from core.db_router import primary_reads
+from users.activity import touch
+
+User = get_user_model()
+
+# Поля пользователя, которые кладутся в токен и восстанавливаются из него
+TOKEN_USER_FIELDS = ('email', 'is_active', 'is_staff', 'is_superuser')
+AUTH_STATE_FIELDS = ('is_active', 'is_staff', 'is_superuser')
+
+
+def add_user_claims(token, user):
+    """Добавляет в токен claims, достаточные для работы без запроса к таблице User."""
+    for field in TOKEN_USER_FIELDS:
+        token[field] = getattr(user, field)
+    token['groups'] = sorted(user.group_names)
+    return token
+
+
+def auth_state_cache_key(user_id):
+    return f'users:auth_state:{user_id}'
+
+
+def get_auth_state(user_id):
+    """
+    Возвращает актуальные флаги is_active/is_staff/is_superuser пользователя.
+    Значение кешируется на AUTH_STATE_CACHE_TTL секунд, чтобы блокировка
+    пользователя вступала в силу быстро, но без запроса к БД на каждый запрос.
+    Загружается с основной БД: с отстающей реплики в кеш попали бы флаги до блокировки.
+    """
+    key = auth_state_cache_key(user_id)
+    state = cache.get(key)
+    if state is None:
+        with primary_reads():
+            state = User.objects.filter(pk=user_id).values(*AUTH_STATE_FIELDS).first()
+        if state is None:
+            return None
+        cache.set(key, state, settings.AUTH_STATE_CACHE_TTL)
+    return state
+
+
+def user_from_token(validated_token):
+    """
+    Строит экземпляр User из claims токена без запроса к БД.
+    Поля, которых нет в токене, отложены (deferred) и подгружаются из БД
+    только при первом обращении к ним.
+    """
+    values = {
+        'id': int(validated_token[api_settings.USER_ID_CLAIM]),
+        **{field: validated_token[field] for field in TOKEN_USER_FIELDS},
+    }
+    field_names = [f.attname for f in User._meta.concrete_fields if f.attname in values]
+    user = User.from_db(router.db_for_read(User), field_names, [values[name] for name in field_names])
+    user.token_groups = validated_token['groups']
+    return user
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    JWT-аутентификация без загрузки строки User на каждый запрос.
+    Пользователь восстанавливается из claims, блокировка проверяется через короткий кеш.
+    Токены, выпущенные до появления claims, обрабатываются старым способом (запрос к БД).
+    """
+
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None:
+            touch(result[0].pk)
+        return result
+
+    def get_user(self, validated_token):
+        if 'groups' not in validated_token:
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_('Token contained no recognizable user identification')) from e
+
+        state = get_auth_state(user_id)
+        if state is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        if not state['is_active']:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        user = user_from_token(validated_token)
+        # Флаги доступа берем из кеша: они свежее, чем claims в токене
+        for field, value in state.items():
+            setattr(user, field, value)
+        return user
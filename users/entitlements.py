@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from core.db_router import primary_reads
+
+from users.models import CourseEntitlement
+
+
+def entitlements_cache_key(user_id):
+    return f'users:entitlements:{user_id}'
+
+
+def get_entitled_course_ids(user):
+    """
+    Возвращает frozenset ID курсов, купленных пользователем.
+    Множество кешируется на ENTITLEMENTS_CACHE_TTL секунд и запоминается на объекте
+    пользователя, поэтому в пределах запроса проверки не ходят ни в кеш, ни в БД.
+    В кеш попадает значение с основной БД: реплика может еще не знать о покупке.
+    """
+    if not user.is_authenticated:
+        return frozenset()
+    course_ids = getattr(user, '_entitled_course_ids', None)
+    if course_ids is None:
+        key = entitlements_cache_key(user.pk)
+        course_ids = cache.get(key)
+        if course_ids is None:
+            with primary_reads():
+                course_ids = frozenset(
+                    CourseEntitlement.objects.filter(user_id=user.pk).values_list('course_id', flat=True)
+                )
+            cache.set(key, course_ids, settings.ENTITLEMENTS_CACHE_TTL)
+        user._entitled_course_ids = course_ids
+    return course_ids
+
+
+def has_entitlement(user, course_id):
+    return course_id in get_entitled_course_ids(user)
+
+
+def grant_entitlements(pairs):
+    """
+    Выдает доступ по парам (user_id, course_id), уже выданные пропускаются.
+    Кеш затронутых пользователей сбрасывается; внутри транзакции — еще раз после коммита,
+    иначе параллельный запрос мог успеть закешировать набор курсов без новой покупки.
+    """
+    pairs = {(user_id, course_id) for user_id, course_id in pairs if course_id is not None}
+    if not pairs:
+        return
+    CourseEntitlement.objects.bulk_create(
+        [CourseEntitlement(user_id=user_id, course_id=course_id) for user_id, course_id in pairs],
+        ignore_conflicts=True,
+    )
+    keys = [entitlements_cache_key(user_id) for user_id, _ in pairs]
+    cache.delete_many(keys)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,109 @@
+import hashlib
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from users.models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+
+class IdempotentCreateMixin:
+    """
+    Поддержка заголовка Idempotency-Key для create().
+
+    - Первый запрос с ключом резервирует запись (уникальная пара user + key)
+      и сохраняет свой ответ.
+    - Повтор с тем же ключом возвращает сохраненный ответ, не выполняя create()
+      (ни БД, ни Stripe не трогаются).
+    - Параллельный дубликат ждет до IDEMPOTENCY_WAIT_TIMEOUT секунд, пока первый
+      запрос завершится, вместо того чтобы выполнять create() одновременно с ним.
+    - Тот же ключ с другим телом запроса — ошибка 422.
+    - Резерв без ответа старше IDEMPOTENCY_ABANDON_AFTER считается брошенным
+      (процесс упал посреди запроса): следующий повтор забирает его и выполняет create().
+      Пока резерв моложе, повтор после ожидания получает 409.
+    - Забранный резерв — новая запись, поэтому ее PK служит токеном владения: запрос,
+      у которого резерв забрали, не перезаписывает и не удаляет чужой.
+    """
+
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return super().create(request, *args, **kwargs)
+
+        request_hash = hashlib.sha256(request.body).hexdigest()
+        record = self.reserve(request.user, key, request_hash)
+        if record is None:
+            response = self.replay_response(request.user, key, request_hash)
+            if response is not None:
+                return response
+            # Не дождались ответа: если резерв брошен (старше IDEMPOTENCY_ABANDON_AFTER), забираем его
+            record = self.reserve(request.user, key, request_hash)
+            if record is None:
+                return Response({'error': 'Запрос с этим ключом еще выполняется.'},
+                                status=status.HTTP_409_CONFLICT)
+
+        owned = IdempotencyKey.objects.filter(pk=record.pk, status_code__isnull=True)
+        try:
+            response = super().create(request, *args, **kwargs)
+        except Exception:
+            # Ошибку не запоминаем: повтор с тем же ключом выполнится заново
+            owned.delete()
+            raise
+
+        if response.status_code >= 500:
+            owned.delete()
+        elif not owned.update(status_code=response.status_code, response_body=response.data):
+            logger.warning(f"Резерв ключа идемпотентности {key} забран повтором, пока выполнялся запрос")
+        return response
+
+    def reserve(self, user, key, request_hash):
+        """
+        Резервирует ключ за текущим запросом. Брошенный резерв с тем же телом запроса
+        удаляется условно: из параллельных повторов его заберет только один.
+        Возвращает запись или None, если ключ занят.
+        """
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(user=user, key=key, request_hash=request_hash)
+        except IntegrityError:
+            pass
+
+        abandoned_before = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_ABANDON_AFTER)
+        deleted, _ = IdempotencyKey.objects.filter(
+            user=user, key=key, request_hash=request_hash, status_code__isnull=True,
+            created_at__lt=abandoned_before,
+        ).delete()
+        if not deleted:
+            return None
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(user=user, key=key, request_hash=request_hash)
+        except IntegrityError:
+            return None
+
+    def replay_response(self, user, key, request_hash):
+        """Сохраненный ответ или ошибка; None — если ответа не дождались за IDEMPOTENCY_WAIT_TIMEOUT."""
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+        while True:
+            record = IdempotencyKey.objects.filter(user=user, key=key).first()
+            if record is None:
+                return Response({'error': 'Предыдущий запрос с этим ключом завершился ошибкой, повторите запрос.'},
+                                status=status.HTTP_409_CONFLICT)
+            if record.request_hash != request_hash:
+                return Response({'error': 'Ключ идемпотентности уже использован с другим телом запроса.'},
+                                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if record.status_code is not None:
+                return Response(record.response_body, status=record.status_code,
+                                headers={'Idempotent-Replayed': 'true'})
+            if time.monotonic() >= deadline:
+                return None  # не дождались: возможно, резерв брошен (проверит reserve)
+            time.sleep(settings.IDEMPOTENCY_POLL_INTERVAL)
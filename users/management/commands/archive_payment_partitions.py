@@ -0,0 +1,45 @@
+import os
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from users.partitions import (
+    DEFAULT_PARTITION, add_months, archive_default_rows, archive_partition, is_partitioned, list_partitions,
+    month_start,
+)
+
+
+class Command(BaseCommand):
+    help = ('Выгружает секции платежей старше --older-than-months месяцев (и такие же старые платежи '
+            'из секции по умолчанию) в сжатые NDJSON-файлы и удаляет их из БД. '
+            'Месячные итоги (PaymentRollup) за эти месяцы сохраняются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-months', type=int, default=settings.PAYMENT_ARCHIVE_AFTER_MONTHS,
+                            help='Архивировать секции, закончившиеся раньше, чем столько месяцев назад.')
+        parser.add_argument('--directory', default=settings.PAYMENT_ARCHIVE_DIR, help='Каталог для архивов.')
+        parser.add_argument('--dry-run', action='store_true', help='Только показать, какие секции будут выгружены.')
+
+    def handle(self, *args, **options):
+        if not is_partitioned():
+            raise CommandError('Таблица платежей не секционирована (нужен PostgreSQL и миграция users 0012).')
+
+        cutoff = add_months(month_start(datetime.now(dt_timezone.utc)), -options['older_than_months'])
+        old = [name for name, start in list_partitions() if add_months(start, 1) <= cutoff]
+        if options['dry_run']:
+            for name in old:
+                self.stdout.write(f'Будет выгружена секция {name}')
+            self.stdout.write(f'Будет выгружено секций: {len(old)}, '
+                              f'а из {DEFAULT_PARTITION} — платежи раньше {cutoff:%Y-%m}.')
+            return
+
+        os.makedirs(options['directory'], exist_ok=True)
+        for name in old:
+            path, rows = archive_partition(name, options['directory'])
+            self.stdout.write(f'{name}: {rows} платежей -> {path}')
+        # В DEFAULT попадают платежи месяцев без своей секции (например, если секции не успели создать)
+        path, rows = archive_default_rows(cutoff, options['directory'])
+        if path:
+            self.stdout.write(f'{DEFAULT_PARTITION}: {rows} платежей -> {path}')
+        self.stdout.write(f'Выгружено секций: {len(old)}.')
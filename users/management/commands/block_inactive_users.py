@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from users.tasks import block_inactive_users
+
+
+class Command(BaseCommand):
+    help = 'Блокирует пользователей, неактивных более 30 дней (пачками, с продолжением после сбоя).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать, кого заблокировать.')
+        parser.add_argument('--batch-size', type=int, default=None, help='Размер пачки.')
+        parser.add_argument('--pause', type=float, default=None, help='Пауза между пачками в секундах.')
+
+    def handle(self, *args, **options):
+        result = block_inactive_users(
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+            dry_run=options['dry_run'],
+        )
+        self.stdout.write(result)
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from users.partitions import ensure_partitions, is_partitioned
+
+
+class Command(BaseCommand):
+    help = 'Создает месячные секции таблицы платежей на несколько месяцев вперед (только PostgreSQL).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=settings.PAYMENT_PARTITIONS_AHEAD,
+                            help='На сколько месяцев вперед создавать секции.')
+
+    def handle(self, *args, **options):
+        if not is_partitioned():
+            raise CommandError('Таблица платежей не секционирована (нужен PostgreSQL и миграция users 0012).')
+        created = ensure_partitions(options['months_ahead'])
+        for name in created:
+            self.stdout.write(f'Создана секция {name}')
+        self.stdout.write(f'Создано секций: {len(created)}.')
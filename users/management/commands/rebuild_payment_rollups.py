@@ -0,0 +1,32 @@
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+from django.core.management.base import BaseCommand
+
+from users.models import Payment, PaymentRollup
+
+
+class Command(BaseCommand):
+    help = ('Полностью пересчитывает месячные итоги платежей (PaymentRollup) по таблице Payment. '
+            'Нужен один раз после развертывания; дальше итоги обновляются при оплате платежей.')
+
+    def handle(self, *args, **options):
+        paid = Payment.objects.filter(is_paid=True).annotate(month=TruncMonth('payment_date'))
+        rollups = []
+        for field in ('user_id', 'course_id'):
+            rows = (
+                paid.filter(**{f'{field}__isnull': False})
+                .values(field, 'month')
+                .annotate(total=Sum('amount'), payments_count=Count('id'))
+                .order_by()
+            )
+            rollups.extend(
+                PaymentRollup(month=row['month'].date(), total=row['total'], payments_count=row['payments_count'],
+                              **{field: row[field]})
+                for row in rows.iterator()
+            )
+
+        with transaction.atomic():
+            PaymentRollup.objects.all().delete()
+            PaymentRollup.objects.bulk_create(rollups, batch_size=1000)
+        self.stdout.write(f'Пересчитано итогов: {len(rollups)}.')
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from materials.models import Course
+from users.models import StripeCoursePrice
+from users.services import get_course_stripe_price
+
+
+class Command(BaseCommand):
+    help = ('Создает (или обновляет при смене цены) продукты и цены Stripe для платных курсов. '
+            'Для проверки без реального Stripe укажите STRIPE_API_BASE на stripe-mock.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course-id', type=int, action='append', help='Синхронизировать только указанные курсы.')
+
+    def handle(self, *args, **options):
+        courses = Course.objects.filter(price__gt=0).order_by('pk')
+        if options['course_id']:
+            courses = courses.filter(pk__in=options['course_id'])
+
+        known = dict(StripeCoursePrice.objects.values_list('course_id', 'price_id'))
+        created = updated = unchanged = failed = 0
+
+        for course in courses.iterator():
+            price_id = get_course_stripe_price(course)
+            if price_id is None:
+                failed += 1
+                self.stderr.write(f'Курс {course.pk}: не удалось получить цену в Stripe.')
+            elif course.pk not in known:
+                created += 1
+            elif known[course.pk] != price_id:
+                updated += 1
+            else:
+                unchanged += 1
+
+        self.stdout.write(f'Создано: {created}, обновлено цен: {updated}, без изменений: {unchanged}, ошибок: {failed}.')
+        if failed:
+            raise CommandError('Не все курсы удалось синхронизировать со Stripe.')
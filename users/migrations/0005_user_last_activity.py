@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_alter_payment_options_alter_user_managers_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='last_activity',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Последняя активность'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('materials', '0007_course_last_updated_at'),
+        ('users', '0005_user_last_activity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StripeCoursePrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_id', models.CharField(max_length=255, verbose_name='ID продукта Stripe')),
+                ('price_id', models.CharField(max_length=255, verbose_name='ID цены Stripe')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Сумма цены')),
+                ('currency', models.CharField(default='rub', max_length=3, verbose_name='Валюта')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stripe_price', to='materials.course', verbose_name='Курс')),
+            ],
+            options={
+                'verbose_name': 'Цена Stripe для курса',
+                'verbose_name_plural': 'Цены Stripe для курсов',
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_stripecourseprice'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StripeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.CharField(max_length=255, unique=True, verbose_name='ID события Stripe')),
+                ('type', models.CharField(max_length=100, verbose_name='Тип события')),
+                ('received_at', models.DateTimeField(auto_now_add=True, verbose_name='Получено')),
+            ],
+            options={
+                'verbose_name': 'Событие Stripe',
+                'verbose_name_plural': 'События Stripe',
+            },
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='stripe_session_id',
+            field=models.CharField(blank=True, db_index=True, max_length=255, null=True, verbose_name='ID сессии Stripe'),
+        ),
+    ]
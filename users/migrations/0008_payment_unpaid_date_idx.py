@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_stripeevent'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(condition=models.Q(('is_paid', False)), fields=['payment_date'], name='payment_unpaid_date_idx'),
+        ),
+    ]
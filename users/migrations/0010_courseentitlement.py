@@ -0,0 +1,51 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_entitlements(apps, schema_editor):
+    """Выдает доступ по уже оплаченным платежам за курсы."""
+    Payment = apps.get_model('users', 'Payment')
+    CourseEntitlement = apps.get_model('users', 'CourseEntitlement')
+    purchases = (
+        Payment.objects.filter(is_paid=True, course__isnull=False)
+        .values_list('user_id', 'course_id').distinct().iterator()
+    )
+    batch = []
+    for user_id, course_id in purchases:
+        batch.append(CourseEntitlement(user_id=user_id, course_id=course_id))
+        if len(batch) >= 1000:
+            CourseEntitlement.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    CourseEntitlement.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('materials', '0007_course_last_updated_at'),
+        ('users', '0009_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseEntitlement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granted_at', models.DateTimeField(auto_now_add=True, verbose_name='Выдано')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entitlements', to='materials.course', verbose_name='Курс')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entitlements', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Доступ к курсу',
+                'verbose_name_plural': 'Доступы к курсам',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='courseentitlement',
+            constraint=models.UniqueConstraint(fields=('user', 'course'), name='unique_user_course_entitlement'),
+        ),
+        migrations.RunPython(backfill_entitlements, migrations.RunPython.noop),
+    ]
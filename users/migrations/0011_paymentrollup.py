@@ -0,0 +1,61 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('materials', '0007_course_last_updated_at'),
+        ('users', '0010_courseentitlement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='Месяц')),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Сумма')),
+                ('payments_count', models.PositiveIntegerField(default=0, verbose_name='Число платежей')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Пересчитано')),
+            ],
+            options={
+                'verbose_name': 'Итоги платежей за месяц',
+                'verbose_name_plural': 'Итоги платежей за месяц',
+                'ordering': ('-month',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['user', '-payment_date', '-id'], name='payment_user_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['course', 'payment_date'], name='payment_course_date_idx'),
+        ),
+        migrations.AddField(
+            model_name='paymentrollup',
+            name='course',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='payment_rollups', to='materials.course', verbose_name='Курс'),
+        ),
+        migrations.AddField(
+            model_name='paymentrollup',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='payment_rollups', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AddConstraint(
+            model_name='paymentrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('course__isnull', True)), fields=('user', 'month'), name='unique_user_month_rollup'),
+        ),
+        migrations.AddConstraint(
+            model_name='paymentrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', True)), fields=('course', 'month'), name='unique_course_month_rollup'),
+        ),
+        migrations.AddConstraint(
+            model_name='paymentrollup',
+            constraint=models.CheckConstraint(check=models.Q(models.Q(('course__isnull', True), ('user__isnull', False)), models.Q(('course__isnull', False), ('user__isnull', True)), _connector='OR'), name='rollup_user_xor_course'),
+        ),
+    ]
@@ -0,0 +1,99 @@
+from django.db import migrations
+
+# Секции создаются на столько месяцев вперед; дальше их создает create_payment_partitions
+MONTHS_AHEAD = 3
+
+
+def partition_payment_table(apps, schema_editor):
+    """
+    Переводит users_payment на декларативное секционирование по месяцам (RANGE по payment_date).
+
+    - старая таблица переименовывается, новая создается с теми же колонками;
+    - первичный ключ — (id, payment_date): секционированная таблица требует ключ
+      секционирования в уникальных ограничениях, для ORM первичным ключом остается id;
+    - индексы и внешние ключи переносятся со старой таблицы под теми же именами,
+      старые индексы и первичный ключ переименовываются, чтобы имена освободились;
+    - данные копируются, старая таблица удаляется.
+
+    Миграция блокирует таблицу платежей на время копирования: запускать в окно обслуживания.
+    Поиск по одному id (без payment_date) проверяет индекс первичного ключа каждой секции:
+    число секций ограничивает архивирование (archive_payment_partitions).
+    На других СУБД ничего не делает.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    table = 'users_payment'
+    legacy = 'users_payment_legacy'
+    sequence = 'users_payment_part_id_seq'
+    execute = schema_editor.execute
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexrelid::regclass::text, pg_get_indexdef(indexrelid) FROM pg_index "
+            "WHERE indrelid = %s::regclass AND NOT indisprimary",
+            [table],
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype IN ('f', 'c')",
+            [table],
+        )
+        constraints = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'", [table]
+        )
+        primary_key = cursor.fetchone()[0]
+        # Секции — с месяца самого старого платежа (или с текущего, если платежей нет)
+        # по MONTHS_AHEAD месяцев вперед; LEAST пропускает NULL от min() пустой таблицы
+        cursor.execute(
+            "SELECT date_trunc('month', LEAST(min(payment_date), now()) AT TIME ZONE 'UTC'), "
+            "date_trunc('month', now() AT TIME ZONE 'UTC') + make_interval(months => %s) FROM users_payment",
+            [MONTHS_AHEAD],
+        )
+        first_month, last_month = cursor.fetchone()
+
+    execute(f'ALTER TABLE "{table}" RENAME TO "{legacy}"')
+    # Индекс первичного ключа — отдельное отношение: без переименования имя
+    # users_payment_pkey занято и новый первичный ключ не создать
+    execute(f'ALTER TABLE "{legacy}" RENAME CONSTRAINT "{primary_key}" TO "{legacy}_pkey"')
+    for index_name, _ in indexes:
+        execute(f'ALTER INDEX "{index_name}" RENAME TO "{index_name[:55]}_legacy"')
+
+    execute(f'CREATE TABLE "{table}" (LIKE "{legacy}" INCLUDING DEFAULTS) PARTITION BY RANGE ("payment_date")')
+    execute(f'CREATE SEQUENCE "{sequence}" OWNED BY "{table}"."id"')
+    execute(f'ALTER TABLE "{table}" ALTER COLUMN "id" SET DEFAULT nextval(\'"{sequence}"\')')
+    execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{table}_pkey" PRIMARY KEY ("id", "payment_date")')
+    # Определения сняты до переименования и ссылаются на users_payment: индекс создается
+    # на секционированной таблице и наследуется всеми секциями
+    for _, definition in indexes:
+        execute(definition)
+    for name, definition in constraints:
+        execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{name}" {definition}')
+
+    execute(f'CREATE TABLE "{table}_default" PARTITION OF "{table}" DEFAULT')
+    month = first_month
+    while month <= last_month:
+        next_month = month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+        execute(
+            f'CREATE TABLE "{table}_p{month:%Y_%m}" PARTITION OF "{table}" FOR VALUES FROM (%s) TO (%s)',
+            [f'{month:%Y-%m-%d} 00:00:00+00', f'{next_month:%Y-%m-%d} 00:00:00+00'],
+        )
+        month = next_month
+
+    execute(f'INSERT INTO "{table}" SELECT * FROM "{legacy}"')
+    execute(f'SELECT setval(\'"{sequence}"\', COALESCE((SELECT max("id") FROM "{table}"), 0) + 1, false)')
+    execute(f'DROP TABLE "{legacy}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0011_paymentrollup'),
+    ]
+
+    operations = [
+        # Схема для ORM не меняется: те же колонки и индексы, поэтому обратная операция не нужна
+        migrations.RunPython(partition_payment_table, migrations.RunPython.noop),
+    ]
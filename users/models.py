@@ -1,7 +1,17 @@
 from django.contrib.auth.models import AbstractUser, BaseUserManager
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
+from django.utils.functional import cached_property
+
+from core.cache import TieredCache
+from core.db_router import primary_reads
+
+MODERATORS_GROUP = 'moderators'
+
+# Группы пользователей, загруженных из БД (админка, задачи, старые токены без claims)
+user_groups_cache = TieredCache('user_groups', timeout=settings.USER_GROUPS_CACHE_TTL)
 
 
 class UserManager(BaseUserManager):
@@ -45,6 +55,8 @@ class User(AbstractUser):
     phone = models.CharField(max_length=35, blank=True, null=True, verbose_name='Телефон')
     city = models.CharField(max_length=100, blank=True, null=True, verbose_name='Город')
     avatar = models.ImageField(upload_to='users/avatars/', blank=True, null=True, verbose_name='Аватар')
+    # Обновляется пачками из users.activity (JWT-логин не трогает last_login)
+    last_activity = models.DateTimeField(blank=True, null=True, db_index=True, verbose_name='Последняя активность')
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
@@ -57,6 +69,28 @@ class User(AbstractUser):
     def __str__(self):
         return self.email
 
+    @cached_property
+    def group_names(self):
+        """
+        Имена групп пользователя.
+        Для пользователя, восстановленного из JWT, берутся из claims без запроса к БД,
+        для остальных — из двухуровневого кеша (сбрасывается при изменении групп,
+        поэтому загружается с основной БД).
+        """
+        token_groups = getattr(self, 'token_groups', None)
+        if token_groups is not None:
+            return frozenset(token_groups)
+
+        def load():
+            with primary_reads():
+                return frozenset(self.groups.values_list('name', flat=True))
+
+        return user_groups_cache.get_or_set(self.pk, load)
+
+    @property
+    def is_moderator(self):
+        return MODERATORS_GROUP in self.group_names
+
 
 class Payment(models.Model):
     PAYMENT_METHOD_CHOICES = [
@@ -77,13 +111,145 @@ class Payment(models.Model):
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHOD_CHOICES, verbose_name='Способ оплаты')
 
     is_paid = models.BooleanField(default=False, verbose_name='Статус оплаты')
-    stripe_session_id = models.CharField(max_length=255, blank=True, null=True, verbose_name='ID сессии Stripe')
+    stripe_session_id = models.CharField(max_length=255, blank=True, null=True, db_index=True,
+                                         verbose_name='ID сессии Stripe')
     payment_link = models.URLField(max_length=500, blank=True, null=True, verbose_name='Ссылка на оплату')
 
     class Meta:
         verbose_name = 'Платеж'
         verbose_name_plural = 'Платежи'
         ordering = ('-payment_date',)
+        indexes = [
+            # Для сверки неоплаченных платежей за последние дни
+            models.Index(fields=['payment_date'], condition=models.Q(is_paid=False), name='payment_unpaid_date_idx'),
+            # Курсорная пагинация истории пользователя по (-payment_date, -id)
+            models.Index(fields=['user', '-payment_date', '-id'], name='payment_user_date_id_idx'),
+            # Пересчет месячных итогов по курсу
+            models.Index(fields=['course', 'payment_date'], name='payment_course_date_idx'),
+        ]
+
+    def __str__(self):
+        return f'Платеж от {self.user} на сумму {self.amount} (Paid: {self.is_paid})'
+
+
+class StripeCoursePrice(models.Model):
+    """
+    Продукт и цена Stripe, созданные для курса.
+    Новая цена в Stripe создается только при изменении Course.price.
+    """
+    course = models.OneToOneField('materials.Course', on_delete=models.CASCADE, related_name='stripe_price',
+                                  verbose_name='Курс')
+    product_id = models.CharField(max_length=255, verbose_name='ID продукта Stripe')
+    price_id = models.CharField(max_length=255, verbose_name='ID цены Stripe')
+    amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Сумма цены')
+    currency = models.CharField(max_length=3, default='rub', verbose_name='Валюта')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Обновлено')
+
+    class Meta:
+        verbose_name = 'Цена Stripe для курса'
+        verbose_name_plural = 'Цены Stripe для курсов'
+
+    def __str__(self):
+        return f'{self.course} -> {self.price_id} ({self.amount} {self.currency})'
+
+
+
+class StripeEvent(models.Model):
+    """
+    Обработанные события вебхука Stripe.
+    Уникальный event_id гарантирует, что повторная доставка события не обработается дважды.
+    """
+    event_id = models.CharField(max_length=255, unique=True, verbose_name='ID события Stripe')
+    type = models.CharField(max_length=100, verbose_name='Тип события')
+    received_at = models.DateTimeField(auto_now_add=True, verbose_name='Получено')
+
+    class Meta:
+        verbose_name = 'Событие Stripe'
+        verbose_name_plural = 'События Stripe'
+
+    def __str__(self):
+        return f'{self.type} ({self.event_id})'
+
+
+class IdempotencyKey(models.Model):
+    """
+    Ответ на первый запрос с заголовком Idempotency-Key.
+    Повтор запроса с тем же ключом получает сохраненный ответ без повторной обработки.
+    status_code = NULL означает, что первый запрос еще выполняется.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='idempotency_keys',
+                             verbose_name='Пользователь')
+    key = models.CharField(max_length=255, verbose_name='Ключ идемпотентности')
+    request_hash = models.CharField(max_length=64, verbose_name='Хеш тела запроса')
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name='Код ответа')
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder, verbose_name='Тело ответа')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Создан')
+
+    class Meta:
+        verbose_name = 'Ключ идемпотентности'
+        verbose_name_plural = 'Ключи идемпотентности'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_user_idempotency_key'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id}:{self.key}'
+
+
+class CourseEntitlement(models.Model):
+    """
+    Право доступа пользователя к купленному курсу.
+    Создается, когда платеж за курс становится оплаченным; проверка покупки —
+    поиск по уникальной паре (user, course) или по закешированному множеству курсов.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='entitlements',
+                             verbose_name='Пользователь')
+    course = models.ForeignKey('materials.Course', on_delete=models.CASCADE, related_name='entitlements',
+                               verbose_name='Курс')
+    granted_at = models.DateTimeField(auto_now_add=True, verbose_name='Выдано')
+
+    class Meta:
+        verbose_name = 'Доступ к курсу'
+        verbose_name_plural = 'Доступы к курсам'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'course'], name='unique_user_course_entitlement'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} -> {self.course_id}'
+
+
+class PaymentRollup(models.Model):
+    """
+    Месячные итоги оплаченных платежей: либо по пользователю, либо по курсу
+    (заполнено ровно одно из полей user/course).
+    Строки меняются на приращения при оплате, изменении и удалении платежа
+    и раз в день сверяются с таблицей Payment, поэтому отчеты не агрегируют ее.
+    """
+    month = models.DateField(verbose_name='Месяц')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True,
+                             related_name='payment_rollups', verbose_name='Пользователь')
+    course = models.ForeignKey('materials.Course', on_delete=models.CASCADE, null=True, blank=True,
+                               related_name='payment_rollups', verbose_name='Курс')
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='Сумма')
+    payments_count = models.PositiveIntegerField(default=0, verbose_name='Число платежей')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Пересчитано')
+
+    class Meta:
+        verbose_name = 'Итоги платежей за месяц'
+        verbose_name_plural = 'Итоги платежей за месяц'
+        ordering = ('-month',)
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'month'], condition=models.Q(course__isnull=True),
+                                    name='unique_user_month_rollup'),
+            models.UniqueConstraint(fields=['course', 'month'], condition=models.Q(user__isnull=True),
+                                    name='unique_course_month_rollup'),
+            models.CheckConstraint(
+                check=models.Q(user__isnull=False, course__isnull=True) | models.Q(user__isnull=True, course__isnull=False),
+                name='rollup_user_xor_course',
+            ),
+        ]
 
     def __str__(self):
-        return f'Платеж от {self.user} на сумму {self.amount} (Paid: {self.is_paid})'
\ No newline at end of file
+        target = f'user {self.user_id}' if self.user_id else f'course {self.course_id}'
+        return f'{target} {self.month:%Y-%m}: {self.total}'
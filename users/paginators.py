@@ -0,0 +1,26 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class PaymentCursorPagination(CursorPagination):
+    """
+    Курсорная пагинация истории платежей по (-payment_date, -id).
+    Страница читается по индексу с позиции курсора, без OFFSET и COUNT(*).
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-payment_date', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        # ?ordering=payment_date заменяет порядок по умолчанию: без id в конце порядок
+        # неоднозначен, и на границах страниц строки с одной датой пропускаются или повторяются
+        ordering = tuple(super().get_ordering(request, queryset, view))
+        if ordering[-1].lstrip('-') not in ('id', 'pk'):
+            ordering += ('-id' if ordering[0].startswith('-') else 'id',)
+        return ordering
+
+
+class PaymentRollupPagination(PageNumberPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
@@ -0,0 +1,180 @@
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+
+from users.models import Payment
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_TABLE = Payment._meta.db_table
+DEFAULT_PARTITION = f'{PAYMENT_TABLE}_default'
+
+
+def month_start(dt):
+    return datetime(dt.year, dt.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(dt, months):
+    month = dt.month - 1 + months
+    return dt.replace(year=dt.year + month // 12, month=month % 12 + 1)
+
+
+def partition_name(start):
+    return f'{PAYMENT_TABLE}_p{start:%Y_%m}'
+
+
+def is_partitioned():
+    """True, если таблица платежей уже секционирована (только PostgreSQL)."""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass", [PAYMENT_TABLE]
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions():
+    """
+    Месячные секции таблицы платежей: [(имя, начало месяца)], по возрастанию.
+    Секция по умолчанию (DEFAULT) не входит в список.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s AND child.relname <> %s
+            ORDER BY child.relname
+            """,
+            [PAYMENT_TABLE, DEFAULT_PARTITION],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    prefix = f'{PAYMENT_TABLE}_p'
+    return [
+        (name, datetime.strptime(name[len(prefix):], '%Y_%m').replace(tzinfo=dt_timezone.utc))
+        for name in names if name.startswith(prefix)
+    ]
+
+
+def create_partition(start):
+    """
+    Создает секцию на месяц, начинающийся в start. Возвращает False, если она уже есть.
+    Платежи этого месяца, уже попавшие в секцию по умолчанию, переносятся в новую:
+    иначе PostgreSQL не даст создать секцию, пересекающуюся со строками DEFAULT.
+    """
+    name = partition_name(start)
+    bounds = [start, add_months(start, 1)]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s)", [name])
+        if cursor.fetchone()[0] is not None:
+            return False
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM "{DEFAULT_PARTITION}" WHERE "payment_date" >= %s AND "payment_date" < %s)',
+            bounds,
+        )
+        if not cursor.fetchone()[0]:
+            cursor.execute(
+                f'CREATE TABLE "{name}" PARTITION OF "{PAYMENT_TABLE}" FOR VALUES FROM (%s) TO (%s)', bounds
+            )
+        else:
+            # Новые строки этого месяца не должны попасть в DEFAULT, пока идет перенос
+            cursor.execute(f'LOCK TABLE "{DEFAULT_PARTITION}" IN EXCLUSIVE MODE')
+            cursor.execute(f'CREATE TABLE "{name}" (LIKE "{PAYMENT_TABLE}" INCLUDING DEFAULTS)')
+            cursor.execute(
+                f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" '
+                f'WHERE "payment_date" >= %s AND "payment_date" < %s RETURNING *) '
+                f'INSERT INTO "{name}" SELECT * FROM moved',
+                bounds,
+            )
+            logger.info(f"В секцию {name} перенесено {cursor.rowcount} платежей из {DEFAULT_PARTITION}.")
+            # Индексы и первичный ключ секционированной таблицы создаются на секции при присоединении
+            cursor.execute(
+                f'ALTER TABLE "{PAYMENT_TABLE}" ATTACH PARTITION "{name}" FOR VALUES FROM (%s) TO (%s)', bounds
+            )
+    logger.info(f"Создана секция {name}.")
+    return True
+
+
+def ensure_partitions(months_ahead, now=None):
+    """Создает секции с текущего месяца на months_ahead месяцев вперед. Возвращает имена созданных."""
+    current = month_start(now or datetime.now(dt_timezone.utc))
+    created = []
+    for offset in range(months_ahead + 1):
+        start = add_months(current, offset)
+        if create_partition(start):
+            created.append(partition_name(start))
+    return created
+
+
+def _write_archive(cursor, path, columns, batch_size):
+    """Пишет строки курсора в path (NDJSON + gzip) через временный файл. Возвращает число строк."""
+    tmp_path = f'{path}.tmp'
+    rows = 0
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as archive:
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            for row in batch:
+                archive.write(json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder, ensure_ascii=False))
+                archive.write('\n')
+            rows += len(batch)
+    os.replace(tmp_path, path)
+    return rows
+
+
+def archive_partition(name, directory, batch_size=2000):
+    """
+    Выгружает секцию в {directory}/{name}.ndjson.gz (одна строка JSON на платеж),
+    затем отсоединяет и удаляет ее. Файл пишется во временный и переименовывается
+    только после полной записи, секция удаляется только после этого.
+    """
+    path = os.path.join(directory, f'{name}.ndjson.gz')
+    columns = [field.column for field in Payment._meta.concrete_fields]
+    quoted_columns = ', '.join(f'"{column}"' for column in columns)
+
+    with transaction.atomic(), connection.chunked_cursor() as cursor:
+        cursor.execute(f'SELECT {quoted_columns} FROM "{name}" ORDER BY "id"')
+        rows = _write_archive(cursor, path, columns, batch_size)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE "{PAYMENT_TABLE}" DETACH PARTITION "{name}"')
+        cursor.execute(f'DROP TABLE "{name}"')
+    logger.info(f"Секция {name} ({rows} платежей) выгружена в {path} и удалена.")
+    return path, rows
+
+
+def archive_default_rows(before, directory, batch_size=2000):
+    """
+    Выгружает платежи секции по умолчанию с payment_date раньше before
+    в {directory}/{DEFAULT_PARTITION}_before_YYYY_MM.ndjson.gz и удаляет их.
+    Секция DEFAULT остается; выгрузка и удаление — в одной транзакции, запись
+    в DEFAULT на это время заблокирована. Возвращает (путь, число строк) или (None, 0).
+    """
+    path = os.path.join(directory, f'{DEFAULT_PARTITION}_before_{before:%Y_%m}.ndjson.gz')
+    columns = [field.column for field in Payment._meta.concrete_fields]
+    quoted_columns = ', '.join(f'"{column}"' for column in columns)
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f'LOCK TABLE "{DEFAULT_PARTITION}" IN EXCLUSIVE MODE')
+            cursor.execute(f'SELECT EXISTS (SELECT 1 FROM "{DEFAULT_PARTITION}" WHERE "payment_date" < %s)', [before])
+            if not cursor.fetchone()[0]:
+                return None, 0
+        with connection.chunked_cursor() as cursor:
+            cursor.execute(
+                f'SELECT {quoted_columns} FROM "{DEFAULT_PARTITION}" WHERE "payment_date" < %s ORDER BY "id"', [before]
+            )
+            rows = _write_archive(cursor, path, columns, batch_size)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM "{DEFAULT_PARTITION}" WHERE "payment_date" < %s', [before])
+    logger.info(f"{rows} платежей из {DEFAULT_PARTITION} старше {before:%Y-%m} выгружены в {path} и удалены.")
+    return path, rows
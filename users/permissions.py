@@ -6,7 +6,7 @@ class IsModer(permissions.BasePermission):
 
     def has_permission(self, request, view):
         user = request.user
-        return bool(user and user.is_authenticated and user.groups.filter(name='moderators').exists())
+        return bool(user and user.is_authenticated and user.is_moderator)
 
 
 class IsOwner(permissions.BasePermission):
@@ -0,0 +1,100 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from users.models import Payment, PaymentRollup
+
+
+def month_bounds(dt):
+    """Начало месяца (в текущей временной зоне) и начало следующего."""
+    start = timezone.localtime(dt).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start, end
+
+
+def _add_to_bucket(month, total, count, **target):
+    rollups = PaymentRollup.objects.filter(month=month, **target)
+    changes = {'total': F('total') + total, 'payments_count': F('payments_count') + count,
+               'updated_at': timezone.now()}
+    if not rollups.update(**changes):
+        if count <= 0:
+            return  # вычитать не из чего: расхождение исправит сверка
+        try:
+            with transaction.atomic():
+                PaymentRollup.objects.create(month=month, total=total, payments_count=count, **target)
+            return
+        except IntegrityError:
+            # Строку успел создать параллельный платеж
+            rollups.update(**changes)
+    if count < 0:
+        rollups.filter(payments_count=0).delete()
+
+
+def apply_payment_changes(changes):
+    """
+    Изменяет месячные итоги на приращения, без агрегации таблицы Payment.
+    changes — итерируемое из (user_id, course_id, payment_date, amount, sign):
+    sign = 1 — платеж стал оплаченным, -1 — перестал быть оплаченным или удален.
+    Вызывающий отвечает за то, чтобы каждый переход учитывался один раз.
+    Возвращает число затронутых итогов.
+    """
+    deltas = defaultdict(lambda: [Decimal(0), 0])
+    for user_id, course_id, payment_date, amount, sign in changes:
+        month = month_bounds(payment_date)[0].date()
+        targets = [('user_id', user_id)] + ([('course_id', course_id)] if course_id is not None else [])
+        for field, value in targets:
+            delta = deltas[(month, field, value)]
+            delta[0] += amount * sign
+            delta[1] += sign
+
+    # Одинаковый порядок обновления строк у параллельных платежей — без взаимных блокировок
+    changed = 0
+    for (month, field, value), (total, count) in sorted(deltas.items()):
+        if total or count:
+            _add_to_bucket(month, total, count, **{field: value})
+            changed += 1
+    return changed
+
+
+def reconcile_payment_rollups(since):
+    """
+    Сверяет итоги с таблицей Payment, начиная с месяца даты since: пересчитывает
+    их агрегацией и исправляет расходящиеся строки. Для периодической сверки,
+    а не для пути записи. Возвращает число исправленных итогов.
+    """
+    start = month_bounds(since)[0]
+    paid = Payment.objects.filter(is_paid=True, payment_date__gte=start).annotate(month=TruncMonth('payment_date'))
+    expected = {}
+    for field in ('user_id', 'course_id'):
+        rows = (
+            paid.filter(**{f'{field}__isnull': False})
+            .values(field, 'month')
+            .annotate(total=Sum('amount'), payments_count=Count('id'))
+            .order_by()
+        )
+        for row in rows.iterator():
+            expected[(row['month'].date(), field, row[field])] = (row['total'], row['payments_count'])
+
+    fixed = 0
+    for rollup in PaymentRollup.objects.filter(month__gte=start.date()):
+        field = 'user_id' if rollup.user_id is not None else 'course_id'
+        values = expected.pop((rollup.month, field, getattr(rollup, field)), None)
+        if values is None:
+            rollup.delete()
+            fixed += 1
+        elif values != (rollup.total, rollup.payments_count):
+            rollup.total, rollup.payments_count = values
+            rollup.save(update_fields=['total', 'payments_count', 'updated_at'])
+            fixed += 1
+
+    PaymentRollup.objects.bulk_create(
+        [PaymentRollup(month=month, total=total, payments_count=count, **{field: value})
+         for (month, field, value), (total, count) in expected.items()],
+        ignore_conflicts=True,
+    )
+    return fixed + len(expected)
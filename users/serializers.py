@@ -1,6 +1,14 @@
 from rest_framework import serializers
-from users.models import User, Payment
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from users.authentication import add_user_claims
+from users.entitlements import has_entitlement
+from users.tokens import CachedBlacklistRefreshToken
+from users.models import User, Payment, PaymentRollup
 from materials.models import Course, Lesson  # Нужны для PrimaryKeyRelatedField
+from materials.serializers import CourseCardField
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -11,6 +19,35 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ('id', 'email', 'phone', 'city', 'avatar')
 
 
+class UserTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    Выдача пары токенов с claims пользователя (id, флаги, группы),
+    чтобы аутентификация не обращалась к таблице User на каждый запрос.
+    """
+    token_class = CachedBlacklistRefreshToken
+
+    @classmethod
+    def get_token(cls, user):
+        return add_user_claims(super().get_token(user), user)
+
+
+class UserTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Обновление access-токена с актуальными claims
+    (группы и флаги могли измениться после выдачи refresh-токена).
+    Черный список проверяется через кеш.
+    """
+    token_class = CachedBlacklistRefreshToken
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        access = AccessToken(data['access'])
+        user = User.objects.filter(pk=access[api_settings.USER_ID_CLAIM]).first()
+        if user is not None:
+            data['access'] = str(add_user_claims(access, user))
+        return data
+
+
 class PaymentSerializer(serializers.ModelSerializer):
     """
     (Задание 1) Сериализатор для *просмотра* списка платежей.
@@ -34,12 +71,21 @@ class PaymentSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class PaymentRollupSerializer(serializers.ModelSerializer):
+    """Месячные итоги платежей: заполнено либо поле user, либо поле course."""
+
+    class Meta:
+        model = PaymentRollup
+        fields = ('month', 'user', 'course', 'total', 'payments_count', 'updated_at')
+
+
 class PaymentCreateSerializer(serializers.ModelSerializer):
     """
     (Задание 2) Специальный сериализатор для *создания* платежа.
     Требует только ID курса, остальное генерируется автоматически.
     """
-    course = serializers.PrimaryKeyRelatedField(
+    # Курс берется из кеша карточек: для проверки и оплаты достаточно цены и названия
+    course = CourseCardField(
         queryset=Course.objects.all(),
         required=True,
         write_only=True,
@@ -63,7 +109,7 @@ class PaymentCreateSerializer(serializers.ModelSerializer):
 
         # (Опционально) Проверим, не покупал ли пользователь этот курс ранее
         user = self.context['request'].user
-        if Payment.objects.filter(user=user, course=course, is_paid=True).exists():
+        if has_entitlement(user, course.pk):
             raise serializers.ValidationError("Вы уже приобрели этот курс.")
 
         return course
\ No newline at end of file
@@ -1,65 +1,253 @@
+import hashlib
+import logging
+
+import requests
 import stripe
 from django.conf import settings
+from django.db import IntegrityError, transaction
+from requests.adapters import HTTPAdapter
+
+from core.circuit_breaker import CircuitBreaker, CircuitOpenError
+from users.entitlements import grant_entitlements
+from users.rollups import apply_payment_changes
+from users.models import Payment, StripeCoursePrice, StripeEvent
+
+logger = logging.getLogger(__name__)
 
 # Устанавливаем ключ API Stripe из настроек
 stripe.api_key = settings.STRIPE_SECRET_KEY
+# Адрес API (для локальных тестов можно указать stripe-mock)
+stripe.api_base = settings.STRIPE_API_BASE
+# Повторы при сетевых ошибках и 5xx: экспоненциальная задержка с jitter и
+# Idempotency-Key для POST выполняются самим SDK
+stripe.max_network_retries = settings.STRIPE_MAX_NETWORK_RETRIES
 
-def create_stripe_product(name: str):
+
+def _build_http_client():
     """
-    Создает продукт в Stripe.
-    Продукт - это то, что вы продаете (например, "Курс по Python").
+    Общий HTTP-клиент Stripe на процесс: пул соединений с keep-alive и
+    явные таймауты (connect, read) вместо 80 секунд по умолчанию.
+    Асинхронные вызовы (*_async) идут через httpx, если он установлен.
     """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.STRIPE_HTTP_POOL_SIZE)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
     try:
-        product = stripe.Product.create(name=name)
-        return product
+        import httpx
+        async_client = stripe.HTTPXClient(
+            timeout=httpx.Timeout(settings.STRIPE_READ_TIMEOUT, connect=settings.STRIPE_CONNECT_TIMEOUT)
+        )
+    except ImportError:
+        async_client = None
+
+    return stripe.RequestsClient(
+        timeout=(settings.STRIPE_CONNECT_TIMEOUT, settings.STRIPE_READ_TIMEOUT),
+        session=session,
+        async_fallback_client=async_client,
+    )
+
+
+stripe.default_http_client = _build_http_client()
+
+# Размыкается после серии сетевых ошибок/5xx, чтобы при деградации Stripe
+# не занимать воркеры ожиданием таймаутов
+stripe_breaker = CircuitBreaker(
+    'stripe',
+    failure_threshold=settings.STRIPE_BREAKER_FAILURES,
+    reset_timeout=settings.STRIPE_BREAKER_RESET_TIMEOUT,
+    failure_exceptions=(stripe.APIConnectionError, stripe.APIError, stripe.RateLimitError),
+)
+
+
+def _call_stripe(action: str, func, *args, **kwargs):
+    """Вызов Stripe через предохранитель. При ошибке логирует и возвращает None."""
+    try:
+        return stripe_breaker.call(func, *args, **kwargs)
+    except CircuitOpenError as e:
+        logger.warning(f"Stripe недоступен, пропускаем {action}: {e}")
     except Exception as e:
-        print(f"Ошибка создания продукта Stripe: {e}")
-        return None
+        logger.error(f"Ошибка {action}: {e}")
+    return None
+
+
+async def _acall_stripe(action: str, func, *args, **kwargs):
+    """Асинхронный вариант _call_stripe (для ASGI-представлений)."""
+    try:
+        return await stripe_breaker.acall(func, *args, **kwargs)
+    except CircuitOpenError as e:
+        logger.warning(f"Stripe недоступен, пропускаем {action}: {e}")
+    except Exception as e:
+        logger.error(f"Ошибка {action}: {e}")
+    return None
+
+
+def _session_params(price_id: str):
+    return {
+        'payment_method_types': ['card'],
+        'line_items': [{
+            'price': price_id,
+            'quantity': 1,
+        }],
+        'mode': 'payment',
+        'success_url': settings.STRIPE_SUCCESS_URL,  # URL при успехе
+        'cancel_url': settings.STRIPE_CANCEL_URL,    # URL при отмене
+    }
+
+
+def create_stripe_product(name: str, idempotency_key: str = None):
+    """
+    Создает продукт в Stripe.
+    Продукт - это то, что вы продаете (например, "Курс по Python").
+    """
+    return _call_stripe('создания продукта Stripe', stripe.Product.create, name=name,
+                        idempotency_key=idempotency_key)
+
 
-def create_stripe_price(product_id: str, amount: int, currency: str = 'rub'):
+def create_stripe_price(product_id: str, amount: int, currency: str = 'rub', idempotency_key: str = None):
     """
     Создает цену для продукта в Stripe.
     'amount' должен быть в копейках (int).
     """
-    try:
-        price = stripe.Price.create(
-            product=product_id,
-            unit_amount=amount, # Сумма в копейках
-            currency=currency,
-        )
-        return price
-    except Exception as e:
-        print(f"Ошибка создания цены Stripe: {e}")
-        return None
+    return _call_stripe('создания цены Stripe', stripe.Price.create,
+                        product=product_id, unit_amount=amount, currency=currency, idempotency_key=idempotency_key)
+
 
 def create_stripe_session(price_id: str):
     """
     Создает сессию Checkout в Stripe для получения ссылки на оплату.
     """
-    try:
-        session = stripe.checkout.Session.create(
-            payment_method_types=['card'],
-            line_items=[{
-                'price': price_id,
-                'quantity': 1,
-            }],
-            mode='payment',
-            success_url=settings.STRIPE_SUCCESS_URL, # URL при успехе
-            cancel_url=settings.STRIPE_CANCEL_URL,   # URL при отмене
-        )
-        return session
-    except Exception as e:
-        print(f"Ошибка создания сессии Stripe: {e}")
-        return None
+    return _call_stripe('создания сессии Stripe', stripe.checkout.Session.create, **_session_params(price_id))
+
 
 def retrieve_stripe_session(session_id: str):
     """
     (Дополнительное задание)
     Получает информацию о сессии Stripe для проверки статуса оплаты.
     """
-    try:
-        session = stripe.checkout.Session.retrieve(session_id)
-        return session
-    except Exception as e:
-        print(f"Ошибка получения сессии Stripe: {e}")
-        return None
\ No newline at end of file
+    return _call_stripe('получения сессии Stripe', stripe.checkout.Session.retrieve, session_id)
+
+
+async def acreate_stripe_price(product_id: str, amount: int, currency: str = 'rub'):
+    return await _acall_stripe('создания цены Stripe', stripe.Price.create_async,
+                               product=product_id, unit_amount=amount, currency=currency)
+
+
+async def acreate_stripe_product(name: str):
+    return await _acall_stripe('создания продукта Stripe', stripe.Product.create_async, name=name)
+
+
+async def acreate_stripe_session(price_id: str):
+    return await _acall_stripe('создания сессии Stripe', stripe.checkout.Session.create_async,
+                               **_session_params(price_id))
+
+
+async def aretrieve_stripe_session(session_id: str):
+    return await _acall_stripe('получения сессии Stripe', stripe.checkout.Session.retrieve_async, session_id)
+
+
+def get_course_stripe_price(course, currency: str = 'rub'):
+    """
+    Возвращает ID цены Stripe для курса, создавая продукт и цену только при необходимости:
+    - продукт создается один раз на курс;
+    - новая цена создается, только если изменилась Course.price.
+    Возвращает None, если Stripe не ответил.
+
+    Вызовы Stripe идут без блокировок в БД. Дубликаты при параллельных покупках
+    (и брошенный продукт, если цена не создалась) исключают ключи идемпотентности
+    из курса, названия и суммы: повтор в течение суток вернет тот же объект Stripe.
+    Запись сопоставления условная: побеждает первый, остальные берут его цену.
+    """
+    mapping = StripeCoursePrice.objects.filter(course=course).first()
+    if mapping and mapping.amount == course.price and mapping.currency == currency:
+        return mapping.price_id
+
+    if mapping:
+        product_id = mapping.product_id
+    else:
+        name_hash = hashlib.sha256(course.title.encode()).hexdigest()[:16]
+        product = create_stripe_product(name=course.title, idempotency_key=f'course-{course.pk}-product-{name_hash}')
+        if not product:
+            return None
+        product_id = product.id
+
+    amount = int(course.price * 100)
+    price = create_stripe_price(product_id=product_id, amount=amount, currency=currency,
+                                idempotency_key=f'course-{course.pk}-price-{product_id}-{amount}-{currency}')
+    if not price:
+        return None
+
+    values = {'product_id': product_id, 'price_id': price.id, 'amount': course.price, 'currency': currency}
+    if mapping:
+        # Только если сопоставление не изменил параллельный вызов
+        saved = StripeCoursePrice.objects.filter(pk=mapping.pk, price_id=mapping.price_id).update(**values)
+    else:
+        try:
+            with transaction.atomic():
+                StripeCoursePrice.objects.create(course=course, **values)
+            saved = True
+        except IntegrityError:
+            saved = False
+    if not saved:
+        current = StripeCoursePrice.objects.filter(course=course).first()
+        if current and current.amount == course.price and current.currency == currency:
+            return current.price_id
+    return price.id
+
+
+def mark_payments_paid(session_ids):
+    """
+    Отмечает оплаченными неоплаченные платежи с указанными сессиями Stripe.
+    Покупателям оплаченных курсов выдается доступ (CourseEntitlement),
+    к месячным итогам (PaymentRollup) прибавляются суммы платежей.
+    Строки платежей блокируются, поэтому параллельный вызов для тех же сессий
+    ничего не учтет второй раз. Возвращает число обновленных платежей.
+    """
+    unpaid = Payment.objects.filter(stripe_session_id__in=session_ids, is_paid=False)
+    with transaction.atomic():
+        payments = list(unpaid.select_for_update().values_list('user_id', 'course_id', 'payment_date', 'amount'))
+        if not payments:
+            return 0
+        count = unpaid.update(is_paid=True)
+        grant_entitlements((user_id, course_id) for user_id, course_id, _, _ in payments)
+        apply_payment_changes((*payment, 1) for payment in payments)
+    return count
+
+
+def list_paid_stripe_sessions(created_since):
+    """
+    Возвращает множество ID оплаченных сессий Checkout, созданных после created_since.
+    Сессии запрашиваются страницами по 100 (list), а не по одной (retrieve).
+    None — если Stripe недоступен.
+    """
+    def fetch():
+        sessions = stripe.checkout.Session.list(
+            created={'gte': int(created_since.timestamp())}, status='complete', limit=100
+        )
+        return {session.id for session in sessions.auto_paging_iter() if session.payment_status == 'paid'}
+
+    return _call_stripe('получения списка сессий Stripe', fetch)
+
+
+# События, после которых сессия Checkout может оказаться оплаченной
+PAID_SESSION_EVENTS = ('checkout.session.completed', 'checkout.session.async_payment_succeeded')
+
+
+def handle_stripe_event(event):
+    """
+    Обрабатывает событие вебхука Stripe ровно один раз (по event.id).
+    Возвращает False, если событие уже было обработано.
+    Запись о событии и изменения платежей коммитятся вместе: если обработка упала,
+    Stripe повторит доставку и событие обработается заново.
+    """
+    with transaction.atomic():
+        _, created = StripeEvent.objects.get_or_create(event_id=event.id, defaults={'type': event.type})
+        if not created:
+            return False
+
+        if event.type in PAID_SESSION_EVENTS:
+            session = event.data.object
+            if getattr(session, 'payment_status', None) == 'paid':
+                mark_payments_paid([session.id])
+    return True
@@ -0,0 +1,94 @@
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from users.authentication import auth_state_cache_key
+from users.entitlements import grant_entitlements
+from users.models import Payment, User, user_groups_cache
+from users.rollups import apply_payment_changes
+from users.tokens import cache_blacklisted
+
+
+@receiver(post_save, sender=User)
+def invalidate_auth_state(sender, instance, **kwargs):
+    """Сбрасывает кеш флагов пользователя, чтобы блокировка применялась сразу."""
+    cache.delete(auth_state_cache_key(instance.pk))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def reset_user_groups(sender, instance, created=False, **kwargs):
+    """
+    Сбрасывает группы созданного или удаленного пользователя: в кеше могли остаться
+    группы прежнего пользователя с тем же id (SQLite переиспользует id).
+    """
+    if created or kwargs['signal'] is post_delete:
+        user_groups_cache.delete(instance.pk)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_user_groups(sender, instance, action, reverse, pk_set, **kwargs):
+    """Сбрасывает кеш групп пользователей, чьи группы изменились (с любой стороны связи)."""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        user_groups_cache.delete(instance.pk)
+    elif action == 'pre_clear':
+        user_groups_cache.delete_many(instance.user_set.values_list('pk', flat=True))
+    else:
+        user_groups_cache.delete_many(pk_set)
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def invalidate_group_members(sender, instance, **kwargs):
+    """Переименование или удаление группы меняет группы всех ее участников."""
+    user_groups_cache.delete_many(instance.user_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def cache_blacklisted_token(sender, instance, **kwargs):
+    """Кладет заблокированный токен в кеш черного списка (write-through)."""
+    cache_blacklisted(instance.token.jti, instance.token.expires_at)
+
+
+@receiver(post_save, sender=Payment)
+def grant_course_entitlement(sender, instance, **kwargs):
+    """Выдает доступ к курсу, если платеж сохранен оплаченным (например, из админки)."""
+    if instance.is_paid and instance.course_id:
+        grant_entitlements([(instance.user_id, instance.course_id)])
+
+
+def _rollup_entry(payment):
+    return payment.user_id, payment.course_id, payment.payment_date, payment.amount
+
+
+@receiver(pre_save, sender=Payment)
+def remember_paid_payment(sender, instance, **kwargs):
+    """Запоминает, каким платеж входил в итоги до сохранения (None — не входил)."""
+    instance._rollup_before = None
+    if not instance._state.adding:
+        instance._rollup_before = Payment.objects.filter(pk=instance.pk, is_paid=True).values_list(
+            'user_id', 'course_id', 'payment_date', 'amount').first()
+
+
+@receiver(post_save, sender=Payment)
+def update_rollups_on_save(sender, instance, **kwargs):
+    """
+    Меняет месячные итоги на разницу между прежним и новым состоянием платежа
+    (оплату могли снять, поменять сумму или курс).
+    """
+    changes = []
+    if getattr(instance, '_rollup_before', None):
+        changes.append((*instance._rollup_before, -1))
+    if instance.is_paid:
+        changes.append((*_rollup_entry(instance), 1))
+    apply_payment_changes(changes)
+
+
+@receiver(post_delete, sender=Payment)
+def update_rollups_on_delete(sender, instance, **kwargs):
+    if instance.is_paid:
+        apply_payment_changes([(*_rollup_entry(instance), -1)])
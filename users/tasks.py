@@ -1,34 +1,211 @@
 from celery import shared_task
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.functions import Coalesce
 from django.utils import timezone
-from datetime import timedelta
+from datetime import datetime, timedelta
 import logging
+import time
+
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+from core.metrics import emit
+from users.activity import flush_activity
+from users.authentication import auth_state_cache_key
+from users.models import IdempotencyKey, Payment
+from users.partitions import ensure_partitions, is_partitioned
+from users.rollups import reconcile_payment_rollups
+from users.services import list_paid_stripe_sessions, mark_payments_paid
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
+BLOCK_INACTIVE_PROGRESS_KEY = 'users:block_inactive:progress'
+BLOCK_INACTIVE_PROGRESS_TTL = 60 * 60 * 24
+
+
+def _inactive_users(cutoff_date):
+    """
+    Пользователи, которые:
+    1. Активны (is_active=True)
+    2. Не являются суперпользователями (is_superuser=False)
+    3. Были активны последний раз *раньше*, чем cutoff_date (т.е. более 30 дней назад).
+       При входе по JWT last_login не обновляется, поэтому смотрим сначала на last_activity.
+    """
+    return User.objects.annotate(
+        last_seen=Coalesce('last_activity', 'last_login')
+    ).filter(
+        is_active=True,
+        is_superuser=False,
+        last_seen__lt=cutoff_date
+    )
+
 
 @shared_task
-def block_inactive_users():
+def block_inactive_users(batch_size=None, pause=None, dry_run=False):
     """
     Блокирует пользователей, которые не заходили более 1 месяца (30 дней).
+
+    Кандидаты обходятся по возрастанию PK пачками по batch_size, каждая пачка —
+    отдельная короткая транзакция, между пачками пауза pause секунд, чтобы не
+    держать блокировки строк и не мешать логинам. Прогресс сохраняется в кеше,
+    прерванный запуск продолжается с последней обработанной пачки.
+    В режиме dry_run ничего не изменяется, только считается число кандидатов.
     """
-    # Определяем дату, ранее которой пользователи считаются неактивными
-    cutoff_date = timezone.now() - timedelta(days=30)
+    batch_size = batch_size or settings.BLOCK_INACTIVE_USERS_BATCH_SIZE
+    pause = settings.BLOCK_INACTIVE_USERS_PAUSE if pause is None else pause
 
-    # Находим пользователей, которые:
-    # 1. Активны (is_active=True)
-    # 2. Не являются суперпользователями (is_superuser=False)
-    # 3. Заходили последний раз *раньше*, чем cutoff_date (т.е. более 30 дней назад)
+    if dry_run:
+        cutoff_date = timezone.now() - timedelta(days=30)
+        count = _inactive_users(cutoff_date).count()
+        logger.info(f"[dry-run] Будет заблокировано {count} пользователей (последний вход до {cutoff_date.date()}).")
+        return f"Would block {count} inactive users."
 
-    users_to_block = User.objects.filter(
-        is_active=True,
-        is_superuser=False,
-        last_login__lt=cutoff_date
-    )
+    progress = cache.get(BLOCK_INACTIVE_PROGRESS_KEY)
+    if progress:
+        # Продолжаем прерванный запуск с тем же порогом, чтобы набор кандидатов не поменялся
+        cutoff_date = datetime.fromisoformat(progress['cutoff'])
+        logger.info(f"Продолжаем блокировку неактивных пользователей с PK > {progress['last_pk']}.")
+    else:
+        cutoff_date = timezone.now() - timedelta(days=30)
+        progress = {'cutoff': cutoff_date.isoformat(), 'last_pk': 0, 'blocked': 0, 'batches': 0}
 
-    # Блокируем их
-    count = users_to_block.update(is_active=False)
+    candidates = _inactive_users(cutoff_date)
+    while True:
+        ids = list(
+            candidates.filter(pk__gt=progress['last_pk'])
+            .order_by('pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+
+        with transaction.atomic():
+            # Условия проверяются повторно: пользователь мог войти, пока шла выборка
+            count = candidates.filter(pk__in=ids).update(is_active=False)
+        cache.delete_many([auth_state_cache_key(pk) for pk in ids])
+
+        progress['last_pk'] = ids[-1]
+        progress['blocked'] += count
+        progress['batches'] += 1
+        cache.set(BLOCK_INACTIVE_PROGRESS_KEY, progress, BLOCK_INACTIVE_PROGRESS_TTL)
+        logger.info(f"Пачка {progress['batches']}: заблокировано {count}, всего {progress['blocked']}, "
+                    f"последний PK {progress['last_pk']}.")
+
+        if len(ids) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+
+    cache.delete(BLOCK_INACTIVE_PROGRESS_KEY)
+    count = progress['blocked']
+    emit('users.block_inactive.blocked', count, batches=progress['batches'])
 
     logger.info(f"Заблокировано {count} пользователей из-за неактивности (последний вход до {cutoff_date.date()}).")
-    return f"Blocked {count} inactive users."
\ No newline at end of file
+    return f"Blocked {count} inactive users."
+
+
+@shared_task
+def flush_user_activity():
+    """
+    Сбрасывает накопленные в Redis отметки активности в User.last_activity.
+    """
+    count = flush_activity(batch_size=settings.ACTIVITY_FLUSH_BATCH_SIZE)
+    logger.info(f"Обновлена последняя активность {count} пользователей.")
+    return f"Flushed activity for {count} users."
+
+
+@shared_task
+def prune_expired_tokens(batch_size=None):
+    """
+    Удаляет истекшие токены из OutstandingToken (и каскадно из BlacklistedToken)
+    небольшими пачками, чтобы не держать долгую транзакцию и блокировки.
+    Токены выдаются по возрастанию id, поэтому истекшие лежат в начале индекса PK.
+    """
+    batch_size = batch_size or settings.TOKEN_PRUNE_BATCH_SIZE
+    now = timezone.now()
+    deleted = 0
+
+    while True:
+        ids = list(
+            OutstandingToken.objects.filter(expires_at__lte=now)
+            .order_by('id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        OutstandingToken.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+
+    logger.info(f"Удалено {deleted} истекших токенов (пачками по {batch_size}).")
+    return f"Pruned {deleted} expired tokens."
+
+
+@shared_task
+def reconcile_unpaid_payments():
+    """
+    Сверяет неоплаченные платежи со Stripe (на случай потерянного вебхука).
+    Берутся платежи с stripe_session_id за последние PAYMENT_RECONCILE_LOOKBACK,
+    оплаченные сессии запрашиваются у Stripe списком, найденные платежи
+    отмечаются оплаченными одним UPDATE.
+    """
+    started = time.perf_counter()
+    since = timezone.now() - settings.PAYMENT_RECONCILE_LOOKBACK
+
+    unpaid = set(
+        Payment.objects.filter(is_paid=False, stripe_session_id__isnull=False, payment_date__gte=since)
+        .values_list('stripe_session_id', flat=True)
+    )
+    reconciled = 0
+    if unpaid:
+        paid_sessions = list_paid_stripe_sessions(created_since=since)
+        if paid_sessions is None:
+            logger.warning("Сверка платежей пропущена: Stripe недоступен.")
+            return "Stripe unavailable."
+        reconciled = mark_payments_paid(unpaid & paid_sessions)
+
+    duration = time.perf_counter() - started
+    emit('payments.reconcile.checked', len(unpaid))
+    emit('payments.reconcile.reconciled', reconciled)
+    emit('payments.reconcile.duration_seconds', round(duration, 3))
+
+    logger.info(f"Сверено {len(unpaid)} неоплаченных платежей, оплачено {reconciled} ({duration:.2f} с).")
+    return f"Reconciled {reconciled} of {len(unpaid)} unpaid payments."
+
+
+@shared_task
+def reconcile_rollups():
+    """
+    Сверяет месячные итоги платежей за последние PAYMENT_ROLLUP_RECONCILE_DAYS дней
+    с таблицей Payment и исправляет расхождения (например, после ручных правок в БД).
+    """
+    fixed = reconcile_payment_rollups(timezone.now() - timedelta(days=settings.PAYMENT_ROLLUP_RECONCILE_DAYS))
+    emit('payments.rollups.fixed', fixed)
+    if fixed:
+        logger.warning(f"Исправлено расходящихся месячных итогов платежей: {fixed}.")
+    return f"Fixed {fixed} payment rollups."
+
+
+@shared_task
+def prune_idempotency_keys():
+    """
+    Удаляет ключи идемпотентности старше IDEMPOTENCY_KEY_TTL.
+    """
+    cutoff = timezone.now() - settings.IDEMPOTENCY_KEY_TTL
+    count, _ = IdempotencyKey.objects.filter(created_at__lt=cutoff).delete()
+    logger.info(f"Удалено {count} устаревших ключей идемпотентности.")
+    return f"Pruned {count} idempotency keys."
+
+
+@shared_task
+def create_payment_partitions():
+    """
+    Заранее создает месячные секции таблицы платежей (PAYMENT_PARTITIONS_AHEAD месяцев вперед),
+    чтобы новые платежи не попадали в секцию по умолчанию.
+    """
+    if not is_partitioned():
+        return "Payment table is not partitioned."
+    created = ensure_partitions(settings.PAYMENT_PARTITIONS_AHEAD)
+    return f"Created {len(created)} payment partitions."
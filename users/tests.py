@@ -1,8 +1,57 @@
-from rest_framework.test import APITestCase
+import asyncio
+import gzip
+import hashlib
+import hmac
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from types import SimpleNamespace
+from unittest import skipIf, skipUnless
+from unittest.mock import patch
+
+import stripe
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
 from rest_framework import status
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.utils import timezone
+from datetime import datetime, timedelta, timezone as dt_timezone
 from materials.models import Course, Lesson
-from users.models import Payment
+from users.models import (
+    CourseEntitlement, IdempotencyKey, Payment, PaymentRollup, StripeCoursePrice, StripeEvent,
+)
+from users.entitlements import entitlements_cache_key, grant_entitlements
+from users.paginators import PaymentCursorPagination
+from users.serializers import PaymentSerializer
+from users.activity import save_last_activity
+from users.authentication import auth_state_cache_key, get_auth_state
+from users.partitions import add_months, create_partition, is_partitioned, list_partitions, partition_name
+from users.tasks import (
+    BLOCK_INACTIVE_PROGRESS_KEY, block_inactive_users, create_payment_partitions, prune_expired_tokens,
+    reconcile_rollups, reconcile_unpaid_payments,
+)
+from core.circuit_breaker import CircuitBreaker
+from core.renderers import ORJSONRenderer
+from users.services import (
+    acreate_stripe_session, create_stripe_session, get_course_stripe_price, mark_payments_paid,
+)
+from users.tokens import CachedBlacklistRefreshToken
+from users.views import PaymentListAPIView
+from users.warmup import warm_auth_states
 from django.urls import reverse
 
 User = get_user_model()
@@ -202,7 +251,7 @@ class PaymentsTests(APITestCase):
         url = reverse('users:payment-list')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)  # 2 платежа из setUp
+        self.assertEqual(len(response.data['results']), 2)  # 2 платежа из setUp
 
     def test_list_payments_unauthenticated(self):
         """
@@ -220,8 +269,8 @@ class PaymentsTests(APITestCase):
         url = reverse('users:payment-list')
         response = self.client.get(url, {'course': self.course.pk})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['course'], self.course.pk)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['course'], self.course.pk)
 
     def test_filter_payments_by_lesson(self):
         """
@@ -231,8 +280,8 @@ class PaymentsTests(APITestCase):
         url = reverse('users:payment-list')
         response = self.client.get(url, {'lesson': self.lesson.pk})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['lesson'], self.lesson.pk)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['lesson'], self.lesson.pk)
 
     def test_filter_payments_by_payment_method(self):
         """
@@ -242,8 +291,8 @@ class PaymentsTests(APITestCase):
         url = reverse('users:payment-list')
         response = self.client.get(url, {'payment_method': 'cash'})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['payment_method'], 'cash')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['payment_method'], 'cash')
 
     def test_order_payments_by_date(self):
         """
@@ -253,6 +302,787 @@ class PaymentsTests(APITestCase):
         url = reverse('users:payment-list')
         response = self.client.get(url, {'ordering': '-payment_date'})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
+        self.assertEqual(len(response.data['results']), 2)
         # Проверяем, что платежи отсортированы по убыванию даты
-        self.assertTrue(response.data[0]['payment_date'] >= response.data[1]['payment_date'])
\ No newline at end of file
+        self.assertTrue(response.data['results'][0]['payment_date'] >= response.data['results'][1]['payment_date'])
+
+    def test_list_payments_cursor_pagination(self):
+        """
+        Тест курсорной пагинации: страницы идут по убыванию даты без повторов
+        """
+        for _ in range(3):
+            Payment.objects.create(user=self.user, course=self.course, amount=10, payment_method='cash')
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.get(reverse('users:payment-list'), {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ids = [payment['id'] for payment in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            ids.extend(payment['id'] for payment in response.data['results'])
+
+        expected = list(Payment.objects.filter(user=self.user).order_by('-payment_date', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_ordering_by_date_pages_through_equal_dates(self):
+        """
+        Тест: при ?ordering=payment_date платежи с одной датой не теряются и не повторяются между страницами
+        """
+        for _ in range(4):
+            Payment.objects.create(user=self.user, course=self.course, amount=10, payment_method='cash')
+        Payment.objects.filter(user=self.user).update(payment_date=timezone.now())
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.get(reverse('users:payment-list'), {'page_size': 2, 'ordering': 'payment_date'})
+        ids = [payment['id'] for payment in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            ids.extend(payment['id'] for payment in response.data['results'])
+
+        self.assertEqual(ids, sorted(Payment.objects.filter(user=self.user).values_list('id', flat=True)))
+        view = PaymentListAPIView()
+        request = Request(APIRequestFactory().get('/', {'ordering': 'payment_date'}))
+        self.assertEqual(PaymentCursorPagination().get_ordering(request, Payment.objects.all(), view),
+                         ('payment_date', 'id'))
+
+    def test_list_payments_matches_serializer(self):
+        """
+        Тест быстрого списка (values()): ответ байт в байт совпадает с PaymentSerializer
+        """
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse('users:payment-list'))
+
+        payments = Payment.objects.filter(user=self.user).order_by('-payment_date', '-id')
+        expected = PaymentSerializer(payments, many=True, context={'request': response.wsgi_request}).data
+        self.assertEqual(ORJSONRenderer().render(response.data['results']), ORJSONRenderer().render(expected))
+
+
+class StatelessJWTAuthenticationTests(APITestCase):
+    def setUp(self):
+        """
+        Пользователь-модератор и токен, выданный через TokenObtainPairView.
+        """
+        self.user = User.objects.create_user(email='jwt@test.com', password='testpass123')
+        self.user.groups.create(name='moderators')
+        response = self.client.post(reverse('users:token_obtain_pair'),
+                                    {'email': 'jwt@test.com', 'password': 'testpass123'}, format='json')
+        self.access = response.data['access']
+
+    def test_token_contains_user_claims(self):
+        """
+        Тест наличия флагов и групп пользователя в токене
+        """
+        token = AccessToken(self.access)
+        self.assertEqual(token['email'], self.user.email)
+        self.assertTrue(token['is_active'])
+        self.assertEqual(token['groups'], ['moderators'])
+
+    def test_authentication_does_not_fetch_user_row(self):
+        """
+        Тест аутентификации без запроса к таблице пользователей (флаги берутся из кеша)
+        """
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access}')
+        self.client.get(reverse('users:payment-list'))  # прогреваем кеш флагов
+
+        with self.assertNumQueries(1):  # только выборка платежей
+            response = self.client.get(reverse('users:payment-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_deactivated_user_is_rejected(self):
+        """
+        Тест отказа в доступе заблокированному пользователю с действующим токеном
+        """
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access}')
+        self.client.get(reverse('users:payment-list'))
+
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(reverse('users:payment-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_warmup_counts_written_states(self):
+        """
+        Тест прогрева флагов: в отчет попадают только записанные в кеш значения
+        """
+        other = User.objects.create_user(email='jwt-other@test.com', password='testpass123')
+        other.groups.add(self.user.groups.get())
+        cache.delete_many([auth_state_cache_key(self.user.pk), auth_state_cache_key(other.pk)])
+        get_auth_state(self.user.pk)
+
+        self.assertEqual(warm_auth_states(), 1)
+        self.assertEqual(cache.get(auth_state_cache_key(other.pk))['is_active'], True)
+        self.assertEqual(warm_auth_states(), 0)
+
+
+class UserGroupsCacheTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='groups@test.com', password='testpass123')
+        self.group = Group.objects.create(name='moderators')
+
+    def fresh_group_names(self):
+        return User.objects.get(pk=self.user.pk).group_names
+
+    def test_group_names_are_cached(self):
+        """
+        Тест кеширования групп: повторное чтение не обращается к БД
+        """
+        self.assertEqual(self.fresh_group_names(), frozenset())
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(user.group_names, frozenset())
+
+    def test_cache_is_reset_on_group_changes(self):
+        """
+        Тест сброса кеша при изменении групп с обеих сторон связи и переименовании группы
+        """
+        self.assertFalse(self.fresh_group_names())
+        self.user.groups.add(self.group)
+        self.assertEqual(self.fresh_group_names(), {'moderators'})
+        self.group.name = 'reviewers'
+        self.group.save()
+        self.assertEqual(self.fresh_group_names(), {'reviewers'})
+        self.group.user_set.clear()
+        self.assertEqual(self.fresh_group_names(), frozenset())
+
+
+class TokenBlacklistTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='blacklist@test.com', password='testpass123')
+        response = self.client.post(reverse('users:token_obtain_pair'),
+                                    {'email': 'blacklist@test.com', 'password': 'testpass123'}, format='json')
+        self.refresh = response.data['refresh']
+
+    def test_blacklisted_token_is_checked_via_cache(self):
+        """
+        Тест проверки черного списка без запросов к БД после блокировки токена
+        """
+        CachedBlacklistRefreshToken(self.refresh).blacklist()
+
+        with self.assertNumQueries(0):
+            with self.assertRaises(TokenError):
+                CachedBlacklistRefreshToken(self.refresh)
+
+        response = self.client.post(reverse('users:token_refresh'), {'refresh': self.refresh}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_prune_expired_tokens(self):
+        """
+        Тест удаления истекших токенов пачками (вместе с записями черного списка)
+        """
+        expired = timezone.now() - timedelta(days=1)
+        for i in range(5):
+            token = OutstandingToken.objects.create(user=self.user, jti=f'expired-{i}', token='t', expires_at=expired)
+            BlacklistedToken.objects.create(token=token)
+
+        prune_expired_tokens(batch_size=2)
+
+        self.assertFalse(OutstandingToken.objects.filter(expires_at__lte=timezone.now()).exists())
+        self.assertEqual(BlacklistedToken.objects.count(), 0)
+        self.assertEqual(OutstandingToken.objects.count(), 1)  # действующий токен из setUp
+
+
+class InactiveUsersTests(APITestCase):
+    def setUp(self):
+        old = timezone.now() - timedelta(days=60)
+        self.active_by_jwt = User.objects.create_user(email='jwt-active@test.com', password='x', last_login=old)
+        self.inactive = User.objects.create_user(email='inactive@test.com', password='x', last_login=old)
+
+    def test_block_inactive_users_uses_last_activity(self):
+        """
+        Тест: пользователь, активный по JWT (last_activity из Redis), не блокируется
+        """
+        save_last_activity({self.active_by_jwt.pk: int(timezone.now().timestamp())}, batch_size=100)
+
+        block_inactive_users()
+
+        self.active_by_jwt.refresh_from_db()
+        self.inactive.refresh_from_db()
+        self.assertTrue(self.active_by_jwt.is_active)
+        self.assertFalse(self.inactive.is_active)
+
+    def test_block_inactive_users_dry_run(self):
+        """
+        Тест режима dry-run: считает кандидатов, но никого не блокирует
+        """
+        result = block_inactive_users(dry_run=True)
+
+        self.assertEqual(result, 'Would block 2 inactive users.')
+        self.assertEqual(User.objects.filter(is_active=False).count(), 0)
+
+    def test_block_inactive_users_in_batches(self):
+        """
+        Тест блокировки пачками: все кандидаты обработаны, прогресс очищен
+        """
+        old = timezone.now() - timedelta(days=60)
+        for i in range(3):
+            User.objects.create_user(email=f'old{i}@test.com', password='x', last_login=old)
+
+        result = block_inactive_users(batch_size=2, pause=0)
+
+        self.assertEqual(result, 'Blocked 5 inactive users.')
+        self.assertFalse(User.objects.filter(is_active=True).exists())
+        self.assertIsNone(cache.get(BLOCK_INACTIVE_PROGRESS_KEY))
+
+
+class StripeCoursePriceTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='buyer@test.com', password='x')
+        self.course = Course.objects.create(title='Paid Course', owner=self.user, price=1000)
+
+    @patch('users.services.create_stripe_price')
+    @patch('users.services.create_stripe_product')
+    def test_product_and_price_are_reused(self, create_product, create_price):
+        """
+        Тест: продукт создается один раз, новая цена — только при изменении Course.price
+        """
+        create_product.return_value = SimpleNamespace(id='prod_1')
+        create_price.side_effect = [SimpleNamespace(id='price_1'), SimpleNamespace(id='price_2')]
+
+        self.assertEqual(get_course_stripe_price(self.course), 'price_1')
+        self.assertEqual(get_course_stripe_price(self.course), 'price_1')
+        self.assertEqual(create_product.call_count, 1)
+        self.assertEqual(create_price.call_count, 1)
+
+        self.course.price = 1500
+        self.course.save()
+        self.assertEqual(get_course_stripe_price(self.course), 'price_2')
+        self.assertEqual(create_product.call_count, 1)
+        create_price.assert_called_with(product_id='prod_1', amount=150000, currency='rub',
+                                        idempotency_key=f'course-{self.course.pk}-price-prod_1-150000-rub')
+
+    @patch('users.services.create_stripe_price')
+    @patch('users.services.create_stripe_product')
+    def test_concurrent_price_change_keeps_first_mapping(self, create_product, create_price):
+        """
+        Тест: Stripe вызывается без блокировки курса, а сопоставление перезаписывается,
+        только если его не успел изменить параллельный вызов
+        """
+        create_product.return_value = SimpleNamespace(id='prod_1')
+        create_price.return_value = SimpleNamespace(id='price_1')
+        get_course_stripe_price(self.course)
+        self.assertTrue(create_product.call_args.kwargs['idempotency_key'].startswith(f'course-{self.course.pk}-product-'))
+
+        self.course.price = 1500
+        self.course.save()
+
+        outer_blocks = len(connection.atomic_blocks)
+
+        def concurrent_price(**kwargs):
+            # Stripe вызывается вне транзакции; пока ждем ответа, параллельная покупка сохранила новую цену
+            self.assertEqual(len(connection.atomic_blocks), outer_blocks)
+            StripeCoursePrice.objects.filter(course=self.course).update(price_id='price_other', amount=1500)
+            return SimpleNamespace(id='price_2')
+
+        create_price.side_effect = concurrent_price
+        self.assertEqual(get_course_stripe_price(self.course), 'price_other')
+        self.assertEqual(StripeCoursePrice.objects.get(course=self.course).price_id, 'price_other')
+
+
+class _StripeMockHandler(BaseHTTPRequestHandler):
+    """Минимальная замена stripe-mock: отвечает статусом и телом из атрибутов сервера."""
+
+    def do_POST(self):
+        self.server.hits += 1
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        body = json.dumps(self.server.body).encode()
+        self.send_response(self.server.status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StripeClientTests(APITestCase):
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), _StripeMockHandler)
+        self.server.hits = 0
+        self.server.status = 200
+        self.server.body = {'id': 'cs_test_1', 'object': 'checkout.session', 'url': 'https://checkout.test/1'}
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.shutdown)
+
+        patchers = [
+            patch('stripe.api_base', f'http://127.0.0.1:{self.server.server_port}'),
+            patch('stripe.max_network_retries', 0),
+            patch('users.services.stripe_breaker', CircuitBreaker(
+                'stripe-test', failure_threshold=2, reset_timeout=60,
+                failure_exceptions=(stripe.APIConnectionError, stripe.APIError),
+            )),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_sync_and_async_session_create(self):
+        """
+        Тест создания сессии через общий HTTP-клиент (sync и async)
+        """
+        self.assertEqual(create_stripe_session('price_1').url, 'https://checkout.test/1')
+        self.assertEqual(asyncio.run(acreate_stripe_session('price_1')).id, 'cs_test_1')
+
+    def test_breaker_fails_fast_when_stripe_is_down(self):
+        """
+        Тест: после серии 5xx запросы к Stripe не отправляются
+        """
+        self.server.status = 500
+        self.server.body = {'error': {'message': 'down', 'type': 'api_error'}}
+
+        for _ in range(4):
+            self.assertIsNone(create_stripe_session('price_1'))
+
+        self.assertEqual(self.server.hits, 2)
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET='whsec_test')
+class StripeWebhookTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='payer@test.com', password='x')
+        self.payment = Payment.objects.create(user=self.user, amount=100, payment_method='transfer',
+                                              stripe_session_id='cs_test_42')
+
+    def _post_event(self, event, secret='whsec_test'):
+        payload = json.dumps(event)
+        timestamp = int(time.time())
+        signature = hmac.new(secret.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+        return self.client.generic('POST', reverse('users:payment-webhook'), payload,
+                                   content_type='application/json',
+                                   HTTP_STRIPE_SIGNATURE=f't={timestamp},v1={signature}')
+
+    def _completed_event(self):
+        return {
+            'id': 'evt_1', 'object': 'event', 'type': 'checkout.session.completed',
+            'data': {'object': {'id': 'cs_test_42', 'object': 'checkout.session', 'payment_status': 'paid'}},
+        }
+
+    def test_webhook_marks_payment_paid_once(self):
+        """
+        Тест вебхука: платеж отмечается оплаченным, повтор события игнорируется
+        """
+        response = self._post_event(self._completed_event())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'processed')
+        self.payment.refresh_from_db()
+        self.assertTrue(self.payment.is_paid)
+
+        response = self._post_event(self._completed_event())
+        self.assertEqual(response.data['status'], 'duplicate')
+        self.assertEqual(StripeEvent.objects.count(), 1)
+
+    def test_webhook_rejects_bad_signature(self):
+        """
+        Тест вебхука с неверной подписью
+        """
+        response = self._post_event(self._completed_event(), secret='whsec_wrong')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.payment.refresh_from_db()
+        self.assertFalse(self.payment.is_paid)
+
+    def test_webhook_refused_without_secret(self):
+        """
+        Тест вебхука без настроенного секрета: событие, подписанное пустым ключом, не принимается
+        """
+        with self.settings(STRIPE_WEBHOOK_SECRET=''):
+            response = self._post_event(self._completed_event(), secret='')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.payment.refresh_from_db()
+        self.assertFalse(self.payment.is_paid)
+
+    @patch('users.views.retrieve_stripe_session')
+    def test_status_is_served_from_database(self, retrieve_session):
+        """
+        Тест: свежий неоплаченный платеж не вызывает запрос к Stripe
+        """
+        self.client.force_authenticate(user=self.user)
+        url = reverse('users:payment-retrieve-status', kwargs={'pk': self.payment.pk})
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data['is_paid'])
+        retrieve_session.assert_not_called()
+
+
+class ReconcilePaymentsTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='reconcile@test.com', password='x')
+        self.paid_in_stripe = Payment.objects.create(user=self.user, amount=100, payment_method='transfer',
+                                                     stripe_session_id='cs_paid')
+        self.unpaid_in_stripe = Payment.objects.create(user=self.user, amount=100, payment_method='transfer',
+                                                       stripe_session_id='cs_open')
+        self.too_old = Payment.objects.create(user=self.user, amount=100, payment_method='transfer',
+                                              stripe_session_id='cs_old')
+        Payment.objects.filter(pk=self.too_old.pk).update(payment_date=timezone.now() - timedelta(days=30))
+
+    @patch('users.tasks.list_paid_stripe_sessions')
+    def test_reconcile_marks_only_paid_sessions(self, list_paid):
+        """
+        Тест сверки: оплаченные в Stripe платежи из окна сверки отмечаются оплаченными
+        """
+        list_paid.return_value = {'cs_paid', 'cs_old', 'cs_unknown'}
+
+        result = reconcile_unpaid_payments()
+
+        self.assertEqual(result, 'Reconciled 1 of 2 unpaid payments.')
+        self.assertEqual(list_paid.call_count, 1)
+        self.assertEqual(list(Payment.objects.filter(is_paid=True)), [self.paid_in_stripe])
+
+
+class IdempotentPaymentCreateTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='idem@test.com', password='x')
+        self.course = Course.objects.create(title='Paid Course', owner=self.user, price=1000)
+        self.client.force_authenticate(user=self.user)
+
+    @patch('users.views.create_stripe_session')
+    @patch('users.views.get_course_stripe_price')
+    def test_replay_returns_stored_response(self, get_price, create_session):
+        """
+        Тест: повтор с тем же Idempotency-Key не создает второй платеж и сессию Stripe
+        """
+        get_price.return_value = 'price_1'
+        create_session.return_value = SimpleNamespace(id='cs_1', url='https://checkout.test/1')
+        url = reverse('users:payment-create')
+
+        first = self.client.post(url, {'course': self.course.pk}, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+        second = self.client.post(url, {'course': self.course.pk}, format='json', HTTP_IDEMPOTENCY_KEY='key-1')
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Payment.objects.count(), 1)
+        self.assertEqual(create_session.call_count, 1)
+
+    @patch('users.views.create_stripe_session')
+    @patch('users.views.get_course_stripe_price')
+    def test_key_reuse_with_other_body_is_rejected(self, get_price, create_session):
+        """
+        Тест: тот же ключ с другим телом запроса
+        """
+        get_price.return_value = 'price_1'
+        create_session.return_value = SimpleNamespace(id='cs_1', url='https://checkout.test/1')
+        other_course = Course.objects.create(title='Other', owner=self.user, price=500)
+        url = reverse('users:payment-create')
+
+        self.client.post(url, {'course': self.course.pk}, format='json', HTTP_IDEMPOTENCY_KEY='key-2')
+        response = self.client.post(url, {'course': other_course.pk}, format='json', HTTP_IDEMPOTENCY_KEY='key-2')
+
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Payment.objects.count(), 1)
+
+    @patch('users.views.create_stripe_session')
+    @patch('users.views.get_course_stripe_price')
+    def test_abandoned_reservation_is_reclaimed(self, get_price, create_session):
+        """
+        Тест: резерв, брошенный упавшим процессом, не блокирует повтор до истечения ключа
+        """
+        get_price.return_value = 'price_1'
+        create_session.return_value = SimpleNamespace(id='cs_1', url='https://checkout.test/1')
+        request_hash = hashlib.sha256(JSONRenderer().render({'course': self.course.pk})).hexdigest()
+        record = IdempotencyKey.objects.create(user=self.user, key='key-3', request_hash=request_hash)
+        IdempotencyKey.objects.filter(pk=record.pk).update(created_at=timezone.now() - timedelta(minutes=6))
+
+        response = self.client.post(reverse('users:payment-create'), {'course': self.course.pk}, format='json',
+                                    HTTP_IDEMPOTENCY_KEY='key-3')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Payment.objects.count(), 1)
+        self.assertEqual(IdempotencyKey.objects.get(key='key-3').status_code, status.HTTP_201_CREATED)
+
+    @override_settings(IDEMPOTENCY_WAIT_TIMEOUT=0)
+    @patch('users.views.create_stripe_session')
+    @patch('users.views.get_course_stripe_price')
+    def test_slow_request_keeps_reservation(self, get_price, create_session):
+        """
+        Тест: повтор во время долгого (дольше ожидания) первого запроса получает 409, а не второй платеж
+        """
+        create_session.return_value = SimpleNamespace(id='cs_1', url='https://checkout.test/1')
+        url = reverse('users:payment-create')
+        retries = []
+
+        def slow_price(course):
+            # Stripe отвечает долго: клиент успевает повторить запрос
+            IdempotencyKey.objects.filter(key='key-4').update(created_at=timezone.now() - timedelta(seconds=30))
+            retries.append(self.client.post(url, {'course': self.course.pk}, format='json',
+                                            HTTP_IDEMPOTENCY_KEY='key-4'))
+            return 'price_1'
+
+        get_price.side_effect = slow_price
+        response = self.client.post(url, {'course': self.course.pk}, format='json', HTTP_IDEMPOTENCY_KEY='key-4')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retries[0].status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Payment.objects.count(), 1)
+        self.assertEqual(IdempotencyKey.objects.get(key='key-4').status_code, status.HTTP_201_CREATED)
+
+    @override_settings(IDEMPOTENCY_WAIT_TIMEOUT=0)
+    @patch('users.views.create_stripe_session')
+    @patch('users.views.get_course_stripe_price')
+    def test_reclaimed_reservation_is_not_overwritten(self, get_price, create_session):
+        """
+        Тест: если резерв забрали посреди запроса, исходный запрос не падает и не перезаписывает чужой ответ
+        """
+        url = reverse('users:payment-create')
+        sessions = iter([SimpleNamespace(id='cs_retry', url='https://checkout.test/retry'),
+                         SimpleNamespace(id='cs_first', url='https://checkout.test/first')])
+        create_session.side_effect = lambda price_id: next(sessions)
+        retries = []
+        stalled = []
+
+        def stalled_price(course):
+            if not stalled:
+                # Первый запрос завис дольше IDEMPOTENCY_ABANDON_AFTER: повтор забирает резерв
+                stalled.append(True)
+                IdempotencyKey.objects.filter(key='key-5').update(created_at=timezone.now() - timedelta(minutes=6))
+                retries.append(self.client.post(url, {'course': self.course.pk}, format='json',
+                                                HTTP_IDEMPOTENCY_KEY='key-5'))
+            return 'price_1'
+
+        get_price.side_effect = stalled_price
+        with self.assertLogs('users.idempotency', 'WARNING'):
+            response = self.client.post(url, {'course': self.course.pk}, format='json', HTTP_IDEMPOTENCY_KEY='key-5')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retries[0].status_code, status.HTTP_201_CREATED)
+        stored = IdempotencyKey.objects.get(key='key-5')
+        self.assertEqual(stored.response_body, retries[0].json())
+
+
+class CourseEntitlementTests(APITestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(email='author@test.com', password='x')
+        self.buyer = User.objects.create_user(email='buyer@test.com', password='x')
+        self.course = Course.objects.create(title='Paid Course', owner=self.owner, price=1000)
+        self.lesson = Lesson.objects.create(title='Lesson', course=self.course, owner=self.owner,
+                                            video_url='https://youtube.com/watch?v=1')
+        Payment.objects.create(user=self.buyer, course=self.course, amount=1000, payment_method='transfer',
+                               stripe_session_id='cs_buy')
+        self.client.force_authenticate(user=self.buyer)
+
+    def test_paid_payment_grants_lesson_access(self):
+        """
+        Тест: после оплаты покупатель получает доступ к урокам курса и не может купить курс повторно
+        """
+        lesson_url = reverse('materials:lesson-detail', kwargs={'pk': self.lesson.pk})
+        self.assertEqual(self.client.get(lesson_url).status_code, status.HTTP_404_NOT_FOUND)
+
+        self.assertEqual(mark_payments_paid(['cs_buy']), 1)
+        self.assertEqual(mark_payments_paid(['cs_buy']), 0)
+
+        self.assertEqual(CourseEntitlement.objects.filter(user=self.buyer, course=self.course).count(), 1)
+        # Множество курсов запоминается на объекте пользователя, как в рамках одного запроса
+        self.client.force_authenticate(user=User.objects.get(pk=self.buyer.pk))
+        self.assertEqual(self.client.get(lesson_url).status_code, status.HTTP_200_OK)
+        response = self.client.post(reverse('users:payment-create'), {'course': self.course.pk}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.patch(lesson_url, {'title': 'x'}).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cache_reset_after_commit(self):
+        """
+        Тест: набор курсов, закешированный параллельным запросом до коммита, сбрасывается после коммита
+        """
+        key = entitlements_cache_key(self.buyer.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            grant_entitlements([(self.buyer.pk, self.course.pk)])
+            cache.set(key, frozenset())  # другой запрос еще видит данные до коммита
+        self.assertIsNone(cache.get(key))
+
+
+class PaymentRollupTests(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(email='rollup-author@test.com', password='x')
+        self.buyer = User.objects.create_user(email='rollup-buyer@test.com', password='x')
+        self.course = Course.objects.create(title='Rollup Course', owner=self.author, price=1000)
+        for session_id in ('cs_r1', 'cs_r2', 'cs_r3'):
+            Payment.objects.create(user=self.buyer, course=self.course, amount=1000, payment_method='transfer',
+                                   stripe_session_id=session_id)
+
+    def test_rollups_follow_paid_payments(self):
+        """
+        Тест: итоги пересчитываются при оплате, повторная отметка их не удваивает
+        """
+        self.assertFalse(PaymentRollup.objects.exists())
+
+        mark_payments_paid(['cs_r1', 'cs_r2'])
+        mark_payments_paid(['cs_r1', 'cs_r2'])
+        user_rollup = PaymentRollup.objects.get(user=self.buyer)
+        course_rollup = PaymentRollup.objects.get(course=self.course)
+        self.assertEqual((user_rollup.total, user_rollup.payments_count), (2000, 2))
+        self.assertEqual((course_rollup.total, course_rollup.payments_count), (2000, 2))
+
+        payment = Payment.objects.get(stripe_session_id='cs_r3')
+        payment.is_paid = True
+        payment.save()
+        self.assertEqual(PaymentRollup.objects.get(course=self.course).total, 3000)
+
+    def test_rollups_follow_unpaid_and_deleted_payments(self):
+        """
+        Тест: снятие оплаты, изменение суммы и удаление платежа меняют итоги на разницу
+        """
+        mark_payments_paid(['cs_r1', 'cs_r2'])
+        payment = Payment.objects.get(stripe_session_id='cs_r1')
+        payment.amount = 400
+        payment.save()
+        self.assertEqual(PaymentRollup.objects.get(user=self.buyer).total, 1400)
+
+        payment.is_paid = False
+        payment.save()
+        rollup = PaymentRollup.objects.get(course=self.course)
+        self.assertEqual((rollup.total, rollup.payments_count), (1000, 1))
+
+        Payment.objects.get(stripe_session_id='cs_r2').delete()
+        self.assertFalse(PaymentRollup.objects.exists())
+
+    def test_reconcile_fixes_drifted_rollups(self):
+        """
+        Тест: сверка исправляет итоги, разошедшиеся с таблицей платежей
+        """
+        mark_payments_paid(['cs_r1', 'cs_r2'])
+        PaymentRollup.objects.filter(user=self.buyer).update(total=1, payments_count=7)
+        PaymentRollup.objects.filter(course=self.course).delete()
+
+        self.assertEqual(reconcile_rollups(), 'Fixed 2 payment rollups.')
+        for rollup in PaymentRollup.objects.all():
+            self.assertEqual((rollup.total, rollup.payments_count), (2000, 2))
+        self.assertEqual(PaymentRollup.objects.count(), 2)
+
+    def test_rollup_endpoint_scopes_rows(self):
+        """
+        Тест: автор курса видит итоги курса, покупатель — только свои
+        """
+        mark_payments_paid(['cs_r1'])
+        url = reverse('users:payment-rollups')
+
+        self.client.force_authenticate(user=self.author)
+        rows = self.client.get(url).data['results']
+        self.assertEqual([(row['user'], row['course']) for row in rows], [(None, self.course.pk)])
+
+        self.client.force_authenticate(user=self.buyer)
+        rows = self.client.get(url).data['results']
+        self.assertEqual([(row['user'], row['course']) for row in rows], [(self.buyer.pk, None)])
+
+
+class PaymentPartitionTests(APITestCase):
+    def test_partition_months(self):
+        """
+        Тест расчета границ месячных секций
+        """
+        start = datetime(2025, 11, 1, tzinfo=dt_timezone.utc)
+        self.assertEqual(add_months(start, 2), datetime(2026, 1, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(add_months(start, -11), datetime(2024, 12, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(partition_name(start), 'users_payment_p2025_11')
+
+    @skipIf(connection.vendor == 'postgresql', 'В PostgreSQL таблица секционирована миграцией')
+    def test_partition_task_skips_unpartitioned_table(self):
+        """
+        Тест: без секционирования (не PostgreSQL) задача ничего не делает
+        """
+        self.assertEqual(create_payment_partitions(), 'Payment table is not partitioned.')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Секционирование платежей есть только в PostgreSQL')
+class PaymentPartitionMigrationTests(APITestCase):
+    """Тестовая БД создается миграциями, поэтому 0012_partition_payment уже выполнена на ней."""
+
+    def test_payment_table_is_partitioned(self):
+        """
+        Тест миграции: таблица секционирована, первичный ключ (id, payment_date), старой таблицы нет
+        """
+        self.assertTrue(is_partitioned())
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_get_constraintdef(oid) FROM pg_constraint WHERE conname = 'users_payment_pkey'"
+            )
+            self.assertEqual(cursor.fetchall(), [('PRIMARY KEY (id, payment_date)',)])
+            cursor.execute("SELECT to_regclass('users_payment_legacy'), to_regclass('users_payment_default')")
+            self.assertEqual(cursor.fetchone(), (None, 'users_payment_default'))
+
+        user = User.objects.create_user(email='partition@test.com', password='x')
+        payment = Payment.objects.create(user=user, amount=100, payment_method='cash')
+        self.assertEqual(Payment.objects.get(pk=payment.pk).amount, 100)
+        self.assertEqual(create_payment_partitions(), 'Created 0 payment partitions.')  # миграция создала их
+        current = datetime.now(dt_timezone.utc)
+        self.assertIn(partition_name(current), [name for name, _ in list_partitions()])
+
+    def partition_of(self, payment):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT tableoid::regclass::text FROM users_payment WHERE id = %s', [payment.pk])
+            return cursor.fetchone()[0]
+
+    def test_new_partition_takes_rows_from_default(self):
+        """
+        Тест: платежи месяца без секции лежат в DEFAULT и переносятся в секцию при ее создании
+        """
+        user = User.objects.create_user(email='future@test.com', password='x')
+        payment = Payment.objects.create(user=user, amount=100, payment_method='cash')
+        month = datetime(2031, 5, 1, tzinfo=dt_timezone.utc)
+        Payment.objects.filter(pk=payment.pk).update(payment_date=month + timedelta(days=3))
+        self.assertEqual(self.partition_of(payment), 'users_payment_default')
+
+        self.assertTrue(create_partition(month))
+
+        self.assertEqual(self.partition_of(payment), 'users_payment_p2031_05')
+        self.assertEqual(Payment.objects.get(pk=payment.pk).amount, 100)
+        self.assertFalse(create_partition(month))
+
+    def test_archive_covers_old_rows_in_default(self):
+        """
+        Тест архивирования: старые секции и старые платежи из DEFAULT выгружаются и удаляются
+        """
+        user = User.objects.create_user(email='archive@test.com', password='x')
+        in_partition, in_default, recent = (
+            Payment.objects.create(user=user, amount=amount, payment_method='cash') for amount in (1, 2, 3)
+        )
+        create_partition(datetime(2001, 3, 1, tzinfo=dt_timezone.utc))
+        Payment.objects.filter(pk=in_partition.pk).update(payment_date=datetime(2001, 3, 10, tzinfo=dt_timezone.utc))
+        Payment.objects.filter(pk=in_default.pk).update(payment_date=datetime(2001, 1, 10, tzinfo=dt_timezone.utc))
+        with connection.cursor() as cursor:
+            # Отложенные проверки внешних ключей транзакции теста мешают удалить секцию
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+        with tempfile.TemporaryDirectory() as directory:
+            call_command('archive_payment_partitions', directory=directory, stdout=io.StringIO())
+            archived = {}
+            for name in sorted(os.listdir(directory)):
+                with gzip.open(os.path.join(directory, name), 'rt') as archive:
+                    archived[name] = [json.loads(line)['id'] for line in archive]
+
+        self.assertEqual(archived, {
+            'users_payment_default_before_' + add_months(
+                datetime.now(dt_timezone.utc).replace(day=1), -settings.PAYMENT_ARCHIVE_AFTER_MONTHS
+            ).strftime('%Y_%m') + '.ndjson.gz': [in_default.pk],
+            'users_payment_p2001_03.ndjson.gz': [in_partition.pk],
+        })
+        self.assertEqual(list(Payment.objects.filter(user=user).values_list('pk', flat=True)), [recent.pk])
+
+
+class PaymentAdminTests(APITestCase):
+    def test_changelist_prefix_search(self):
+        """
+        Тест списка платежей в админке: поиск по префиксу email покупателя
+        """
+        admin_user = User.objects.create_superuser(email='admin@test.com', password='x')
+        buyer = User.objects.create_user(email='buyer@test.com', password='x')
+        Payment.objects.create(user=buyer, amount=100, payment_method='cash')
+        Payment.objects.create(user=admin_user, amount=200, payment_method='cash')
+        self.client.force_login(admin_user)
+
+        response = self.client.get(reverse('admin:users_payment_changelist'), {'q': 'BUYER'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+    def test_user_changelist_searches_names_by_prefix(self):
+        """
+        Тест списка пользователей в админке: поиск по префиксу имени и фамилии
+        """
+        admin_user = User.objects.create_superuser(email='admin@test.com', password='x')
+        User.objects.create_user(email='ivan@test.com', password='x', first_name='Ivan', last_name='Petrov')
+        self.client.force_login(admin_user)
+        url = reverse('admin:users_user_changelist')
+
+        for query, expected in (('ivan', 1), ('PETR', 1), ('van', 0)):
+            response = self.client.get(url, {'q': query})
+            self.assertEqual(response.context['cl'].result_count, expected, query)
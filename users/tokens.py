@@ -0,0 +1,50 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+def blacklist_cache_key(jti):
+    return f'users:jwt_blacklist:{jti}'
+
+
+def _ttl_until(expires_at):
+    """Сколько секунд осталось жить токену (запись в кеше не нужна дольше)."""
+    return max(1, int((expires_at - timezone.now()).total_seconds()))
+
+
+def cache_blacklisted(jti, expires_at):
+    """Помечает токен как заблокированный в кеше (write-through при блокировке)."""
+    cache.set(blacklist_cache_key(jti), True, _ttl_until(expires_at))
+
+
+def is_token_blacklisted(jti, expires_at):
+    """
+    Проверка блокировки токена за O(1): сначала кеш, при промахе — БД.
+    Отрицательный результат кладется через add(), чтобы не перезаписать
+    параллельную блокировку, которая всегда пишет True через set().
+    """
+    key = blacklist_cache_key(jti)
+    blacklisted = cache.get(key)
+    if blacklisted is None:
+        blacklisted = BlacklistedToken.objects.filter(token__jti=jti).exists()
+        if blacklisted:
+            cache.set(key, True, _ttl_until(expires_at))
+        else:
+            cache.add(key, False, _ttl_until(expires_at))
+    return blacklisted
+
+
+class CachedBlacklistRefreshToken(RefreshToken):
+    """Refresh-токен, проверяющий черный список через кеш, а не запросом к БД."""
+
+    def check_blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        expires_at = datetime.fromtimestamp(self.payload['exp'], tz=dt_timezone.utc)
+        if is_token_blacklisted(jti, expires_at):
+            raise TokenError(_('Token is blacklisted'))
@@ -6,8 +6,10 @@ from users.apps import UsersConfig
 from users.views import (
     UserViewSet,
     PaymentListAPIView,
+    PaymentRollupListAPIView,
     PaymentCreateAPIView,
     PaymentRetrieveAPIView,
+    StripeWebhookView,
     PaymentSuccessView,
     PaymentCancelView
 )
@@ -24,8 +26,10 @@ urlpatterns = [
 
     # Платежи (Задание 2)
     path('payments/', PaymentListAPIView.as_view(), name='payment-list'),
+    path('payments/rollups/', PaymentRollupListAPIView.as_view(), name='payment-rollups'),
     path('payments/create/', PaymentCreateAPIView.as_view(), name='payment-create'),
     path('payments/<int:pk>/status/', PaymentRetrieveAPIView.as_view(), name='payment-retrieve-status'),
+    path('payments/webhook/', StripeWebhookView.as_view(), name='payment-webhook'),
 
     # (Заглушки для Stripe Redirects)
     path('payments/success/', PaymentSuccessView.as_view(), name='payment-success'),
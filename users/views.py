@@ -1,17 +1,32 @@
 # ФАЙЛ: users/views.py
 
+import logging
+
+import stripe
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
 from rest_framework import viewsets, generics, status
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import OrderingFilter
 from drf_spectacular.utils import extend_schema, inline_serializer
 from rest_framework import serializers  # для inline_serializer
 
-from users.models import User, Payment
+from core.fast_serializers import ValuesListMixin
+from users.idempotency import IdempotentCreateMixin
+from users.models import User, Payment, PaymentRollup
+from users.paginators import PaymentCursorPagination, PaymentRollupPagination
 from materials.models import Course  # Нужен для создания платежа
-from users.serializers import UserSerializer, PaymentSerializer, PaymentCreateSerializer
-from users.services import create_stripe_product, create_stripe_price, create_stripe_session, retrieve_stripe_session
+from users.serializers import UserSerializer, PaymentSerializer, PaymentCreateSerializer, PaymentRollupSerializer
+from users.services import (
+    get_course_stripe_price, create_stripe_session, retrieve_stripe_session, mark_payments_paid, handle_stripe_event
+)
+
+logger = logging.getLogger(__name__)
 
 
 class UserViewSet(viewsets.ModelViewSet):
@@ -53,16 +68,19 @@ class UserViewSet(viewsets.ModelViewSet):
         # ---
 
 
-class PaymentListAPIView(generics.ListAPIView):
+class PaymentListAPIView(ValuesListMixin, generics.ListAPIView):
     """
     (Задание 1)
     API-эндпоинт для просмотра списка платежей ТЕКУЩЕГО пользователя.
     Позволяет фильтровать по курсу, уроку и способу оплаты.
+    Список отдается страницами с курсором (next/previous), строки собираются из values().
     """
     serializer_class = PaymentSerializer
+    pagination_class = PaymentCursorPagination
     filter_backends = (DjangoFilterBackend, OrderingFilter,)
     filterset_fields = ('course', 'lesson', 'payment_method',)
     ordering_fields = ('payment_date',)
+    ordering = PaymentCursorPagination.ordering
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
@@ -74,14 +92,40 @@ class PaymentListAPIView(generics.ListAPIView):
         return Payment.objects.filter(user=self.request.user)
 
 
+class PaymentRollupListAPIView(generics.ListAPIView):
+    """
+    Месячные итоги оплаченных платежей по пользователям и курсам (из PaymentRollup).
+    - Пользователь видит свои итоги и итоги своих курсов.
+    - Администратор видит все итоги.
+    Фильтры: user, course, month (YYYY-MM-01), month__gte, month__lte.
+    """
+    serializer_class = PaymentRollupSerializer
+    pagination_class = PaymentRollupPagination
+    filter_backends = (DjangoFilterBackend,)
+    filterset_fields = {
+        'user': ['exact', 'isnull'],
+        'course': ['exact', 'isnull'],
+        'month': ['exact', 'gte', 'lte'],
+    }
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        user = self.request.user
+        rollups = PaymentRollup.objects.order_by('-month', 'id')
+        if user.is_staff:
+            return rollups
+        return rollups.filter(Q(user=user) | Q(course__owner=user))
+
+
 @extend_schema(
     summary="(Задание 2) Создание сессии оплаты (Stripe)",
     # ... (остальная часть @extend_schema)
 )
-class PaymentCreateAPIView(generics.CreateAPIView):
+class PaymentCreateAPIView(IdempotentCreateMixin, generics.CreateAPIView):
     """
     (ЗАДАНИЕ 2)
     API-эндпоинт для создания платежа и получения ссылки на оплату Stripe.
+    Повторы с тем же заголовком Idempotency-Key возвращают первый ответ.
     """
     serializer_class = PaymentCreateSerializer
     permission_classes = [IsAuthenticated]
@@ -92,19 +136,12 @@ class PaymentCreateAPIView(generics.CreateAPIView):
         user = self.request.user
 
         try:
-            stripe_product = create_stripe_product(name=course.title)
-            if not stripe_product:
-                raise Exception("Не удалось создать продукт в Stripe.")
-
-            amount_in_cents = int(course.price * 100)
-            stripe_price = create_stripe_price(
-                product_id=stripe_product.id,
-                amount=amount_in_cents
-            )
-            if not stripe_price:
-                raise Exception("Не удалось создать цену в Stripe.")
+            # Продукт и цена создаются в Stripe один раз на курс (и при смене цены)
+            price_id = get_course_stripe_price(course)
+            if not price_id:
+                raise Exception("Не удалось получить цену курса в Stripe.")
 
-            stripe_session = create_stripe_session(price_id=stripe_price.id)
+            stripe_session = create_stripe_session(price_id=price_id)
             if not stripe_session:
                 raise Exception("Не удалось создать сессию в Stripe.")
 
@@ -127,7 +164,10 @@ class PaymentCreateAPIView(generics.CreateAPIView):
 class PaymentRetrieveAPIView(generics.RetrieveAPIView):
     """
     (ЗАДАНИЕ 2 - БОНУС)
-    API-эндпоинт для проверки статуса платежа в Stripe по PK платежа в нашей БД.
+    API-эндпоинт для проверки статуса платежа по PK платежа в нашей БД.
+    Статус обновляется вебхуком Stripe, поэтому ответ берется из БД.
+    Stripe опрашивается только для "зависших" неоплаченных платежей
+    (вебхук мог не дойти) и не чаще раза в STRIPE_STATUS_CHECK_INTERVAL секунд на платеж.
     """
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
@@ -141,29 +181,52 @@ class PaymentRetrieveAPIView(generics.RetrieveAPIView):
         # ---
         return Payment.objects.filter(user=self.request.user)
 
+    def should_check_stripe(self, payment):
+        if payment.is_paid:
+            return False
+        if timezone.now() - payment.payment_date < settings.STRIPE_STATUS_STALE_AFTER:
+            return False  # даем вебхуку время дойти
+        # cache.add атомарен: из параллельных запросов в Stripe пойдет только один
+        return cache.add(f'users:payment_status_check:{payment.pk}', True, settings.STRIPE_STATUS_CHECK_INTERVAL)
+
     def retrieve(self, request, *args, **kwargs):
         payment = self.get_object()
 
         if not payment.stripe_session_id:
             return Response({'error': 'Этот платеж не был обработан Stripe.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
+        if self.should_check_stripe(payment):
             session = retrieve_stripe_session(payment.stripe_session_id)
+            if session and session.payment_status == 'paid':
+                mark_payments_paid([payment.stripe_session_id])
+                payment.is_paid = True
 
-            if not session:
-                return Response({'error': 'Не удалось получить сессию из Stripe.'},
-                                status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response(self.get_serializer(payment).data, status=status.HTTP_200_OK)
 
-            if session.payment_status == 'paid':
-                if not payment.is_paid:
-                    payment.is_paid = True
-                    payment.save()
 
-            return Response(self.get_serializer(payment).data, status=status.HTTP_200_OK)
+class StripeWebhookView(APIView):
+    """
+    Вебхук Stripe: проверяет подпись и отмечает платежи оплаченными
+    по событию checkout.session.completed. Повторные события игнорируются.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    @extend_schema(exclude=True)
+    def post(self, request, *args, **kwargs):
+        if not settings.STRIPE_WEBHOOK_SECRET:
+            # С пустым секретом подпись подделывается тривиально: событие не принимаем
+            logger.error("STRIPE_WEBHOOK_SECRET не задан: вебхук Stripe отклонен")
+            return Response({'error': 'Вебхук не настроен.'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        try:
+            event = stripe.Webhook.construct_event(
+                request.body, request.META.get('HTTP_STRIPE_SIGNATURE', ''), settings.STRIPE_WEBHOOK_SECRET
+            )
+        except (ValueError, stripe.SignatureVerificationError):
+            return Response({'error': 'Некорректная подпись или тело события.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        except Exception as e:
-            return Response({'error': f'Ошибка при проверке статуса: {e}'},
-                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        processed = handle_stripe_event(event)
+        return Response({'status': 'processed' if processed else 'duplicate'}, status=status.HTTP_200_OK)
 
 
 # Views для success/cancel
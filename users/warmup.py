@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from core.warmup import warmer
+from users.authentication import AUTH_STATE_FIELDS, auth_state_cache_key
+from users.models import MODERATORS_GROUP, User, user_groups_cache
+
+
+def hot_user_ids():
+    """Модераторы и WARM_CACHES_ACTIVE_USERS недавно активных пользователей."""
+    moderators = User.objects.filter(groups__name=MODERATORS_GROUP).values_list('pk', flat=True)
+    recent = User.objects.filter(is_active=True, last_activity__isnull=False).order_by(
+        '-last_activity').values_list('pk', flat=True)[:settings.WARM_CACHES_ACTIVE_USERS]
+    return list(dict.fromkeys([*moderators, *recent]))
+
+
+def load_group_names(user_ids):
+    """Группы пользователей одним запросом: {id: frozenset имен}."""
+    names = {user_id: set() for user_id in user_ids}
+    memberships = User.groups.through.objects.filter(user_id__in=user_ids).values_list('user_id', 'group__name')
+    for user_id, name in memberships:
+        names[user_id].add(name)
+    return {user_id: frozenset(groups) for user_id, groups in names.items()}
+
+
+@warmer('user_groups')
+def warm_user_groups():
+    return len(user_groups_cache.get_or_set_many(hot_user_ids(), load_group_names))
+
+
+@warmer('auth_states')
+def warm_auth_states():
+    """
+    Флаги is_active/is_staff/is_superuser, которые JWT-аутентификация берет из кеша (get_auth_state).
+    Возвращает число записанных в кеш значений (уже закешированные не считаются).
+    """
+    user_ids = hot_user_ids()
+    cached = cache.get_many([auth_state_cache_key(user_id) for user_id in user_ids])
+    missing = [user_id for user_id in user_ids if auth_state_cache_key(user_id) not in cached]
+    states = User.objects.filter(pk__in=missing).values('pk', *AUTH_STATE_FIELDS)
+    values = {auth_state_cache_key(state.pop('pk')): state for state in states}
+    cache.set_many(values, settings.AUTH_STATE_CACHE_TTL)
+    return len(values)